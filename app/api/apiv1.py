@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from app.api.endpoints import user, expense, auth
+from app.api.endpoints import user, expense, auth, recurring, profiling
 
 api_router : APIRouter = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["Auth"])
 api_router.include_router(user.router, prefix="/users", tags=["Users"])
 api_router.include_router(expense.router, prefix="/expenses", tags=["Expenses"])
+api_router.include_router(recurring.router, prefix="/recurring_expenses", tags=["Recurring Expenses"])
+api_router.include_router(profiling.router, prefix="/profiles", tags=["Profiling"])
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from app.database.schemas.token_schema import Token
+from app.database.schemas.token_schema import Token, RefreshRequest, LogoutRequest
 from app.database.schemas.auth_schema import AuthUser
 from app.database.schemas.user_schema import User
 from app.utils import security
-from app.utils.curd import get_user_by_email
-from app.utils.dependencies import get_db
+from app.utils.curd import (
+    get_user_by_email,
+    create_refresh_token,
+    consume_refresh_token,
+    revoke_refresh_tokens,
+)
+from app.utils.dependencies import get_db, JWTBearer, get_current_user
+from app.utils.revocation import revoke_access_token, token_denylist
 from app.config.config import settings
 from typing import Dict
 import os
@@ -15,6 +21,31 @@ from app.utils.status import status_codes as sac
 router: APIRouter = APIRouter()
 
 
+def issue_tokens(db: Session, user: User) -> Dict[str, str]:
+    """
+    Issue a fresh access token and refresh token pair for a user.
+
+    Args:
+        db (Session): Database session dependency.
+        user (User): The authenticated user.
+
+    Returns:
+        Dict[str, str]: A dictionary containing the access token, refresh token and token type.
+    """
+    access_token_expires: timedelta = timedelta(
+        minutes=float(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
+    )
+    access_token: str = security.create_access_token(
+        data={"sub": user.email}, expires_delta=access_token_expires
+    )
+    refresh_token: str = create_refresh_token(db, user_id=user.id)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
 @router.post("/token", response_model=Token)
 def login(
     db: Session = Depends(get_db), form_data: AuthUser = Depends()
@@ -30,7 +61,7 @@ def login(
         form_data (AuthUser): Dependency that extracts the user's login credentials from the request.
 
     Returns:
-        Dict[str, str]: A dictionary containing the access token and token type.
+        Dict[str, str]: A dictionary containing the access token, refresh token and token type.
 
     Raises:
         HTTPException: If the email or password is incorrect, raises a 401 Unauthorized error.
@@ -40,10 +71,57 @@ def login(
         form_data.password, user.hashed_password
     ):
         raise HTTPException(status_code=sac.HTTP_UNAUTHORIZED, detail="Incorrect email or password")
-    access_token_expires: timedelta = timedelta(
-        minutes=float(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
-    )
-    access_token: str = security.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(db, user)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh(body: RefreshRequest, db: Session = Depends(get_db)) -> Dict[str, str]:
+    """
+    Exchange a refresh token for a new token pair.
+
+    The refresh token is looked up by its hash, so no password check is needed.
+    Each refresh token is single use: it is revoked and replaced on every call.
+
+    Args:
+        body (RefreshRequest): The refresh token to redeem.
+        db (Session): Database session dependency.
+
+    Returns:
+        Dict[str, str]: A dictionary containing the access token, refresh token and token type.
+
+    Raises:
+        HTTPException: If the refresh token is unknown, expired or revoked, raises a 401 Unauthorized error.
+    """
+    user: User | None = consume_refresh_token(db, body.refresh_token)
+    if user is None:
+        raise HTTPException(status_code=sac.HTTP_UNAUTHORIZED, detail="Invalid or expired refresh token")
+    return issue_tokens(db, user)
+
+
+@router.post("/logout")
+def logout(
+    body: LogoutRequest = LogoutRequest(),
+    token: dict = Depends(JWTBearer()),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Dict[str, str]:
+    """
+    Revoke the current access token and, optionally, a refresh token.
+
+    The access token is denied until it expires, by this worker at once and
+    by the others from their next denylist sync.
+
+    Args:
+        body (LogoutRequest): The refresh token to revoke alongside the access token.
+        token (dict): The decoded JWT token payload.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        Dict[str, str]: A confirmation message.
+    """
+    if token.get("jti"):
+        revoke_access_token(db, token_denylist, token["jti"], float(token["exp"]))
+    if body.refresh_token:
+        revoke_refresh_tokens(db, user_id=current_user.id, token=body.refresh_token)
+    return {"detail": "Logged out"}
@@ -1,24 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Body, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database.schemas.expense_schema import Expense, ExpenseCreate
+from app.database.schemas.expense_schema import (
+    Expense,
+    ExpenseCreate,
+    ExpenseUpdate,
+    ExpenseImportResult,
+    ExpenseEventPage,
+    ExpenseSearchPage,
+    ExpensePage,
+)
+from app.database.database import SessionLocal
 from app.database.schemas.user_schema import User
-from app.database.schemas.balance_sheet_schema import BalanceSheet, OverallBalanceSheet
+from app.database.schemas.balance_sheet_schema import BalanceSheet, OverallBalanceSheet, Settlement
 from app.utils.curd import (
     create_new_expense,
-    get_expenses_by_user,
-    get_all_expenses as gae,
+    bulk_import_expenses,
+    get_user_expenses,
     get_balance_sheet as gbs,
     get_overall_balance_sheet as gobs,
+    get_settlement as gst,
+    get_expense_events,
+    update_expense as ue,
+    delete_expense as de,
+    delete_expense_split as des,
+    search_expenses,
 )
 from app.utils.dependencies import get_db, JWTBearer
-from typing import List
-from app.utils import dependencies
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+from app.utils import dependencies, idempotency
+from app.utils.data_version import cache_validators, not_modified
+from app.utils.status import status_codes as sac
+from app.utils.responses import ClosingStreamingResponse, FastJSONResponse
+from app.utils.rate_limit import stream_limiter
+from app.utils.serializers import expenses_to_json, expense_page_to_json, balance_sheets_to_json
 from fastapi.responses import Response, StreamingResponse
 import io
 import csv
+import os
+import json
+import asyncio
 
 router: APIRouter = APIRouter()
 
+CURRENCY_PATTERN: str = r"^[A-Z]{3}$"
+CSV_CHUNK_SIZE: int = 64 * 1024
+CSV_HEADER: List[str] = [
+    "User ID",
+    "Total Amount",
+    "Expense ID",
+    "Description",
+    "Amount",
+    "Split Method",
+    "Currency",
+    "Total Currency",
+]
+
 
 @router.post(
     "/create_expense",
@@ -29,42 +66,315 @@ def create_expense(
     expense: ExpenseCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(dependencies.get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
 ) -> Expense:
     """
     Create a new expense.
 
     This function creates a new expense for the current user. The expense
-    details are provided in the request body.
+    details are provided in the request body. When an ``Idempotency-Key`` header
+    is sent, retries carrying the same key replay the stored response instead of
+    creating a duplicate expense.
 
     Args:
         expense (ExpenseCreate): The expense details to be created.
         db (Session): Database session dependency.
         current_user (User): The current authenticated user.
+        idempotency_key (Optional[str]): The client supplied idempotency key.
 
     Returns:
         Expense: The created expense object.
     """
-    return create_new_expense(db=db, expense=expense, owner_id=current_user.id)
+    if idempotency_key is None:
+        return create_new_expense(db=db, expense=expense, owner_id=current_user.id)
+
+    request_hash: str = idempotency.hash_request(expense)
+    owner_id: int = current_user.id
+    claimed_at, record = idempotency.claim_idempotency_key(
+        db, idempotency_key, owner_id, request_hash
+    )
+    if claimed_at is None:
+        return idempotency.replay_response(record, request_hash)
+    try:
+        db_expense = create_new_expense(
+            db=db, expense=expense, owner_id=owner_id, idempotency_key=(idempotency_key, claimed_at)
+        )
+    except HTTPException as exc:
+        # A 409 means a retry has taken the key over; its claim must be left alone.
+        if exc.status_code != sac.HTTP_CONFLICT:
+            idempotency.release_idempotency_key(db, idempotency_key, owner_id)
+        raise
+    except Exception:
+        idempotency.release_idempotency_key(db, idempotency_key, owner_id)
+        raise
+    body: str = Expense.model_validate(db_expense, from_attributes=True).model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+@router.post(
+    "/import",
+    response_model=ExpenseImportResult,
+    dependencies=[Depends(JWTBearer())],
+)
+def import_expenses(
+    expenses: List[ExpenseCreate] = Body(..., max_length=10000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> ExpenseImportResult:
+    """
+    Import many expenses at once.
 
+    All expenses are validated first and written in one transaction, using
+    ``COPY`` on PostgreSQL and batched inserts elsewhere.
 
-@router.get("/current_user_expenses/", response_model=List[Expense])
+    Args:
+        expenses (List[ExpenseCreate]): The expenses to create, at most 10000.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        ExpenseImportResult: The IDs of the created expenses, in request order.
+    """
+    return {"expense_ids": bulk_import_expenses(db=db, expenses=expenses, owner_id=current_user.id)}
+
+
+@router.get(
+    "/current_user_expenses/",
+    response_model=List[Expense],
+    response_class=FastJSONResponse,
+)
 def get_current_user_expenses(
     db: Session = Depends(get_db),
     current_user: User = Depends(dependencies.get_current_user),
-) -> List[Expense]:
+) -> FastJSONResponse:
     """
     Retrieve expenses for the current user.
 
     This function retrieves all expenses associated with the current authenticated user.
+    Expenses and splits are read as plain rows in two queries and serialized
+    without re-validation.
+
+    Args:
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        FastJSONResponse: A list of expenses for the current user.
+    """
+    return FastJSONResponse(expenses_to_json(*get_user_expenses(db, current_user.id)))
+
+
+@router.get(
+    "/events",
+    response_model=ExpenseEventPage,
+    dependencies=[Depends(JWTBearer())],
+)
+def get_events(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> ExpenseEventPage:
+    """
+    Read the change feed of the expenses the current user owns or takes part in.
+
+    Consumers keep the returned ``next_cursor`` and pass it back as ``after``
+    to receive only the changes they have not seen yet.
 
     Args:
+        after (int): The cursor returned by the previous call, 0 to start from the beginning.
+        limit (int): The maximum number of events to return.
         db (Session): Database session dependency.
         current_user (User): The current authenticated user.
 
     Returns:
-        List[Expense]: A list of expenses for the current user.
+        ExpenseEventPage: The events after the cursor and the cursor to resume from.
     """
-    return get_expenses_by_user(db=db, user_id=current_user.id)
+    return get_expense_events(db, current_user.id, after=after, limit=limit)
+
+
+@router.get(
+    "/involved",
+    response_model=ExpensePage,
+    response_class=FastJSONResponse,
+)
+def get_involved_expenses(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> FastJSONResponse:
+    """
+    Retrieve the expenses the current user owns or takes part in, one page at a time.
+
+    Pages are ordered by expense ID and keyed on it, so each page costs the
+    same however deep into the history it is.
+
+    Args:
+        after (int): The cursor returned by the previous page, 0 to start from the beginning.
+        limit (int): The maximum number of expenses to return.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        FastJSONResponse: The expenses and the cursor of the next page, null on the last page.
+    """
+    expense_rows, split_rows = get_user_expenses(
+        db, current_user.id, involved=True, after=after, limit=limit
+    )
+    next_cursor: Optional[int] = expense_rows[-1].id if len(expense_rows) == limit else None
+    return FastJSONResponse(expense_page_to_json(expense_rows, split_rows, next_cursor))
+
+
+@router.get(
+    "/search",
+    response_model=ExpenseSearchPage,
+    dependencies=[Depends(JWTBearer())],
+)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10_000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> ExpenseSearchPage:
+    """
+    Search the descriptions of the expenses the current user owns or participates in.
+
+    Every word of the query must match, the last one as a prefix, so results
+    narrow as the user types. Results are ranked by relevance.
+
+    Args:
+        q (str): The search text.
+        limit (int): The maximum number of results to return.
+        offset (int): The number of results to skip.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        ExpenseSearchPage: A page of results and the offset of the next page.
+    """
+    return search_expenses(db, current_user.id, q, limit=limit, offset=offset)
+
+
+@router.get("/events/stream")
+async def stream_events(
+    after: int = Query(0, ge=0),
+    last_event_id: Optional[int] = Header(default=None),
+    token: dict = Depends(JWTBearer()),
+) -> StreamingResponse:
+    """
+    Stream the change feed of the current user as Server-Sent Events.
+
+    Each event carries its cursor as the SSE ``id``, so a reconnecting client
+    resumes from the ``Last-Event-ID`` header automatically. The number of
+    streams open at once is capped per user and per process.
+
+    Args:
+        after (int): The cursor to start after.
+        last_event_id (Optional[int]): The ``Last-Event-ID`` header sent on reconnect; overrides ``after``.
+        token (dict): The decoded JWT token payload.
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` of expense events.
+
+    Raises:
+        HTTPException: If the user or the process already has too many streams open.
+    """
+    # Resolved with its own session: a request-scoped one would stay checked out for the whole stream.
+    user_id: int = await run_in_threadpool(read_user_id, token)
+    if not stream_limiter.acquire(user_id):
+        raise HTTPException(
+            status_code=sac.HTTP_TOO_MANY_REQUESTS,
+            detail="Too many open event streams",
+        )
+    cursor: int = last_event_id if last_event_id is not None else after
+    return ClosingStreamingResponse(
+        event_stream(cursor, user_id),
+        on_close=lambda: stream_limiter.release(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.patch(
+    "/{expense_id}",
+    response_model=Expense,
+    dependencies=[Depends(JWTBearer())],
+)
+def patch_expense(
+    expense_id: int,
+    update: ExpenseUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> Expense:
+    """
+    Update an expense owned by the current user.
+
+    Only the fields present in the request body are changed. Changing the
+    amount, split method or splits re-splits the expense.
+
+    Args:
+        expense_id (int): The ID of the expense to update.
+        update (ExpenseUpdate): The fields to change.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        Expense: The updated expense.
+    """
+    return ue(db=db, expense_id=expense_id, update=update, owner_id=current_user.id)
+
+
+@router.delete(
+    "/{expense_id}",
+    status_code=sac.HTTP_NO_CONTENT,
+    dependencies=[Depends(JWTBearer())],
+)
+def delete_expense(
+    expense_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> Response:
+    """
+    Delete an expense owned by the current user.
+
+    Args:
+        expense_id (int): The ID of the expense to delete.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        Response: An empty 204 response.
+    """
+    de(db=db, expense_id=expense_id, owner_id=current_user.id)
+    return Response(status_code=sac.HTTP_NO_CONTENT)
+
+
+@router.delete(
+    "/{expense_id}/splits/{split_id}",
+    response_model=Expense,
+    dependencies=[Depends(JWTBearer())],
+)
+def delete_expense_split(
+    expense_id: int,
+    split_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(dependencies.get_current_user),
+) -> Expense:
+    """
+    Remove one split from an expense owned by the current user.
+
+    Args:
+        expense_id (int): The ID of the expense.
+        split_id (int): The ID of the split to remove.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        Expense: The expense with its remaining splits.
+    """
+    return des(db=db, expense_id=expense_id, split_id=split_id, owner_id=current_user.id)
 
 
 @router.get(
@@ -73,6 +383,9 @@ def get_current_user_expenses(
     dependencies=[Depends(JWTBearer())],
 )
 def get_balance_sheet_current_user(
+    request: Request,
+    response: Response,
+    currency: Optional[str] = Query(None, pattern=CURRENCY_PATTERN),
     db: Session = Depends(get_db),
     current_user: User = Depends(dependencies.get_current_user),
 ) -> BalanceSheet:
@@ -80,37 +393,84 @@ def get_balance_sheet_current_user(
     Retrieve balance sheet for the current user.
 
     This function retrieves the balance sheet for the current authenticated user.
+    The response carries an ETag and Last-Modified; a request whose
+    ``If-None-Match`` or ``If-Modified-Since`` still matches gets a 304
+    without the balance sheet being computed.
 
     Args:
+        request (Request): The incoming request.
+        response (Response): The response, to which the caching headers are added.
+        currency (Optional[str]): The currency of the totals; the base currency if omitted.
         db (Session): Database session dependency.
         current_user (User): The current authenticated user.
 
     Returns:
         BalanceSheet: The balance sheet for the current user.
     """
-    return gbs(db=db, user_id=current_user.id)
+    validators: Dict[str, str] = cache_validators(db, request, current_user.id)
+    if not_modified(request, validators):
+        return Response(status_code=sac.HTTP_NOT_MODIFIED, headers=validators)
+    response.headers.update(validators)
+    return gbs(db=db, user_id=current_user.id, currency=currency)
 
 
 @router.get(
     "/balance_sheet/overall",
     response_model=List[BalanceSheet],
+    response_class=FastJSONResponse,
     dependencies=[Depends(JWTBearer())],
 )
 def get_overall_balance_sheet(
+    request: Request,
+    currency: Optional[str] = Query(None, pattern=CURRENCY_PATTERN),
     db: Session = Depends(get_db),
-) -> List[BalanceSheet]:
+) -> Response:
     """
     Retrieve overall balance sheet for all users.
 
-    This function retrieves the overall balance sheet for all users.
+    This function retrieves the overall balance sheet for all users. A
+    request revalidating a current copy gets a 304 without the balance
+    sheets being computed.
 
     Args:
+        request (Request): The incoming request.
+        currency (Optional[str]): The currency of the totals; the base currency if omitted.
         db (Session): Database session dependency.
 
     Returns:
-        List[BalanceSheet]: A list of balance sheets for all users.
+        Response: A list of balance sheets for all users, or a 304.
     """
-    return gobs(db=db)
+    validators: Dict[str, str] = cache_validators(db, request)
+    if not_modified(request, validators):
+        return Response(status_code=sac.HTTP_NOT_MODIFIED, headers=validators)
+    return FastJSONResponse(
+        balance_sheets_to_json(gobs(db=db, currency=currency)), headers=validators
+    )
+
+
+@router.get(
+    "/settlement",
+    response_model=Settlement,
+    dependencies=[Depends(JWTBearer())],
+)
+def get_settlement(
+    currency: Optional[str] = Query(None, pattern=CURRENCY_PATTERN),
+    db: Session = Depends(get_db),
+) -> Settlement:
+    """
+    Retrieve the transfers that settle all balances.
+
+    This function nets what every user paid against what they owe, across
+    all currencies, and lists who should pay whom.
+
+    Args:
+        currency (Optional[str]): The currency of the transfers; the base currency if omitted.
+        db (Session): Database session dependency.
+
+    Returns:
+        Settlement: The transfers settling every balance.
+    """
+    return gst(db=db, currency=currency)
 
 
 @router.get(
@@ -119,23 +479,31 @@ def get_overall_balance_sheet(
     dependencies=[Depends(JWTBearer())],
 )
 def download_current_user_balance_sheet(
+    request: Request,
+    currency: Optional[str] = Query(None, pattern=CURRENCY_PATTERN),
     db: Session = Depends(get_db),
     current_user: User = Depends(dependencies.get_current_user),
-) -> StreamingResponse:
+) -> Response:
     """
     Download the balance sheet for the current user.
 
     This function generates and downloads the balance sheet for the current authenticated user as a CSV file.
+    A request revalidating a current copy gets a 304 instead.
 
     Args:
+        request (Request): The incoming request.
+        currency (Optional[str]): The currency of the totals; the base currency if omitted.
         db (Session): Database session dependency.
         current_user (User): The current authenticated user.
 
     Returns:
-        StreamingResponse: A CSV file containing the balance sheet for the current user.
+        Response: A CSV file containing the balance sheet for the current user, or a 304.
     """
-    balance_sheet: BalanceSheet = gbs(db=db, user_id=current_user.id)
-    return generate_csv(balance_sheet)
+    validators: Dict[str, str] = cache_validators(db, request, current_user.id)
+    if not_modified(request, validators):
+        return Response(status_code=sac.HTTP_NOT_MODIFIED, headers=validators)
+    balance_sheet: BalanceSheet = gbs(db=db, user_id=current_user.id, currency=currency)
+    return generate_csv(balance_sheet, headers=validators)
 
 
 @router.get(
@@ -143,23 +511,70 @@ def download_current_user_balance_sheet(
     response_model=OverallBalanceSheet,
     dependencies=[Depends(JWTBearer())],
 )
-def download_overall_balance_sheet(db: Session = Depends(get_db)) -> StreamingResponse:
+def download_overall_balance_sheet(
+    request: Request,
+    currency: Optional[str] = Query(None, pattern=CURRENCY_PATTERN),
+    db: Session = Depends(get_db),
+) -> Response:
     """
     Download the overall balance sheet for all users.
 
     This function generates and downloads the overall balance sheet for all users as a CSV file.
+    A request revalidating a current copy gets a 304 instead.
 
     Args:
+        request (Request): The incoming request.
+        currency (Optional[str]): The currency of the totals; the base currency if omitted.
         db (Session): Database session dependency.
 
     Returns:
-        StreamingResponse: A CSV file containing the overall balance sheet for all users.
+        Response: A CSV file containing the overall balance sheet for all users, or a 304.
+    """
+    validators: Dict[str, str] = cache_validators(db, request)
+    if not_modified(request, validators):
+        return Response(status_code=sac.HTTP_NOT_MODIFIED, headers=validators)
+    overall_balance_sheet: List[BalanceSheet] = gobs(db=db, currency=currency)
+    return generate_overall_csv(overall_balance_sheet, headers=validators)
+
+
+def csv_chunks(balance_sheets: Iterable[BalanceSheet]) -> Iterator[str]:
     """
-    overall_balance_sheet: List[BalanceSheet] = gobs(db=db)
-    return generate_overall_csv(overall_balance_sheet)
+    Render balance sheets as CSV, about ``CSV_CHUNK_SIZE`` characters at a time.
+
+    Rows are written as the response is sent, so the whole file is never
+    held in memory and the first bytes leave before the last row is formatted.
+
+    Args:
+        balance_sheets (Iterable[BalanceSheet]): The balance sheets to render.
+
+    Yields:
+        str: Consecutive pieces of the CSV file, starting with the header row.
+    """
+    output: io.StringIO = io.StringIO()
+    writer: csv.writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    for balance_sheet in balance_sheets:
+        for expense in balance_sheet["details"]:
+            writer.writerow(
+                [
+                    balance_sheet["user_id"],
+                    balance_sheet["total_amount"],
+                    expense.id,
+                    expense.description,
+                    expense.amount,
+                    expense.split_method,
+                    expense.currency,
+                    balance_sheet["currency"],
+                ]
+            )
+            if output.tell() >= CSV_CHUNK_SIZE:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+    yield output.getvalue()
 
 
-def generate_csv(balance_sheet: BalanceSheet) -> StreamingResponse:
+def generate_csv(balance_sheet: BalanceSheet, headers: Dict[str, str] | None = None) -> StreamingResponse:
     """
     Generate a CSV file for the given balance sheet.
 
@@ -167,45 +582,24 @@ def generate_csv(balance_sheet: BalanceSheet) -> StreamingResponse:
 
     Args:
         balance_sheet (BalanceSheet): The balance sheet to be converted to CSV.
+        headers (Dict[str, str] | None): Extra response headers, such as the caching validators.
 
     Returns:
         StreamingResponse: A CSV file containing the balance sheet.
     """
-    output: io.StringIO = io.StringIO()
-    writer: csv.writer = csv.writer(output)
-    writer.writerow(
-        [
-            "User ID",
-            "Total Amount",
-            "Expense ID",
-            "Description",
-            "Amount",
-            "Split Method",
-        ]
-    )
-    for expense in balance_sheet["details"]:
-        writer.writerow(
-            [
-                balance_sheet["user_id"],
-                balance_sheet["total_amount"],
-                expense.id,
-                expense.description,
-                expense.amount,
-                expense.split_method,
-            ]
-        )
-    output.seek(0)
     return StreamingResponse(
-        output,
+        csv_chunks([balance_sheet]),
         media_type="text/csv",
         headers={
-            "Content-Disposition": f"attachment; filename=id-{balance_sheet['user_id']}_balance_sheet.csv"
+            **(headers or {}),
+            "Content-Disposition": f"attachment; filename=id-{balance_sheet['user_id']}_balance_sheet.csv",
         },
     )
 
 
 def generate_overall_csv(
     overall_balance_sheet: List[BalanceSheet],
+    headers: Dict[str, str] | None = None,
 ) -> StreamingResponse:
     """
     Generate a CSV file for the overall balance sheet.
@@ -214,40 +608,83 @@ def generate_overall_csv(
 
     Args:
         overall_balance_sheet (List[BalanceSheet]): The overall balance sheet to be converted to CSV.
+        headers (Dict[str, str] | None): Extra response headers, such as the caching validators.
 
     Returns:
         StreamingResponse: A CSV file containing the overall balance sheet.
     """
-    output: io.StringIO = io.StringIO()
-    writer: csv.writer = csv.writer(output)
-    writer.writerow(
-        [
-            "User ID",
-            "Total Amount",
-            "Expense ID",
-            "Description",
-            "Amount",
-            "Split Method",
-        ]
-    )
-    for balance_sheet in overall_balance_sheet:
-        for expense in balance_sheet["details"]:
-            writer.writerow(
-                [
-                    balance_sheet["user_id"],
-                    balance_sheet["total_amount"],
-                    expense.id,
-                    expense.description,
-                    expense.amount,
-                    expense.split_method,
-                ]
-            )
-
-    output.seek(0)
     return StreamingResponse(
-        output,
+        csv_chunks(overall_balance_sheet),
         media_type="text/csv",
         headers={
-            "Content-Disposition": f"attachment; filename=overall_balance_sheet.csv"
+            **(headers or {}),
+            "Content-Disposition": "attachment; filename=overall_balance_sheet.csv",
         },
     )
+
+
+def read_user_id(token: dict) -> int:
+    """
+    Look up the user a token belongs to with a short-lived session.
+
+    Args:
+        token (dict): The decoded JWT token payload.
+
+    Returns:
+        int: The ID of the user.
+    """
+    with SessionLocal() as db:
+        return dependencies.get_current_user(token, db).id
+
+
+def read_events(after: int, limit: int, user_id: int) -> Dict[str, Any]:
+    """
+    Read a page of a user's change feed with a short-lived session.
+
+    Args:
+        after (int): The cursor to read after.
+        limit (int): The maximum number of events to return.
+        user_id (int): The ID of the user reading the feed.
+
+    Returns:
+        Dict[str, Any]: The events after the cursor and the cursor to resume from.
+    """
+    with SessionLocal() as db:
+        return get_expense_events(db, user_id, after=after, limit=limit)
+
+
+async def event_stream(after: int, user_id: int) -> AsyncIterator[str]:
+    """
+    Poll the outbox and yield new events in SSE format.
+
+    The database is polled every ``EVENT_STREAM_POLL_SECONDS`` only while the
+    stream is idle, and a comment line is sent every 15 seconds so proxies keep
+    the connection open.
+
+    Args:
+        after (int): The cursor to start after.
+        user_id (int): The ID of the user the stream belongs to.
+
+    Yields:
+        str: SSE frames.
+    """
+    poll_seconds: float = float(os.environ.get("EVENT_STREAM_POLL_SECONDS", 1))
+    idle_seconds: float = 0.0
+    while True:
+        page: Dict[str, Any] = await run_in_threadpool(read_events, after, 500, user_id)
+        events: List[Dict[str, Any]] = page["events"]
+        after = page["next_cursor"]
+        for event in events:
+            yield (
+                f"id: {event['id']}\n"
+                f"event: {event['event_type']}\n"
+                f"data: {json.dumps(event, default=str)}\n\n"
+            )
+        if events:
+            idle_seconds = 0.0
+            continue
+        await asyncio.sleep(poll_seconds)
+        idle_seconds += poll_seconds
+        if idle_seconds >= 15:
+            idle_seconds = 0.0
+            yield ": keep-alive\n\n"
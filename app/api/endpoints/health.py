@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from app.database.schemas.health_schema import Liveness, Readiness
+from app.utils.health import readiness
+from app.utils.responses import FastJSONResponse
+from app.utils.status import status_codes as sac
+from typing import Dict
+
+router: APIRouter = APIRouter()
+
+
+@router.get("/healthz", response_model=Liveness)
+async def healthz() -> Dict[str, str]:
+    """
+    Report that the process is alive.
+
+    Runs on the event loop without touching the database or the thread pool,
+    so it only fails when the process can no longer serve anything.
+
+    Returns:
+        Dict[str, str]: ``{"status": "ok"}``.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/readyz", response_model=Readiness, responses={503: {"model": Readiness}})
+async def readyz() -> FastJSONResponse:
+    """
+    Report whether the process should receive more traffic.
+
+    Pings the database with a timeout and compares the connection pool, the
+    in-flight requests and the in-flight bcrypt operations with limits set
+    below saturation, see ``ReadinessProbe``.
+
+    Returns:
+        FastJSONResponse: The result of every check, with status 200 when all
+        pass and 503 otherwise.
+    """
+    result: Readiness = Readiness.model_validate(await readiness.check())
+    status_code: int = sac.HTTP_OK if result.status == "ready" else sac.HTTP_SERVICE_UNAVAILABLE
+    return FastJSONResponse(result.model_dump_json().encode(), status_code=status_code)
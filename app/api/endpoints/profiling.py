@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import Response
+from app.database.schemas.profile_schema import ProfileSummary
+from app.utils.profiling import profiler, collapsed_stacks
+from app.utils.status import status_codes as sac
+from typing import Any, Dict, List, Literal, Optional
+
+router: APIRouter = APIRouter()
+
+
+def require_profiling_admin(x_profile_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Only let requests carrying the profiling admin token through.
+
+    Args:
+        x_profile_token (Optional[str]): The ``X-Profile-Token`` header.
+
+    Raises:
+        HTTPException: 404 if no admin token is configured, 403 if the token does not match.
+    """
+    if not profiler.admin_token:
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Profiling is disabled")
+    if not profiler.is_admin(x_profile_token):
+        raise HTTPException(status_code=sac.HTTP_FORBIDDEN, detail="Invalid profiling token")
+
+
+@router.get(
+    "/",
+    response_model=List[ProfileSummary],
+    dependencies=[Depends(require_profiling_admin)],
+)
+def get_profiles() -> List[Dict[str, Any]]:
+    """
+    List the stored request profiles, newest first.
+
+    Returns:
+        List[Dict[str, Any]]: The profiles' request, duration and sample count.
+    """
+    return profiler.summaries()
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_profiling_admin)])
+def download_profile(
+    profile_id: str, threads: Literal["request", "other"] = Query("request")
+) -> Response:
+    """
+    Download a request profile as collapsed stacks.
+
+    Each line is a ``;`` separated stack, from the thread name to the sampled
+    function, followed by its sample count. ``flamegraph.pl`` and speedscope
+    render it as a flame graph.
+
+    Args:
+        profile_id (str): The ID from the ``X-Profile-Id`` response header.
+        threads (Literal["request", "other"]): ``request`` for the stacks of the
+            profiled request, ``other`` for whatever else the process was
+            running meanwhile.
+
+    Returns:
+        Response: The collapsed stacks as a text file.
+
+    Raises:
+        HTTPException: If the profile was never taken or has been evicted.
+    """
+    profile: Dict[str, Any] | None = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Profile not found")
+    return Response(
+        content=collapsed_stacks(profile["stacks" if threads == "request" else "other_stacks"]),
+        media_type="text/plain",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}-{threads}.txt"},
+    )
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from app.database.schemas.recurring_expense_schema import RecurringExpense, RecurringExpenseCreate
+from app.database.schemas.user_schema import User
+from app.utils.curd import (
+    create_recurring_expense as cre,
+    get_recurring_expenses as gre,
+    deactivate_recurring_expense as dre,
+)
+from app.utils.dependencies import get_db, JWTBearer, get_current_user
+from app.utils.status import status_codes as sac
+from typing import List
+
+router: APIRouter = APIRouter()
+
+
+@router.post("/", response_model=RecurringExpense, dependencies=[Depends(JWTBearer())])
+def create_recurring_expense(
+    template: RecurringExpenseCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> RecurringExpense:
+    """
+    Create a recurring expense.
+
+    The scheduler creates one expense per occurrence, starting at ``start_at``
+    and repeating every ``interval`` days, weeks or months.
+
+    Args:
+        template (RecurringExpenseCreate): The expense to repeat and its schedule.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        RecurringExpense: The created recurring expense.
+    """
+    return cre(db=db, template=template, owner_id=current_user.id)
+
+
+@router.get("/", response_model=List[RecurringExpense], dependencies=[Depends(JWTBearer())])
+def list_recurring_expenses(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> List[RecurringExpense]:
+    """
+    Retrieve the current user's recurring expenses.
+
+    Args:
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        List[RecurringExpense]: The recurring expenses, including deactivated ones.
+    """
+    return gre(db=db, owner_id=current_user.id)
+
+
+@router.delete(
+    "/{template_id}",
+    status_code=sac.HTTP_NO_CONTENT,
+    dependencies=[Depends(JWTBearer())],
+)
+def deactivate_recurring_expense(
+    template_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Response:
+    """
+    Stop a recurring expense.
+
+    Expenses it already created are kept.
+
+    Args:
+        template_id (int): The ID of the recurring expense.
+        db (Session): Database session dependency.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        Response: An empty 204 response.
+    """
+    dre(db=db, template_id=template_id, owner_id=current_user.id)
+    return Response(status_code=sac.HTTP_NO_CONTENT)
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
-from app.utils.curd import get_user_by_email, create_user as cu, get_user
-from app.database.schemas.user_schema import User, UserCreate
-from app.utils.dependencies import get_db, JWTBearer, get_current_user
+from app.utils.curd import (
+    get_user_by_email,
+    create_user as cu,
+    create_users_bulk,
+    get_user,
+    get_user_rows,
+    get_users_by_ids,
+)
+from app.database.schemas.user_schema import User, UserCreate, UserBulkCreateResult
+from app.utils.dependencies import get_db, JWTBearer, get_current_user, require_admin_token
 from typing import List
 from app.utils.status import status_codes as sac
-from app.models.models import User as model_user
+from app.utils.responses import FastJSONResponse
+from app.utils.serializers import users_to_json, bulk_create_result_to_json
 
 router: APIRouter = APIRouter()
 
@@ -31,6 +39,67 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)) -> User:
         raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="Email already registered")
     return cu(db=db, user=user)
 
+@router.get(
+    "/",
+    response_model=List[User],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(JWTBearer())],
+)
+def read_users(
+    ids: List[str] = Query(..., description="User IDs, comma separated or repeated"),
+    db: Session = Depends(get_db),
+) -> FastJSONResponse:
+    """
+    Retrieve several users by ID.
+
+    This function resolves up to 1000 IDs with a single query. Accepts
+    ``?ids=1,2,3`` as well as ``?ids=1&ids=2``; unknown IDs are left out.
+
+    Args:
+        ids (List[str]): The IDs of the users to retrieve.
+        db (Session): Database session dependency.
+
+    Returns:
+        FastJSONResponse: The users found, ordered by ID.
+
+    Raises:
+        HTTPException: If an ID is not an integer or more than 1000 are requested.
+    """
+    try:
+        user_ids: List[int] = [int(value) for item in ids for value in item.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="User IDs must be integers")
+    if len(user_ids) > 1000:
+        raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="At most 1000 user IDs per request")
+    return FastJSONResponse(users_to_json(get_users_by_ids(db, user_ids)))
+
+@router.post(
+    "/bulk",
+    response_model=UserBulkCreateResult,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_admin_token)],
+)
+def create_users(
+    users: List[UserCreate] = Body(..., max_length=1000),
+    db: Session = Depends(get_db),
+) -> FastJSONResponse:
+    """
+    Create many users at once. Only available with the operator token.
+
+    This function registers every user whose email is not already taken.
+    Registered emails, and emails repeated within the request, are skipped
+    rather than failing the whole batch.
+
+    Args:
+        users (List[UserCreate]): The users to create, at most 1000.
+        db (Session): Database session dependency.
+
+    Returns:
+        FastJSONResponse: The created users and the skipped emails.
+    """
+    created, skipped = create_users_bulk(db, users)
+    return FastJSONResponse(bulk_create_result_to_json(created, skipped))
+
 @router.get("/current_user", response_model=User, dependencies=[Depends(JWTBearer())])
 def current_users(current_user: User = Depends(get_current_user)) -> User:
     """
@@ -46,20 +115,26 @@ def current_users(current_user: User = Depends(get_current_user)) -> User:
     """
     return current_user
 
-@router.get("/all", response_model=List[User], dependencies=[Depends(JWTBearer())])
-def all_users(db: Session = Depends(get_db)) -> List[User]:
+@router.get(
+    "/all",
+    response_model=List[User],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(JWTBearer())],
+)
+def all_users(db: Session = Depends(get_db)) -> FastJSONResponse:
     """
     Retrieve all users.
 
-    This function returns a list of all users in the database.
+    This function returns a list of all users in the database. The rows are
+    serialized directly, without loading ORM objects or re-validating them.
 
     Args:
         db (Session): Database session dependency.
 
     Returns:
-        List[User]: A list of all user objects.
+        FastJSONResponse: A list of all user objects.
     """
-    return db.query(model_user).all()
+    return FastJSONResponse(users_to_json(get_user_rows(db)))
 
 @router.get("/{user_id}", response_model=User, dependencies=[Depends(JWTBearer())])
 def read_user(user_id: int, db: Session = Depends(get_db)) -> User:
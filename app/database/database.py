@@ -1,15 +1,225 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, Insert, Update, Delete, TextClause
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from app.config.config import settings
+from typing import Any, Dict, Iterator, List
+import itertools
 import os
+import re
+import threading
+import time
 
-engine: create_engine = create_engine(
-    os.environ.get("SQLALCHEMY_DATABASE_URL", "sqlite:///expense_sharing_app.db"),
-    connect_args={"check_same_thread": False},
+TEXT_LOCKING_READ: re.Pattern = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b")
+
+
+def create_db_engine(url: str) -> Engine:
+    """
+    Create the SQLAlchemy engine for a database URL.
+
+    SQLite connections are shared across the request thread pool, so the
+    same-thread check is disabled. Server databases such as PostgreSQL get a
+    sized connection pool (``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``) with
+    pre-ping so connections dropped by the server are replaced transparently.
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        pool_pre_ping=True,
+    )
+
+
+def is_text_write(clause: Any) -> bool:
+    """
+    Tell whether a statement is textual SQL that is not a plain ``SELECT``.
+
+    Args:
+        clause (Any): The statement being executed, if any.
+
+    Returns:
+        bool: True for a ``TextClause`` that does not start with ``SELECT``,
+        or that locks rows with ``FOR UPDATE`` or ``FOR SHARE``.
+    """
+    if not isinstance(clause, TextClause):
+        return False
+    sql: str = clause.text.lstrip(" \t\r\n(").upper()
+    return not sql.startswith("SELECT") or bool(TEXT_LOCKING_READ.search(sql))
+
+
+class RoutingSession(Session):
+    """
+    Session that sends writes to the primary and reads to the replicas.
+
+    Reads rotate round-robin over the replica engines. Once a session has
+    written anything it stays on the primary, so it can read back its own
+    changes. When no replicas are configured everything goes to the primary.
+
+    Reads that must see the latest committed data (authentication, checks
+    made before a write) ask for the primary in one of three ways:
+
+    - ``.execution_options(use_primary=True)`` on a query or statement sends
+      that statement alone to the primary;
+    - ``with_for_update()`` locks the rows on the primary and pins the session,
+      since the caller is about to write;
+    - ``use_primary(db)`` pins the whole session.
+
+    Textual SQL is routed by its leading keyword: only ``SELECT`` statements
+    count as reads. Call sites whose ``SELECT`` has side effects, such as
+    ``nextval()``, or that write through the raw connection, must pin the
+    session with ``use_primary`` themselves.
+    """
+
+    def __init__(self, replicas: Iterator[Engine] | None = None, **kwargs: Any) -> None:
+        """
+        Initialize the session.
+
+        Args:
+            replicas (Iterator[Engine] | None): A shared, endless round-robin of replica engines.
+            **kwargs (Any): Passed on to ``Session``; ``bind`` is the primary engine.
+        """
+        super().__init__(**kwargs)
+        self.replicas: Iterator[Engine] | None = replicas
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kwargs: Any) -> Engine:
+        """
+        Pick the engine for a statement.
+
+        Args:
+            mapper (Any): The mapper of the entity being queried, if any.
+            clause (Any): The statement being executed, if any.
+            **kwargs (Any): Additional arguments from ``Session``.
+
+        Returns:
+            Engine: The primary engine for writes, locking reads and pinned
+            sessions, otherwise a replica.
+        """
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)) or is_text_write(clause):
+            self.info["use_primary"] = True
+            self.info["wrote"] = True
+        elif getattr(clause, "_for_update_arg", None) is not None:
+            # SELECT ... FOR UPDATE reads to write: replicas can neither lock nor be current.
+            self.info["use_primary"] = True
+        if (
+            self.replicas is None
+            or self.info.get("use_primary")
+            or getattr(clause, "_execution_options", {}).get("use_primary")
+        ):
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return next(self.replicas)
+
+
+def use_primary(db: Session) -> None:
+    """
+    Send every further statement of a session to the primary.
+
+    Args:
+        db (Session): The database session.
+    """
+    db.info["use_primary"] = True
+
+
+# user ID -> monotonic time until which that user's reads stay on the primary.
+recent_writers: Dict[int, float] = {}
+recent_writers_lock: threading.Lock = threading.Lock()
+
+
+def mark_recent_write(user_id: int) -> None:
+    """
+    Keep a user's reads on the primary for ``REPLICA_STICKY_SECONDS`` after a write.
+
+    Args:
+        user_id (int): The ID of the user who wrote.
+    """
+    now: float = time.monotonic()
+    with recent_writers_lock:
+        if len(recent_writers) >= 10_000:
+            for writer, until in list(recent_writers.items()):
+                if until < now:
+                    del recent_writers[writer]
+        recent_writers[user_id] = now + float(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+
+def track_session_user(db: Session, user_id: int) -> None:
+    """
+    Attach the authenticated user to a session.
+
+    Commits with writes are then remembered for that user, and the session is
+    pinned to the primary if the user wrote recently, so users always read
+    their own writes even while the replicas lag.
+
+    Args:
+        db (Session): The request's database session.
+        user_id (int): The ID of the authenticated user.
+    """
+    db.info["user_id"] = user_id
+    if recent_writers.get(user_id, 0) > time.monotonic():
+        db.info["use_primary"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_writer(db: Session) -> None:
+    """
+    Record the session's user as a recent writer when a commit contained writes.
+
+    Args:
+        db (Session): The session that committed.
+    """
+    if db.info.pop("wrote", False) and db.info.get("user_id") is not None:
+        mark_recent_write(db.info["user_id"])
+
+
+engine: Engine = create_db_engine(
+    os.environ.get("SQLALCHEMY_DATABASE_URL", "sqlite:///expense_sharing_app.db")
 )
+replica_engines: List[Engine] = [
+    create_db_engine(url.strip())
+    for url in os.environ.get("SQLALCHEMY_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
 SessionLocal: sessionmaker = sessionmaker(
-    autocommit=False, autoflush=False, bind=engine
+    class_=RoutingSession,
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    replicas=itertools.cycle(replica_engines) if replica_engines else None,
 )
 
 Base = declarative_base()
+
+
+def dispose_engine_after_fork() -> None:
+    """
+    Give a forked worker its own connection pool.
+
+    The engine is created at import time, so when a pre-forking server imports
+    the app before forking, every worker inherits the parent's pooled
+    connections. Disposing without closing drops those references without
+    touching sockets still owned by the parent; the worker then opens fresh
+    connections on first use.
+    """
+    for db_engine in [engine, *replica_engines]:
+        db_engine.dispose(close=False)
+
+
+def dispose_engine() -> None:
+    """
+    Close every pooled connection, used on graceful shutdown.
+    """
+    for db_engine in [engine, *replica_engines]:
+        db_engine.dispose()
+
+
+# Runs in the child of every fork: gunicorn workers as well as any fork based
+# multiprocessing pool started by the app.
+os.register_at_fork(after_in_child=dispose_engine_after_fork)
@@ -0,0 +1,102 @@
+from sqlalchemy import Table, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List
+from app.database.database import use_primary
+
+
+def is_postgres(db: Session) -> bool:
+    """
+    Check whether a session is bound to PostgreSQL.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        bool: True if the session talks to PostgreSQL.
+    """
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def supports_copy(db: Session) -> bool:
+    """
+    Check whether bulk loads can use ``COPY ... FROM STDIN``.
+
+    Only the psycopg (version 3) driver exposes the COPY protocol used here.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        bool: True if ``copy_rows`` can be used.
+    """
+    return is_postgres(db) and db.get_bind().dialect.driver == "psycopg"
+
+
+def reserve_ids(db: Session, table: Table, count: int) -> List[int]:
+    """
+    Reserve primary keys from a table's sequence in one round trip.
+
+    Args:
+        db (Session): A session bound to PostgreSQL.
+        table (Table): The table whose ``id`` sequence is used.
+        count (int): The number of IDs to reserve.
+
+    Returns:
+        List[int]: The reserved IDs, in ascending order.
+    """
+    # nextval() writes the sequence, which a read replica refuses.
+    use_primary(db)
+    return list(
+        db.scalars(
+            text(
+                "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                "FROM generate_series(1, :count)"
+            ),
+            {"table": table.name, "count": count},
+        )
+    )
+
+
+def copy_rows(db: Session, table: Table, rows: List[Dict[str, Any]]) -> None:
+    """
+    Stream rows into a table with ``COPY`` inside the session's transaction.
+
+    Args:
+        db (Session): A session bound to PostgreSQL through psycopg.
+        table (Table): The target table.
+        rows (List[Dict[str, Any]]): The rows to load. Every row must have the same keys.
+    """
+    if not rows:
+        return
+    columns: List[str] = list(rows[0])
+    quote = db.get_bind().dialect.identifier_preparer.quote
+    statement: str = "COPY {} ({}) FROM STDIN".format(
+        quote(table.name), ", ".join(quote(column) for column in columns)
+    )
+    # The raw connection bypasses statement routing; take it from the primary.
+    use_primary(db)
+    driver_connection: Any = db.connection().connection.driver_connection
+    with driver_connection.cursor() as cursor:
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+
+
+def upsert(db: Session, table: Table) -> Any:
+    """
+    Build an ``INSERT`` that supports ``on_conflict_do_update``.
+
+    Both PostgreSQL and SQLite implement ``INSERT ... ON CONFLICT``, which
+    lets concurrent writers increment counters without reading them first.
+
+    Args:
+        db (Session): The database session.
+        table (Table): The target table.
+
+    Returns:
+        Any: The dialect specific insert construct.
+    """
+    if is_postgres(db):
+        return postgresql.insert(table)
+    return sqlite.insert(table)
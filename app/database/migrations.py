@@ -0,0 +1,69 @@
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from app.database.database import Base
+from app.models import models  # noqa: F401 - registers the tables
+from typing import List, Set
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Add the columns and indexes that tables created by an older release lack.
+
+    ``create_all`` only creates missing tables, never alters existing ones, so
+    a database from before soft deletes, currencies or the covering indexes
+    would fail on its first query. This compares every existing table with
+    its model and runs ``ALTER TABLE ... ADD COLUMN`` for each missing column,
+    then creates the missing indexes. New columns are nullable, and the code
+    reads NULL as the old behaviour (live row, base currency, rate 1). It is
+    idempotent and must run before ``create_all``, whose search index hook
+    reads the new columns.
+
+    Args:
+        engine (Engine): The primary database engine.
+
+    Returns:
+        List[str]: The ``ALTER TABLE`` statements that were run.
+    """
+    executed: List[str] = []
+    with engine.begin() as connection:
+        existing: Set[str] = set(inspect(connection).get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            executed.extend(add_missing_columns(connection, table))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return executed
+
+
+def add_missing_columns(connection: Connection, table: Table) -> List[str]:
+    """
+    Add the model columns an existing table does not have.
+
+    Args:
+        connection (Connection): The connection running the DDL.
+        table (Table): The model's table.
+
+    Returns:
+        List[str]: The statements that were run.
+
+    Raises:
+        RuntimeError: If a missing column is NOT NULL without a server default,
+            which cannot be added to a table that has rows.
+    """
+    present: Set[str] = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    quote = connection.dialect.identifier_preparer.quote
+    # Concurrent upgrades on PostgreSQL must not fail on a column another process just added.
+    if_not_exists: str = "IF NOT EXISTS " if connection.dialect.name == "postgresql" else ""
+    statements: List[str] = []
+    for column in table.columns:
+        if column.name in present:
+            continue
+        if not column.nullable and column.server_default is None:
+            raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a default")
+        definition: str = str(CreateColumn(column).compile(dialect=connection.dialect))
+        statement: str = f"ALTER TABLE {quote(table.name)} ADD COLUMN {if_not_exists}{definition}"
+        connection.execute(text(statement))
+        statements.append(statement)
+    return statements
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
     
@@ -8,10 +8,13 @@ class BalanceSheetDetail(BaseModel):
     description: str
     amount: float
     split_method: str
+    currency: Optional[str] = None
 
 class BalanceSheet(BaseModel):
     user_id: int
     total_amount: float
+    owed_amount: float = 0.0
+    currency: Optional[str] = None
     details: List[BalanceSheetDetail]
 
 class OverallBalanceSheetDetail(BaseModel):
@@ -20,4 +23,13 @@ class OverallBalanceSheetDetail(BaseModel):
     total_amount: float
 
 class OverallBalanceSheet(BaseModel):
-    balance_sheets: List[OverallBalanceSheetDetail]
\ No newline at end of file
+    balance_sheets: List[OverallBalanceSheetDetail]
+
+class SettlementTransfer(BaseModel):
+    from_user_id: int
+    to_user_id: int
+    amount: float
+
+class Settlement(BaseModel):
+    currency: str
+    transfers: List[SettlementTransfer]
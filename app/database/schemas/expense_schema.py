@@ -1,14 +1,18 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 
 
 class ExpenseBase(BaseModel):
     amount: float
     description: str
     split_method: str
+    currency: Optional[str] = Field(default=None, pattern=r"^[A-Z]{3}$")
+    expense_date: Optional[date] = None
 
 
 class ExpenseSplit(BaseModel):
+    id: Optional[int] = None
     user_id: int
     amount: Optional[float] = None
     percentage: Optional[float] = None
@@ -18,7 +22,50 @@ class ExpenseCreate(ExpenseBase):
     splits: List[ExpenseSplit]
 
 
+class ExpenseUpdate(BaseModel):
+    amount: Optional[float] = None
+    description: Optional[str] = None
+    split_method: Optional[str] = None
+    currency: Optional[str] = Field(default=None, pattern=r"^[A-Z]{3}$")
+    expense_date: Optional[date] = None
+    splits: Optional[List[ExpenseSplit]] = None
+
+
 class Expense(ExpenseBase):
     id: int
     owner_id: int
     splits: List[ExpenseSplit]
+
+
+class ExpensePage(BaseModel):
+    expenses: List[Expense]
+    next_cursor: Optional[int]
+
+
+class ExpenseImportResult(BaseModel):
+    expense_ids: List[int]
+
+
+class ExpenseEvent(BaseModel):
+    id: int
+    event_type: str
+    expense_id: int
+    owner_id: int
+    payload: Dict[str, Any]
+    created_at: datetime
+
+
+class ExpenseEventPage(BaseModel):
+    events: List[ExpenseEvent]
+    next_cursor: int
+
+
+class ExpenseSearchResult(ExpenseBase):
+    id: int
+    owner_id: int
+    rank: float
+
+
+class ExpenseSearchPage(BaseModel):
+    results: List[ExpenseSearchResult]
+    next_offset: Optional[int]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+
+class Liveness(BaseModel):
+    status: str
+
+
+class ReadinessCheck(BaseModel):
+    ok: bool
+    current: Optional[float] = None
+    limit: Optional[float] = None
+    detail: Optional[str] = None
+
+
+class Readiness(BaseModel):
+    status: str  # "ready" or "not_ready"
+    checks: Dict[str, ReadinessCheck]
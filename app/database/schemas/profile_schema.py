@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    status_code: Optional[int]
+    duration_ms: float
+    samples: int
+    created_at: datetime
@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
+from app.database.schemas.expense_schema import ExpenseSplit
+
+
+class RecurringExpenseBase(BaseModel):
+    amount: float
+    description: str
+    split_method: str
+    currency: Optional[str] = Field(default=None, pattern=r"^[A-Z]{3}$")
+    splits: List[ExpenseSplit]
+    frequency: Literal["daily", "weekly", "monthly"]
+    interval: int = Field(default=1, ge=1, le=366)
+
+
+class RecurringExpenseCreate(RecurringExpenseBase):
+    start_at: Optional[datetime] = None
+
+
+class RecurringExpense(RecurringExpenseBase):
+    id: int
+    owner_id: int
+    start_at: datetime
+    run_count: int
+    next_run_at: Optional[datetime] = None
+    last_error: Optional[str] = None
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from typing import List
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -10,3 +11,7 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     id: int
+
+class UserBulkCreateResult(BaseModel):
+    created: List[User]
+    skipped: List[EmailStr]
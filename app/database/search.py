@@ -0,0 +1,283 @@
+from sqlalchemy import Date, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.database.database import Base
+from app.database.dialects import is_postgres
+from app.models import models
+from typing import Any, Dict, Iterable, List, Tuple
+import re
+import unicodedata
+
+# Cap on the number of words in a query, so a pasted paragraph cannot build a huge match expression.
+MAX_QUERY_TERMS: int = 16
+# Length of the indexed prefixes. A prefix query reads the merged postings of every term
+# starting with it unless an index of exactly that prefix length exists, so longer prefixes
+# are matched on their first characters and narrowed down by ``rank_hits``.
+PREFIX_LENGTH: int = 3
+# BM25 term frequency saturation and length normalization.
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+
+# One document per expense member: the owner (rowid = -expense ID) and every live split
+# (rowid = split ID). Each carries a ``u<user ID>`` token, so a search is the intersection
+# of the user's token with the query terms inside the index.
+SQLITE_DDL: List[str] = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(description, member, expense_id UNINDEXED, "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='{PREFIX_LENGTH}')",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses "
+    "WHEN new.deleted_at IS NULL BEGIN "
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "VALUES (-new.id, new.description, 'u' || new.owner_id, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description, owner_id, deleted_at "
+    "ON expenses BEGIN "
+    "DELETE FROM expenses_fts WHERE rowid = -old.id "
+    "OR rowid IN (SELECT id FROM expense_splits WHERE expense_id = old.id); "
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "SELECT -new.id, new.description, 'u' || new.owner_id, new.id WHERE new.deleted_at IS NULL; "
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "SELECT s.id, new.description, 'u' || s.user_id, new.id FROM expense_splits s "
+    "WHERE s.expense_id = new.id AND s.deleted_at IS NULL AND new.deleted_at IS NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN "
+    "DELETE FROM expenses_fts WHERE rowid = -old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS expense_splits_fts_insert AFTER INSERT ON expense_splits "
+    "WHEN new.deleted_at IS NULL BEGIN "
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "SELECT new.id, e.description, 'u' || new.user_id, e.id FROM expenses e "
+    "WHERE e.id = new.expense_id AND e.deleted_at IS NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS expense_splits_fts_update AFTER UPDATE OF expense_id, user_id, deleted_at "
+    "ON expense_splits BEGIN "
+    "DELETE FROM expenses_fts WHERE rowid = old.id; "
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "SELECT new.id, e.description, 'u' || new.user_id, e.id FROM expenses e "
+    "WHERE e.id = new.expense_id AND e.deleted_at IS NULL AND new.deleted_at IS NULL; END",
+    "CREATE TRIGGER IF NOT EXISTS expense_splits_fts_delete AFTER DELETE ON expense_splits BEGIN "
+    "DELETE FROM expenses_fts WHERE rowid = old.id; END",
+]
+
+SQLITE_REBUILD: str = (
+    "INSERT INTO expenses_fts(rowid, description, member, expense_id) "
+    "SELECT -id, description, 'u' || owner_id, id FROM expenses WHERE deleted_at IS NULL "
+    "UNION ALL SELECT s.id, e.description, 'u' || s.user_id, e.id "
+    "FROM expense_splits s JOIN expenses e ON e.id = s.expense_id "
+    "WHERE s.deleted_at IS NULL AND e.deleted_at IS NULL"
+)
+
+POSTGRES_DDL: List[str] = [
+    "CREATE INDEX IF NOT EXISTS ix_expenses_description_fts ON expenses "
+    "USING GIN (to_tsvector('simple', coalesce(description, '')))",
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target: Any, connection: Connection, **kw: Any) -> None:
+    """
+    Create the full-text index over expense descriptions, if it is missing.
+
+    SQLite gets an FTS5 table of expense members kept in sync by triggers on
+    ``expenses`` and ``expense_splits``, so every write path (ORM, bulk
+    inserts, raw SQL) updates it in the same transaction. PostgreSQL gets a
+    GIN index over the description's ``tsvector``. Runs after every
+    ``create_all`` and only builds what does not exist yet, indexing the
+    expenses already present.
+
+    Args:
+        target (Any): The metadata being created.
+        connection (Connection): The connection running the DDL.
+    """
+    dialect: str = connection.dialect.name
+    if dialect == "sqlite":
+        exists: bool = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'")
+        ).first() is not None
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(SQLITE_REBUILD))
+    elif dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_search_index(target: Any, connection: Connection, **kw: Any) -> None:
+    """
+    Drop the SQLite FTS5 table together with the tables it indexes.
+
+    Args:
+        target (Any): The metadata being dropped.
+        connection (Connection): The connection running the DDL.
+    """
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS expenses_fts"))
+
+
+def fold(value: str) -> str:
+    """
+    Lower case a string and strip its diacritics, as the FTS5 tokenizer does.
+
+    Args:
+        value (str): The string to fold.
+
+    Returns:
+        str: The folded string.
+    """
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", value.lower()) if not unicodedata.combining(char)
+    )
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Split a user supplied query into plain words.
+
+    Only letters, digits and underscores survive, so FTS5 and ``tsquery``
+    operators in the input are never interpreted.
+
+    Args:
+        query (str): The raw query.
+
+    Returns:
+        List[str]: At most ``MAX_QUERY_TERMS`` folded words.
+    """
+    return re.findall(r"\w+", fold(query))[:MAX_QUERY_TERMS]
+
+
+def fts5_query(user_id: int, terms: List[str]) -> str:
+    """
+    Build an FTS5 match expression over a user's documents requiring every term.
+
+    The last term is matched as a prefix through the prefix index, on its
+    first ``PREFIX_LENGTH`` characters; shorter last terms must match a whole
+    word.
+
+    Args:
+        user_id (int): The searching user's ID.
+        terms (List[str]): Words from ``search_terms``.
+
+    Returns:
+        str: The match expression, e.g. ``member : "u7" AND description : ("rent" "jul"*)``.
+    """
+    phrases: List[str] = [f'"{term}"' for term in terms[:-1]]
+    last: str = terms[-1]
+    phrases.append(f'"{last[:PREFIX_LENGTH]}"*' if len(last) >= PREFIX_LENGTH else f'"{last}"')
+    return f'member : "u{user_id}" AND description : ({" ".join(phrases)})'
+
+
+def tsquery(terms: List[str]) -> str:
+    """
+    Build a ``to_tsquery`` expression requiring every term, the last as a
+    prefix once it is ``PREFIX_LENGTH`` characters long.
+
+    Args:
+        terms (List[str]): Words from ``search_terms``.
+
+    Returns:
+        str: The query, e.g. ``rent & jul:*``.
+    """
+    last: str = terms[-1] + ":*" if len(terms[-1]) >= PREFIX_LENGTH else terms[-1]
+    return " & ".join(terms[:-1] + [last])
+
+
+def rank_hits(hits: Iterable[Tuple[int, str]], terms: List[str]) -> List[Tuple[int, float]]:
+    """
+    Score matching expenses with BM25 term saturation and length normalization.
+
+    FTS5's own ``bm25()`` also weighs terms by how many documents in the
+    whole index contain them, and counting that means reading the term's
+    entire posting list on every query: hundreds of milliseconds for a
+    common word over millions of expenses. Every hit contains every term,
+    so that weight only shifts terms against each other; it is left out,
+    as ``ts_rank`` does on PostgreSQL. Lengths are normalized against the
+    hits' average. Hits without a word starting with the whole last term
+    are dropped, as the index only matched its first characters.
+
+    Args:
+        hits (Iterable[Tuple[int, str]]): Expense IDs with their descriptions,
+            possibly repeated.
+        terms (List[str]): Words from ``search_terms``, the last one a prefix.
+
+    Returns:
+        List[Tuple[int, float]]: Expense IDs with their scores, best first,
+        ties broken by expense ID.
+    """
+    documents: Dict[int, List[str]] = {}
+    for expense_id, description in hits:
+        if expense_id not in documents:
+            tokens: List[str] = re.findall(r"\w+", fold(description or ""))
+            if any(token.startswith(terms[-1]) for token in tokens):
+                documents[expense_id] = tokens
+    if not documents:
+        return []
+    average: float = sum(len(tokens) for tokens in documents.values()) / len(documents) or 1.0
+    scores: List[Tuple[int, float]] = []
+    for expense_id, tokens in documents.items():
+        norm: float = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / average)
+        score: float = 0.0
+        for term in terms[:-1]:
+            frequency: int = tokens.count(term)
+            score += frequency * (BM25_K1 + 1) / (frequency + norm)
+        frequency = sum(1 for token in tokens if token.startswith(terms[-1]))
+        score += frequency * (BM25_K1 + 1) / (frequency + norm)
+        scores.append((expense_id, score))
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return scores
+
+
+def search_expense_rows(
+    db: Session, user_id: int, query: str, limit: int, offset: int
+) -> List[Dict[str, Any]]:
+    """
+    Search the descriptions of the live expenses a user owns or is split into.
+
+    On SQLite the index returns only the user's matching expenses, which are
+    ranked by ``rank_hits``; PostgreSQL ranks with ``ts_rank``. Ties are
+    broken by expense ID so pages are stable.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The searching user's ID.
+        query (str): The raw query.
+        limit (int): The page size.
+        offset (int): The number of results to skip.
+
+    Returns:
+        List[Dict[str, Any]]: Expenses with ``id``, ``amount``, ``description``,
+        ``split_method``, ``currency``, ``expense_date``, ``owner_id`` and
+        ``rank`` keys, best first.
+    """
+    terms: List[str] = search_terms(query)
+    if not terms:
+        return []
+    if is_postgres(db):
+        statement: str = (
+            "SELECT e.id, e.amount, e.description, e.split_method, e.currency, e.expense_date, e.owner_id, "
+            "ts_rank(to_tsvector('simple', coalesce(e.description, '')), q) AS rank "
+            "FROM expenses e, to_tsquery('simple', :query) q "
+            "WHERE to_tsvector('simple', coalesce(e.description, '')) @@ q AND e.deleted_at IS NULL "
+            "AND (e.owner_id = :user_id OR EXISTS (SELECT 1 FROM expense_splits s WHERE s.expense_id = e.id "
+            "AND s.user_id = :user_id AND s.deleted_at IS NULL)) "
+            "ORDER BY rank DESC, e.id LIMIT :limit OFFSET :offset"
+        )
+        rows: List[Any] = db.execute(
+            text(statement).columns(expense_date=Date),
+            {"query": tsquery(terms), "user_id": user_id, "limit": limit, "offset": offset},
+        ).all()
+        return [row._asdict() for row in rows]
+    hits: List[Any] = db.execute(
+        text("SELECT expense_id, description FROM expenses_fts WHERE expenses_fts MATCH :query"),
+        {"query": fts5_query(user_id, terms)},
+    ).all()
+    page: List[Tuple[int, float]] = rank_hits(hits, terms)[offset:offset + limit]
+    expenses: Dict[int, Any] = {
+        row.id: row
+        for row in db.query(
+            models.Expense.id,
+            models.Expense.amount,
+            models.Expense.description,
+            models.Expense.split_method,
+            models.Expense.currency,
+            models.Expense.expense_date,
+            models.Expense.owner_id,
+        ).filter(models.Expense.id.in_([expense_id for expense_id, _ in page]))
+    }
+    return [{**expenses[expense_id]._asdict(), "rank": rank} for expense_id, rank in page]
@@ -0,0 +1,176 @@
+from sqlalchemy import Table, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from app.database.database import Base, create_db_engine
+from app.database.dialects import copy_rows, is_postgres, supports_copy
+from app.database import search  # noqa: F401 - registers the search index DDL
+from app.models import models  # noqa: F401 - registers the tables
+from typing import Any, Callable, Dict, List
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+
+SQLITE_MAGIC: bytes = b"SQLite format 3\x00"
+RESTORE_BATCH_SIZE: int = 10_000
+
+
+def save_snapshot(engine: Engine, path: str, portable: bool = False) -> None:
+    """
+    Write a snapshot of every table to a file, replacing it if it exists.
+
+    Seeding a large dataset row by row takes minutes; restoring a snapshot of
+    it takes seconds. SQLite databases are saved with ``VACUUM INTO``, which
+    writes a compact, defragmented copy of the file, search index and
+    triggers included. Other databases, and SQLite with ``portable``, are
+    dumped to gzipped JSON lines.
+
+    Args:
+        engine (Engine): The database to snapshot.
+        path (str): The snapshot file.
+        portable (bool): Write gzipped JSON lines even from SQLite, so the
+            snapshot can be restored into another database.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    if engine.dialect.name == "sqlite" and not portable:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM INTO :path"), {"path": path})
+        return
+    with Session(engine) as db, gzip.open(path, "wt", encoding="utf-8") as file:
+        for table in Base.metadata.sorted_tables:
+            columns: List[str] = [column.name for column in table.columns]
+            file.write(json.dumps({"table": table.name, "columns": columns}) + "\n")
+            result = db.execute(select(table).order_by(*table.primary_key.columns)).yield_per(
+                RESTORE_BATCH_SIZE
+            )
+            for row in result:
+                file.write(json.dumps(list(row), default=lambda value: value.isoformat()) + "\n")
+
+
+def restore_snapshot(engine: Engine, path: str) -> None:
+    """
+    Replace the contents of a database with a snapshot.
+
+    SQLite snapshots are copied in with SQLite's online backup API. JSON
+    lines snapshots are loaded with bulk inserts, or ``COPY`` on PostgreSQL
+    through psycopg.
+
+    Sessions open on the database must be closed first. Process local caches
+    such as the exchange rates are not told about the new data, so restore
+    before the application starts serving.
+
+    Args:
+        engine (Engine): The database to overwrite.
+        path (str): A file written by ``save_snapshot``.
+
+    Raises:
+        ValueError: If a SQLite snapshot is restored into another database.
+    """
+    with open(path, "rb") as file:
+        is_sqlite: bool = file.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    if is_sqlite:
+        if engine.dialect.name != "sqlite":
+            raise ValueError("A SQLite snapshot can only be restored into SQLite")
+        source: sqlite3.Connection = sqlite3.connect(path)
+        target: Any = engine.raw_connection()
+        try:
+            source.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+        return
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    tables: Dict[str, Table] = Base.metadata.tables
+    with Session(engine) as db, gzip.open(path, "rt", encoding="utf-8") as file:
+        table: Table | None = None
+        columns: List[str] = []
+        parsers: Dict[str, Callable[[str], Any]] = {}
+        rows: List[Dict[str, Any]] = []
+        for line in file:
+            record: Any = json.loads(line)
+            if isinstance(record, dict):
+                # A header line starts the next table.
+                load_rows(db, table, rows)
+                table, columns, rows = tables[record["table"]], record["columns"], []
+                parsers = {
+                    name: table.columns[name].type.python_type.fromisoformat
+                    for name in columns
+                    if table.columns[name].type.python_type in (date, datetime)
+                }
+                continue
+            row: Dict[str, Any] = dict(zip(columns, record))
+            for name, parse in parsers.items():
+                if row[name] is not None:
+                    row[name] = parse(row[name])
+            rows.append(row)
+            if len(rows) >= RESTORE_BATCH_SIZE:
+                load_rows(db, table, rows)
+                rows = []
+        load_rows(db, table, rows)
+        if is_postgres(db):
+            for table in Base.metadata.sorted_tables:
+                if "id" in table.columns and table.columns["id"].autoincrement is not False:
+                    db.execute(
+                        text(
+                            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                            "(SELECT COALESCE(MAX(id), 0) + 1 FROM {}), false)".format(
+                                db.get_bind().dialect.identifier_preparer.quote(table.name)
+                            )
+                        ),
+                        {"table": table.name},
+                    )
+        db.commit()
+
+
+def load_rows(db: Session, table: Table | None, rows: List[Dict[str, Any]]) -> None:
+    """
+    Bulk insert one batch of restored rows.
+
+    Args:
+        db (Session): The database session.
+        table (Table | None): The target table.
+        rows (List[Dict[str, Any]]): The rows, all with the same keys.
+    """
+    if table is None or not rows:
+        return
+    if supports_copy(db):
+        copy_rows(db, table, rows)
+    else:
+        db.execute(insert(table), rows)
+
+
+def main() -> None:
+    """
+    Save or restore a database snapshot from the command line.
+
+    Usage:
+        python -m app.database.snapshot save seeded.db
+        python -m app.database.snapshot restore seeded.db --url sqlite:///bench.db
+        python -m app.database.snapshot save seeded.jsonl.gz --portable
+    """
+    parser = argparse.ArgumentParser(
+        description="Save a database to a snapshot file, or restore one, for fast test and benchmark setup."
+    )
+    parser.add_argument("command", choices=["save", "restore"])
+    parser.add_argument("path", help="the snapshot file")
+    parser.add_argument("--portable", action="store_true", help="save gzipped JSON lines from SQLite too")
+    parser.add_argument(
+        "--url",
+        default=os.environ.get("SQLALCHEMY_DATABASE_URL", "sqlite:///expense_sharing_app.db"),
+        help="the database URL (default: SQLALCHEMY_DATABASE_URL)",
+    )
+    args = parser.parse_args()
+    engine: Engine = create_db_engine(args.url)
+    if args.command == "save":
+        save_snapshot(engine, args.path, portable=args.portable)
+    else:
+        restore_snapshot(engine, args.path)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,89 @@
 
-from fastapi import FastAPI
-from app.api.apiv1 import api_router
-from app.database.database import engine, Base
 from dotenv import load_dotenv
 
+# Load .env before the app modules read their settings at import time.
 load_dotenv()
 
+from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+from app.api.apiv1 import api_router
+from app.api.endpoints import health
+from app.database.database import engine, Base, SessionLocal, dispose_engine
+from app.database.migrations import upgrade_schema
+from app.utils.curd import backfill_user_balances
+from app.utils.exchange_rates import load_exchange_rates
+from app.utils.maintenance import maintenance_loop
+from app.utils.revocation import denylist_sync_loop
+from app.utils.scheduler import scheduler_loop
+from app.utils.security import shutdown_password_hash_pool
+from app.utils.profiling import ProfilingMiddleware, profiler
+from app.utils.compression import CompressionMiddleware, compression_settings
+from app.utils.rate_limit import (
+    RateLimitMiddleware,
+    ConcurrencyLimitMiddleware,
+    rate_limit_backend,
+    concurrency_limiter,
+)
+import asyncio
+import os
+
+# Existing tables first gain the columns added since they were created; create_all never alters them.
+upgrade_schema(engine)
 Base.metadata.create_all(bind=engine)
 
-app  : FastAPI = FastAPI(title="Convin Backend Intern Project (Daily Expense Sharing App)")
+with SessionLocal() as db:
+    if os.environ.get("EXCHANGE_RATES_FILE"):
+        load_exchange_rates(db, os.environ["EXCHANGE_RATES_FILE"])
+    backfill_user_balances(db)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Run startup and shutdown work for each server process.
+
+    While serving, background tasks periodically purge tombstones and other
+    expired rows, copy the access tokens revoked by other workers into this
+    one's denylist, and create the expenses of due recurring expenses (unless
+    ``SCHEDULER_ENABLED`` is ``false``). On shutdown, after the server has
+    finished the in-flight requests, those tasks are cancelled, the password
+    hashing processes are stopped and the connection pool is drained so no
+    connection is left open on the database.
+
+    Args:
+        app (FastAPI): The application.
+
+    Yields:
+        None: Control while the application is serving requests.
+    """
+    tasks: List[asyncio.Task] = [
+        asyncio.create_task(maintenance_loop()),
+        asyncio.create_task(denylist_sync_loop()),
+    ]
+    if os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true":
+        tasks.append(asyncio.create_task(scheduler_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    shutdown_password_hash_pool()
+    dispose_engine()
+
+
+app  : FastAPI = FastAPI(
+    title="Convin Backend Intern Project (Daily Expense Sharing App)", lifespan=lifespan
+)
 
 app.include_router(api_router, prefix="/api/v1")
+# Probes live at the root, where load balancers and orchestrators look for them.
+app.include_router(health.router, tags=["Health"])
+
+# Middleware added last runs first: shed load before spending time on rate limiting, and
+# only profile requests that were admitted. Without a sample rate or an admin token the
+# profiler is left out of the stack entirely. Compression wraps the app directly, so
+# every streamed chunk is compressed as it is produced.
+app.add_middleware(CompressionMiddleware, **compression_settings)
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+app.add_middleware(ConcurrencyLimitMiddleware, limiter=concurrency_limiter)
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from app.database.database import Base
 
 class User(Base):
@@ -15,24 +16,131 @@ class User(Base):
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # A user's expenses in ID order, for keyset pages.
+        Index("ix_expenses_owner_id_id", "owner_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float)
     description = Column(String)
     split_method = Column(String)  # "equal", "exact", "percentage"
     owner_id = Column(Integer, ForeignKey("users.id"))
+    currency = Column(String(3), nullable=True)  # ISO 4217 code, NULL on rows predating currencies (base currency)
+    expense_date = Column(Date, nullable=True)
+    exchange_rate = Column(Float, nullable=True)  # base currency units per unit, fixed at write time
+    deleted_at = Column(DateTime, nullable=True, index=True)  # soft delete tombstone
 
     owner = relationship("User", back_populates="expenses")
-    splits = relationship("ExpenseSplit", back_populates="expense")
+    # Only live splits; rows are written through bulk inserts, never through this collection.
+    splits = relationship(
+        "ExpenseSplit",
+        primaryjoin="and_(Expense.id == ExpenseSplit.expense_id, ExpenseSplit.deleted_at.is_(None))",
+        order_by="ExpenseSplit.id",
+        viewonly=True,
+    )
 
 class ExpenseSplit(Base):
     __tablename__ = "expense_splits"
+    __table_args__ = (
+        # Covers "expenses a user takes part in": an index-only range scan by user, in expense order.
+        Index("ix_expense_splits_user_id_expense_id", "user_id", "expense_id", "deleted_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float)
     percentage = Column(Float, nullable=True) 
-    expense_id = Column(Integer, ForeignKey("expenses.id"))
+    expense_id = Column(Integer, ForeignKey("expenses.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    deleted_at = Column(DateTime, nullable=True, index=True)  # soft delete tombstone
 
-    expense = relationship("Expense", back_populates="splits")
-    user = relationship("User")
\ No newline at end of file
+    expense = relationship("Expense")
+    user = relationship("User")
+
+class UserBalance(Base):
+    __tablename__ = "user_balances"
+
+    # Maintained by deltas on every expense write instead of being re-summed on read.
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_amount = Column(Float, nullable=False, default=0.0)  # sum of live expenses the user owns
+    owed_amount = Column(Float, nullable=False, default=0.0)  # sum of the user's live splits
+
+class RecurringExpense(Base):
+    __tablename__ = "recurring_expenses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    amount = Column(Float)
+    description = Column(String)
+    split_method = Column(String)
+    currency = Column(String(3), nullable=True)
+    splits = Column(Text, nullable=False)  # JSON list of splits, as sent to create_expense
+    frequency = Column(String, nullable=False)  # "daily", "weekly", "monthly"
+    interval = Column(Integer, nullable=False, default=1)
+    start_at = Column(DateTime, nullable=False)
+    run_count = Column(Integer, nullable=False, default=0)  # occurrences materialized so far
+    next_run_at = Column(DateTime, nullable=True, index=True)  # NULL once deactivated
+    last_error = Column(String, nullable=True)
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)  # a slot, 1 to DATA_VERSION_SLOTS
+    version = Column(Integer, nullable=False, default=0)  # the data version is the sum over all slots
+    updated_at = Column(DateTime, nullable=False)
+
+class ExchangeRate(Base):
+    __tablename__ = "exchange_rates"
+    __table_args__ = (
+        UniqueConstraint("currency", "rate_date", name="uq_exchange_rates_currency_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), nullable=False)
+    rate_date = Column(Date, nullable=False)
+    rate = Column(Float, nullable=False)  # base currency units per unit of currency
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("owner_id", "key", name="uq_idempotency_keys_owner_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL while the original request is in flight
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    user = relationship("User")
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    # Access tokens revoked at logout, shared by every worker's in-memory denylist.
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)  # the token's exp; purged after it
+    revoked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+class ExpenseEvent(Base):
+    __tablename__ = "expense_events"
+
+    id = Column(Integer, primary_key=True, index=True)  # doubles as the change-feed cursor
+    event_type = Column(String, nullable=False)  # "expense.created", ...
+    expense_id = Column(Integer, nullable=False, index=True)
+    owner_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
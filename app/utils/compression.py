@@ -0,0 +1,208 @@
+from starlette.datastructures import Headers, MutableHeaders
+from typing import Any, Callable, Dict, Tuple
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES: Tuple[str, ...] = ("text/", "application/json", "application/xml")
+# Event streams must reach the client as soon as each event is written.
+UNCOMPRESSED_TYPES: Tuple[str, ...] = ("text/event-stream",)
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an ``Accept-Encoding`` header.
+
+    Args:
+        accept_encoding (str): The header value, for example ``"br;q=1.0, gzip;q=0.8"``.
+
+    Returns:
+        Dict[str, float]: The quality of each listed coding, lower-cased.
+    """
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality: float = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if coding:
+            qualities[coding.strip().lower()] = quality
+    return qualities
+
+
+class Compressor:
+    """
+    Incremental gzip or brotli encoder of one response body.
+    """
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        """
+        Initialize the encoder.
+
+        Args:
+            encoding (str): ``"br"`` or ``"gzip"``.
+            gzip_level (int): The zlib compression level, 1 to 9.
+            brotli_quality (int): The brotli quality, 0 to 11.
+        """
+        self.encoding: str = encoding
+        if encoding == "br":
+            self._brotli: Any = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 31 writes the gzip header and trailer around the deflate stream.
+            self._zlib: Any = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Feed a chunk of the body.
+
+        Args:
+            data (bytes): The uncompressed chunk.
+
+        Returns:
+            bytes: Whatever compressed output is ready, possibly nothing.
+        """
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        """
+        End the stream.
+
+        Returns:
+            bytes: The remaining compressed output.
+        """
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with brotli or gzip as the client accepts.
+
+    Bodies are compressed chunk by chunk as the application sends them, so
+    a ``StreamingResponse`` is never buffered in full and its memory use
+    stays bounded by the chunk size. A response sent in one piece is only
+    compressed from ``minimum_size`` bytes, where the saving outweighs the
+    CPU spent. Brotli is preferred when the ``brotli`` package is installed;
+    otherwise gzip is used. Already encoded bodies, event streams and
+    non-text types are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        """
+        Initialize the middleware.
+
+        Args:
+            app (Any): The wrapped ASGI application.
+            minimum_size (int): The smallest single-chunk body that is compressed.
+            gzip_level (int): The zlib compression level, 1 to 9.
+            brotli_quality (int): The brotli quality, 0 to 11.
+        """
+        self.app: Any = app
+        self.minimum_size: int = minimum_size
+        self.gzip_level: int = gzip_level
+        self.brotli_quality: int = brotli_quality
+
+    def negotiate(self, scope: Dict[str, Any]) -> str | None:
+        """
+        Pick the content coding of a response.
+
+        Args:
+            scope (Dict[str, Any]): The ASGI connection scope.
+
+        Returns:
+            str | None: ``"br"``, ``"gzip"``, or None to send the body as is.
+        """
+        qualities: Dict[str, float] = accepted_encodings(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if brotli is not None and qualities.get("br", 0) > 0:
+            return "br"
+        if qualities.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def compressible(self, headers: MutableHeaders, status: int) -> bool:
+        """
+        Check whether a response may be compressed.
+
+        Args:
+            headers (MutableHeaders): The response headers.
+            status (int): The response status code.
+
+        Returns:
+            bool: True for text-like bodies that carry no content coding yet.
+        """
+        content_type: str = headers.get("content-type", "").lower()
+        return (
+            status not in (204, 304)
+            and "content-encoding" not in headers
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith(UNCOMPRESSED_TYPES)
+        )
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        encoding: str | None = self.negotiate(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start: Dict[str, Any] = {}
+        compressor: Compressor | None = None
+        passthrough: bool = False
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            nonlocal compressor, passthrough
+            if message["type"] == "http.response.start":
+                start.update(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body: bytes = message.get("body", b"")
+            more_body: bool = message.get("more_body", False)
+            if compressor is None:
+                headers: MutableHeaders = MutableHeaders(raw=start.setdefault("headers", []))
+                if not self.compressible(headers, start["status"]) or (
+                    not more_body and len(body) < self.minimum_size
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+            data: bytes = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            elif not data:
+                return
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+compression_settings: Dict[str, int] = {
+    "minimum_size": int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024)),
+    "gzip_level": int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6)),
+    "brotli_quality": int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4)),
+}
@@ -1,12 +1,38 @@
+from sqlalchemy import insert, func, select, union
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from app.models import models
-from app.utils.security import hash_password
+from app.database.database import use_primary
+from app.database.dialects import supports_copy, reserve_ids, copy_rows, upsert
+from app.database.search import search_expense_rows
+from app.utils.data_version import bump_data_version
+from app.utils.idempotency import complete_idempotency_key
+from app.utils.security import (
+    hash_password,
+    hash_passwords,
+    generate_refresh_token,
+    hash_refresh_token,
+)
 from app.database.schemas.user_schema import UserCreate, User
-from app.database.schemas.expense_schema import ExpenseCreate, Expense
-from app.database.schemas.balance_sheet_schema import BalanceSheet
+from app.database.schemas.expense_schema import (
+    ExpenseBase,
+    ExpenseCreate,
+    ExpenseUpdate,
+    ExpenseSplit,
+    Expense,
+)
+from app.database.schemas.balance_sheet_schema import BalanceSheet, Settlement
+from app.database.schemas.recurring_expense_schema import RecurringExpenseCreate, RecurringExpense
 from fastapi import HTTPException
 from app.utils.status import status_codes as sac
-from typing import List, Any, Dict
+from app.utils.user_cache import known_user_ids
+from app.utils.exchange_rates import exchange_rates, base_currency, today
+from typing import List, Any, Dict, Iterable, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
+import calendar
+import heapq
+import json
+import os
 
 def create_user(db: Session, user: UserCreate) -> User:
     """
@@ -26,6 +52,7 @@ def create_user(db: Session, user: UserCreate) -> User:
         hashed_password=hash_password(user.password),
     )
     db.add(db_user)
+    bump_data_version(db)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -34,6 +61,9 @@ def get_user_by_email(db: Session, email: str) -> (Any | None):
     """
     Retrieve a user by their email.
 
+    Read from the primary: logins and the duplicate check at registration
+    must see users created moments ago.
+
     Args:
         db (Session): The database session.
         email (str): The user's email.
@@ -41,7 +71,12 @@ def get_user_by_email(db: Session, email: str) -> (Any | None):
     Returns:
         Any | None: The user if found, otherwise None.
     """
-    return db.query(models.User).filter(models.User.email == email).first()
+    return (
+        db.query(models.User)
+        .filter(models.User.email == email)
+        .execution_options(use_primary=True)
+        .first()
+    )
 
 def get_user(db: Session, user_id: int) -> (User | None):
     """
@@ -56,138 +91,1539 @@ def get_user(db: Session, user_id: int) -> (User | None):
     """
     return db.query(models.User).filter(models.User.id == user_id).first()
 
-def create_new_expense(db: Session, expense: ExpenseCreate, owner_id: int) -> Expense:
+def get_users_by_ids(db: Session, user_ids: List[int]) -> List[Any]:
+    """
+    Retrieve the public columns of several users with a single ``IN`` query.
+
+    Args:
+        db (Session): The database session.
+        user_ids (List[int]): The users' IDs.
+
+    Returns:
+        List[Any]: Rows with ``id``, ``email``, ``name`` and ``mobile`` columns
+        for the users that exist, ordered by ID.
+    """
+    if not user_ids:
+        return []
+    return (
+        db.query(models.User.id, models.User.email, models.User.name, models.User.mobile)
+        .filter(models.User.id.in_(set(user_ids)))
+        .order_by(models.User.id)
+        .all()
+    )
+
+def create_users_bulk(
+    db: Session, users: List[UserCreate], batch_size: int = 500
+) -> Tuple[List[Any], List[str]]:
+    """
+    Create many users, skipping emails that are already registered.
+
+    Existing emails are found with one query, passwords are hashed in
+    parallel by ``hash_passwords``, and the users are inserted in batches of
+    ``batch_size`` rows within one transaction.
+
+    Args:
+        db (Session): The database session.
+        users (List[UserCreate]): The users to create.
+        batch_size (int): The number of rows per ``INSERT``.
+
+    Returns:
+        Tuple[List[Any], List[str]]: Rows of the created users, in input order,
+        and the emails that were skipped because they already exist or repeat
+        an earlier entry of the request.
+
+    Raises:
+        HTTPException: If another request registered one of the emails meanwhile (409).
+    """
+    # Read from the primary: an email a replica has not seen yet would fail the whole batch.
+    existing : Set[str] = set(
+        db.scalars(
+            select(models.User.email)
+            .where(models.User.email.in_({user.email for user in users}))
+            .execution_options(use_primary=True)
+        )
+    )
+    new_users : List[UserCreate] = []
+    skipped : List[str] = []
+    for user in users:
+        if user.email in existing:
+            skipped.append(user.email)
+        else:
+            existing.add(user.email)
+            new_users.append(user)
+    hashed : List[str] = hash_passwords([user.password for user in new_users])
+    rows : List[Dict[str, Any]] = [
+        {
+            "email": user.email,
+            "name": user.name,
+            "mobile": user.mobile,
+            "hashed_password": hashed_password,
+        }
+        for user, hashed_password in zip(new_users, hashed)
+    ]
+    statement = insert(models.User).returning(
+        models.User.id,
+        models.User.email,
+        models.User.name,
+        models.User.mobile,
+        sort_by_parameter_order=True,
+    )
+    created : List[Any] = []
+    try:
+        for start in range(0, len(rows), batch_size):
+            created.extend(db.execute(statement, rows[start:start + batch_size]).all())
+        bump_data_version(db)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=sac.HTTP_CONFLICT,
+            detail="An email was registered concurrently, retry the request.",
+        )
+    return created, skipped
+
+def create_refresh_token(db: Session, user_id: int) -> str:
+    """
+    Issue a new refresh token for a user.
+
+    Only the token's hash is stored, so a leaked table cannot be replayed.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user the token belongs to.
+
+    Returns:
+        str: The plaintext refresh token.
+    """
+    token : str = generate_refresh_token()
+    expires_at : datetime = datetime.now(timezone.utc) + timedelta(
+        days=float(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 14))
+    )
+    db.add(
+        models.RefreshToken(
+            token_hash=hash_refresh_token(token), user_id=user_id, expires_at=expires_at
+        )
+    )
+    db.commit()
+    return token
+
+def consume_refresh_token(db: Session, token: str) -> (User | None):
+    """
+    Redeem a refresh token, revoking it so it can only be used once.
+
+    The token is found through the unique index on its hash and claimed with a
+    conditional update, so two concurrent refreshes cannot both succeed.
+    Presenting a token that was already rotated revokes every refresh token
+    of that user, since it means the token has leaked. The lookup is read
+    from the primary: a lagging replica would refuse a token issued moments
+    ago and could miss that a token was already rotated.
+
+    Args:
+        db (Session): The database session.
+        token (str): The plaintext refresh token.
+
+    Returns:
+        User | None: The token's owner if the token was valid, otherwise None.
+    """
+    now : datetime = datetime.now(timezone.utc)
+    use_primary(db)
+    record : models.RefreshToken | None = (
+        db.query(models.RefreshToken)
+        .filter(models.RefreshToken.token_hash == hash_refresh_token(token))
+        .first()
+    )
+    if record is None:
+        return None
+    user_id : int = record.user_id
+    already_revoked : bool = record.revoked_at is not None
+    claimed : int = (
+        db.query(models.RefreshToken)
+        .filter(
+            models.RefreshToken.id == record.id,
+            models.RefreshToken.revoked_at.is_(None),
+            models.RefreshToken.expires_at > now,
+        )
+        .update({"revoked_at": now}, synchronize_session=False)
+    )
+    db.commit()
+    if claimed:
+        return get_user(db, user_id)
+    if already_revoked:
+        revoke_refresh_tokens(db, user_id=user_id)
+    return None
+
+def revoke_refresh_tokens(db: Session, user_id: int, token: str | None = None) -> int:
+    """
+    Revoke one or all of a user's active refresh tokens.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user whose tokens are revoked.
+        token (str | None): The token to revoke. Revokes every token of the user if None.
+
+    Returns:
+        int: The number of revoked tokens.
+    """
+    query = db.query(models.RefreshToken).filter(
+        models.RefreshToken.user_id == user_id,
+        models.RefreshToken.revoked_at.is_(None),
+    )
+    if token is not None:
+        query = query.filter(models.RefreshToken.token_hash == hash_refresh_token(token))
+    revoked : int = query.update(
+        {"revoked_at": datetime.now(timezone.utc)}, synchronize_session=False
+    )
+    db.commit()
+    return revoked
+
+def build_split_rows(expense: ExpenseCreate) -> List[Dict[str, Any]]:
+    """
+    Compute the split rows of an expense according to its split method.
+
+    Args:
+        expense (ExpenseCreate): The expense information.
+
+    Returns:
+        List[Dict[str, Any]]: One ``{"user_id", "amount", "percentage"}`` row per split.
+
+    Raises:
+        HTTPException: If there are no splits, or the sum of split amounts or
+            percentages does not match the total amount.
+    """
+    if not expense.splits:
+        raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="An expense needs at least one split.")
+    if expense.split_method == "equal":
+        split_amount : float = round(expense.amount / len(expense.splits), 2)
+        return [
+            {"user_id": split.user_id, "amount": split_amount, "percentage": None}
+            for split in expense.splits
+        ]
+    elif expense.split_method == "exact":
+        total_split_amount : float = sum(split.amount or 0 for split in expense.splits)
+        if total_split_amount != expense.amount:
+            raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="The sum of split amounts does not equal the total amount.")
+        return [
+            {"user_id": split.user_id, "amount": round(split.amount, 2), "percentage": None}
+            for split in expense.splits
+        ]
+    elif expense.split_method == "percentage":
+        total_percentage : float = sum(split.percentage or 0 for split in expense.splits)
+        if total_percentage != 100:
+            raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="The sum of percentages does not equal 100.")
+        return [
+            {
+                "user_id": split.user_id,
+                "amount": round(expense.amount * (split.percentage / 100), 2),
+                "percentage": split.percentage,
+            }
+            for split in expense.splits
+        ]
+    return []
+
+def validate_participants(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    Check that every split participant is an existing user.
+
+    IDs seen recently are answered from ``known_user_ids``; the rest are
+    checked with a single ``SELECT id FROM users WHERE id IN (...)`` on the
+    primary, so a user created moments ago is not refused.
+
+    Args:
+        db (Session): The database session.
+        user_ids (Iterable[int]): The participants' IDs.
+
+    Raises:
+        HTTPException: If any participant does not exist.
+    """
+    unknown : Set[int] = known_user_ids.unknown(set(user_ids))
+    if not unknown:
+        return
+    found : Set[int] = set(
+        db.scalars(
+            select(models.User.id)
+            .where(models.User.id.in_(unknown))
+            .execution_options(use_primary=True)
+        )
+    )
+    known_user_ids.add(found)
+    missing : Set[int] = unknown - found
+    if missing:
+        raise HTTPException(
+            status_code=sac.HTTP_BAD_REQUEST,
+            detail=f"Unknown split participants: {sorted(missing)[:20]}",
+        )
+
+def expense_event_row(
+    event_type: str,
+    expense_id: int,
+    owner_id: int,
+    expense: ExpenseBase,
+    split_rows: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Build an outbox row describing the new state of an expense.
+
+    Args:
+        event_type (str): The event type, e.g. ``"expense.created"``.
+        expense_id (int): The expense's ID.
+        owner_id (int): The ID of the expense's owner.
+        expense (ExpenseBase): The expense's amount, description, split method,
+            currency and date.
+        split_rows (List[Dict[str, Any]]): The expense's split rows.
+
+    Returns:
+        Dict[str, Any]: The ``expense_events`` row, to be inserted in the same
+        transaction as the change it describes.
+    """
+    payload : Dict[str, Any] = {
+        "id": expense_id,
+        "amount": expense.amount,
+        "description": expense.description,
+        "split_method": expense.split_method,
+        "currency": expense.currency,
+        "expense_date": expense.expense_date.isoformat() if expense.expense_date else None,
+        "owner_id": owner_id,
+        "splits": [
+            {"user_id": row["user_id"], "amount": row["amount"]} for row in split_rows
+        ],
+    }
+    return {
+        "event_type": event_type,
+        "expense_id": expense_id,
+        "owner_id": owner_id,
+        "payload": json.dumps(payload),
+        "created_at": datetime.now(timezone.utc),
+    }
+
+def get_expense_events(
+    db: Session, user_id: int, after: int = 0, limit: int = 100, lag: float | None = None
+) -> Dict[str, Any]:
+    """
+    Read the expense change feed of one user.
+
+    A user sees the events of the expenses they own or have a split in,
+    tombstoned splits included, so they also learn of their removal.
+
+    Event IDs are handed out when a transaction inserts its event, but
+    concurrent transactions on PostgreSQL commit in any order, so event 11
+    can become visible before event 10. A consumer that advanced its cursor
+    to 11 would never see 10. Events are therefore only returned once they
+    are ``lag`` seconds old, and never past an event that is still younger
+    than that: every transaction that inserted an event below the cursor has
+    committed, as long as none takes longer than ``lag`` between inserting its
+    event and committing (events are inserted just before the commit).
+    ``created_at`` comes from the application servers' clocks, which must be
+    kept in sync. SQLite allows one writer at a time, so its events commit
+    in ID order and need no lag.
+
+    The cursor moves past other users' events too, up to the newest event
+    that is safe to pass, so an idle consumer does not rescan them on every
+    poll.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user reading the feed.
+        after (int): Only return events with an ID above this cursor.
+        limit (int): The maximum number of events to return.
+        lag (float | None): How old, in seconds, an event must be before it is
+            returned. Defaults to ``EVENT_VISIBILITY_LAG_SECONDS``, or 0 on SQLite.
+
+    Returns:
+        Dict[str, Any]: ``events``, in ID order with their payloads decoded,
+        and the ``next_cursor`` to pass back as ``after``.
+    """
+    if lag is None:
+        lag = 0.0 if db.get_bind().dialect.name == "sqlite" else float(
+            os.environ.get("EVENT_VISIBILITY_LAG_SECONDS", 2)
+        )
+    safe = [models.ExpenseEvent.id > after]
+    if lag > 0:
+        cutoff : datetime = datetime.now(timezone.utc) - timedelta(seconds=lag)
+        # The first event still inside the lag window; nothing at or above it is returned.
+        fence = (
+            select(func.min(models.ExpenseEvent.id))
+            .where(models.ExpenseEvent.id > after, models.ExpenseEvent.created_at > cutoff)
+            .scalar_subquery()
+        )
+        safe += [models.ExpenseEvent.created_at <= cutoff, (fence.is_(None)) | (models.ExpenseEvent.id < fence)]
+    # Read first, so no event at or below it can be missed by the query below.
+    horizon : int | None = db.scalar(select(func.max(models.ExpenseEvent.id)).where(*safe))
+    if horizon is None:
+        return {"events": [], "next_cursor": after}
+    member = (
+        select(models.ExpenseSplit.id)
+        .where(
+            models.ExpenseSplit.user_id == user_id,
+            models.ExpenseSplit.expense_id == models.ExpenseEvent.expense_id,
+        )
+        .exists()
+    )
+    rows = (
+        db.query(models.ExpenseEvent)
+        .filter(
+            models.ExpenseEvent.id > after,
+            models.ExpenseEvent.id <= horizon,
+            (models.ExpenseEvent.owner_id == user_id) | member,
+        )
+        .order_by(models.ExpenseEvent.id)
+        .limit(limit)
+        .all()
+    )
+    return {
+        "events": [
+            {
+                "id": row.id,
+                "event_type": row.event_type,
+                "expense_id": row.expense_id,
+                "owner_id": row.owner_id,
+                "payload": json.loads(row.payload),
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ],
+        "next_cursor": rows[-1].id if len(rows) == limit else horizon,
+    }
+
+def add_balance_deltas(
+    paid: Dict[int, float],
+    owed: Dict[int, float],
+    owner_id: int,
+    amount: float,
+    split_rows: List[Dict[str, Any]],
+    sign: int = 1,
+    rate: float = 1.0,
+) -> None:
+    """
+    Accumulate the balance changes caused by adding or removing an expense.
+
+    Balances are kept in the base currency, so amounts are multiplied by the
+    expense's exchange rate.
+
+    Args:
+        paid (Dict[int, float]): Per user change of ``total_amount``, updated in place.
+        owed (Dict[int, float]): Per user change of ``owed_amount``, updated in place.
+        owner_id (int): The ID of the expense's owner.
+        amount (float): The expense's amount.
+        split_rows (List[Dict[str, Any]]): The expense's split rows.
+        sign (int): 1 when the expense is added, -1 when it is removed.
+        rate (float): Base currency units per unit of the expense's currency.
+    """
+    factor : float = sign * rate
+    paid[owner_id] = paid.get(owner_id, 0.0) + factor * amount
+    for row in split_rows:
+        owed[row["user_id"]] = owed.get(row["user_id"], 0.0) + factor * row["amount"]
+
+def apply_balance_deltas(db: Session, paid: Dict[int, float], owed: Dict[int, float]) -> None:
+    """
+    Add balance changes to the ``user_balances`` rows, creating missing rows.
+
+    Each row is incremented in place with ``INSERT ... ON CONFLICT DO UPDATE``
+    inside the caller's transaction, so balances never need to be recomputed
+    from the expense tables. Rows are written in user ID order so concurrent
+    writers lock them in the same order.
+
+    Args:
+        db (Session): The database session.
+        paid (Dict[int, float]): Per user change of ``total_amount``.
+        owed (Dict[int, float]): Per user change of ``owed_amount``.
+    """
+    rows : List[Dict[str, Any]] = [
+        {
+            "user_id": user_id,
+            "total_amount": paid.get(user_id, 0.0),
+            "owed_amount": owed.get(user_id, 0.0),
+        }
+        for user_id in sorted(set(paid) | set(owed))
+        if user_id is not None
+    ]
+    if not rows:
+        return
+    table = models.UserBalance.__table__
+    statement = upsert(db, table)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                "total_amount": table.c.total_amount + statement.excluded.total_amount,
+                "owed_amount": table.c.owed_amount + statement.excluded.owed_amount,
+            },
+        ),
+        rows,
+    )
+
+def rebuild_user_balances(db: Session) -> None:
+    """
+    Recompute every ``user_balances`` row from the live expenses and splits.
+
+    Only needed to backfill balances for data written before the table
+    existed, or to repair it; regular writes maintain it by deltas.
+
+    Args:
+        db (Session): The database session.
+    """
+    rate = func.coalesce(models.Expense.exchange_rate, 1.0)
+    paid : Dict[int, float] = dict(
+        db.query(models.Expense.owner_id, func.sum(models.Expense.amount * rate))
+        .filter(models.Expense.deleted_at.is_(None))
+        .group_by(models.Expense.owner_id)
+        .all()
+    )
+    owed : Dict[int, float] = dict(
+        db.query(models.ExpenseSplit.user_id, func.sum(models.ExpenseSplit.amount * rate))
+        .join(models.Expense, models.Expense.id == models.ExpenseSplit.expense_id)
+        .filter(models.ExpenseSplit.deleted_at.is_(None))
+        .group_by(models.ExpenseSplit.user_id)
+        .all()
+    )
+    db.query(models.UserBalance).delete(synchronize_session=False)
+    apply_balance_deltas(db, paid, owed)
+    bump_data_version(db)
+    db.commit()
+
+def backfill_user_balances(db: Session) -> bool:
+    """
+    Build ``user_balances`` once if it is empty while expenses already exist.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        bool: True if the balances were rebuilt.
+    """
+    if db.query(models.UserBalance.user_id).first() is not None:
+        return False
+    if db.query(models.Expense.id).first() is None:
+        return False
+    rebuild_user_balances(db)
+    return True
+
+def create_new_expense(
+    db: Session,
+    expense: ExpenseCreate,
+    owner_id: int,
+    idempotency_key: Tuple[str, datetime] | None = None,
+) -> Expense:
     """
     Create a new expense and split it according to the specified method.
 
+    The splits and their participants are validated before anything is
+    written, and the expense, its splits, its ``expense.created`` outbox event
+    and the balance deltas are committed together or not at all. The splits go
+    in as one multi-row ``INSERT`` instead of one statement per split.
+
+    The expense defaults to the base currency and today's date; the exchange
+    rate in effect on that date is stored with it.
+
     Args:
         db (Session): The database session.
         expense (ExpenseCreate): The expense information.
         owner_id (int): The ID of the user creating the expense.
+        idempotency_key (Tuple[str, datetime] | None): The claimed idempotency
+            key and its claim time. The response is stored under it in the same
+            transaction, so a retry can never create the expense twice.
 
     Returns:
         Expense: The created expense.
 
     Raises:
-        HTTPException: If the sum of split amounts or percentages does not match the total amount.
+        HTTPException: If the sum of split amounts or percentages does not match
+            the total amount, a split participant does not exist, no exchange
+            rate is known for the currency (400), or a retry took the
+            idempotency key over (409).
     """
+    expense = expense.model_copy(update={
+        "currency": expense.currency or base_currency(),
+        "expense_date": expense.expense_date or today(),
+    })
+    split_rows : List[Dict[str, Any]] = build_split_rows(expense)
+    validate_participants(db, (row["user_id"] for row in split_rows))
+    rate : float = exchange_rates.rate(db, expense.currency, expense.expense_date)
     db_expense : models.Expense = models.Expense(
         amount=expense.amount,
         description=expense.description,
         split_method=expense.split_method,
+        currency=expense.currency,
+        expense_date=expense.expense_date,
+        exchange_rate=rate,
         owner_id=owner_id,
     )
-    db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
-    
-    if expense.split_method == "equal":
-        split_amount : float = round(db_expense.amount / len(expense.splits), 2)
-        for split in expense.splits:
-            db_expense_split : models.ExpenseSplit = models.ExpenseSplit(
-                user_id=split.user_id, expense_id=db_expense.id, amount=split_amount
-            )
-            db.add(db_expense_split)
-    elif expense.split_method == "exact":
-        total_split_amount : float = sum(split.amount for split in expense.splits)
-        if total_split_amount != db_expense.amount:
-            raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="The sum of split amounts does not equal the total amount.")
-        for split in expense.splits:
-            db_expense_split : models.ExpenseSplit = models.ExpenseSplit(
-                user_id=split.user_id,
-                expense_id=db_expense.id,
-                amount=round(split.amount, 2)
+    try:
+        db.add(db_expense)
+        db.flush()
+        if split_rows:
+            db.execute(
+                insert(models.ExpenseSplit),
+                [{**row, "expense_id": db_expense.id} for row in split_rows],
             )
-            db.add(db_expense_split)
-            
-    elif expense.split_method == "percentage":
-        total_percentage : float = sum(split.percentage for split in expense.splits)
-        if total_percentage != 100:
-            raise HTTPException(status_code=sac.HTTP_BAD_REQUEST, detail="The sum of percentages does not equal 100.")
-        for split in expense.splits:
-            amount : float = round(db_expense.amount * (split.percentage / 100), 2)
-            db_expense_split : models.ExpenseSplit = models.ExpenseSplit(
-                user_id=split.user_id,
-                expense_id=db_expense.id,
-                amount=amount
+        db.execute(
+            insert(models.ExpenseEvent),
+            [expense_event_row("expense.created", db_expense.id, owner_id, expense, split_rows)],
+        )
+        paid : Dict[int, float] = {}
+        owed : Dict[int, float] = {}
+        add_balance_deltas(paid, owed, owner_id, expense.amount, split_rows, rate=rate)
+        apply_balance_deltas(db, paid, owed)
+        if idempotency_key is not None:
+            key, claimed_at = idempotency_key
+            complete_idempotency_key(
+                db, key, owner_id, claimed_at, sac.HTTP_OK,
+                Expense.model_validate(db_expense, from_attributes=True).model_dump_json(),
             )
-            db.add(db_expense_split)
-
-    db.commit()
+        bump_data_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(db_expense)
 
     return db_expense
 
-def get_user_expenses(db: Session, user_id: int) -> List[Expense]:
+def bulk_import_expenses(db: Session, expenses: List[ExpenseCreate], owner_id: int) -> List[int]:
+    """
+    Create many expenses, their splits, their outbox events and the balance
+    deltas in one transaction.
+
+    On PostgreSQL with the psycopg driver, IDs are reserved from the sequence
+    and both tables are streamed in with ``COPY``. Other backends insert all
+    expenses with a single ``INSERT ... RETURNING`` and all splits with one
+    multi-row ``INSERT``. Exchange rates for the whole batch are resolved
+    from the rate cache in one pass.
+
+    Args:
+        db (Session): The database session.
+        expenses (List[ExpenseCreate]): The expenses to create.
+        owner_id (int): The ID of the user creating the expenses.
+
+    Returns:
+        List[int]: The IDs of the created expenses, in input order.
+
+    Raises:
+        HTTPException: If any expense's splits do not add up, name a user that
+            does not exist, or use a currency without a known rate; nothing is
+            written then.
+    """
+    base : str = base_currency()
+    on : date = today()
+    expenses = [
+        expense.model_copy(update={
+            "currency": expense.currency or base,
+            "expense_date": expense.expense_date or on,
+        })
+        for expense in expenses
+    ]
+    split_rows : List[List[Dict[str, Any]]] = [build_split_rows(expense) for expense in expenses]
+    validate_participants(db, (row["user_id"] for rows in split_rows for row in rows))
+    rates : List[float] = exchange_rates.rates_for(
+        db, ((expense.currency, expense.expense_date) for expense in expenses)
+    )
+    expense_rows : List[Dict[str, Any]] = [
+        {
+            "amount": expense.amount,
+            "description": expense.description,
+            "split_method": expense.split_method,
+            "currency": expense.currency,
+            "expense_date": expense.expense_date,
+            "exchange_rate": rate,
+            "owner_id": owner_id,
+        }
+        for expense, rate in zip(expenses, rates)
+    ]
+    if not expense_rows:
+        return []
+    try:
+        if supports_copy(db):
+            expense_ids : List[int] = reserve_ids(db, models.Expense.__table__, len(expense_rows))
+            for expense_id, row in zip(expense_ids, expense_rows):
+                row["id"] = expense_id
+            copy_rows(db, models.Expense.__table__, expense_rows)
+            copy_rows(db, models.ExpenseSplit.__table__, [
+                {**row, "expense_id": expense_id}
+                for expense_id, rows in zip(expense_ids, split_rows)
+                for row in rows
+            ])
+        else:
+            expense_ids : List[int] = db.scalars(
+                insert(models.Expense).returning(models.Expense.id, sort_by_parameter_order=True),
+                expense_rows,
+            ).all()
+            all_split_rows : List[Dict[str, Any]] = [
+                {**row, "expense_id": expense_id}
+                for expense_id, rows in zip(expense_ids, split_rows)
+                for row in rows
+            ]
+            if all_split_rows:
+                db.execute(insert(models.ExpenseSplit), all_split_rows)
+        db.execute(insert(models.ExpenseEvent), [
+            expense_event_row("expense.created", expense_id, owner_id, expense, rows)
+            for expense_id, expense, rows in zip(expense_ids, expenses, split_rows)
+        ])
+        paid : Dict[int, float] = {}
+        owed : Dict[int, float] = {}
+        for expense, rows, rate in zip(expenses, split_rows, rates):
+            add_balance_deltas(paid, owed, owner_id, expense.amount, rows, rate=rate)
+        apply_balance_deltas(db, paid, owed)
+        bump_data_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return list(expense_ids)
+
+def get_user_rows(db: Session) -> List[Any]:
     """
-    Retrieve all expenses for a specific user.
+    Retrieve the public columns of every user as plain rows.
 
     Args:
         db (Session): The database session.
+
+    Returns:
+        List[Any]: Rows with ``id``, ``email``, ``name`` and ``mobile`` columns.
+    """
+    return (
+        db.query(models.User.id, models.User.email, models.User.name, models.User.mobile)
+        .order_by(models.User.id)
+        .all()
+    )
+
+def expense_rows_query(db: Session, owner_id: int | None = None) -> Any:
+    """
+    Build the query selecting expenses as plain rows.
+
+    Args:
+        db (Session): The database session.
+        owner_id (int | None): Only select expenses owned by this user, if given.
+
+    Returns:
+        Any: A query over ``id``, ``amount``, ``description``, ``split_method``,
+        ``currency``, ``expense_date`` and ``owner_id``, ordered by owner and
+        expense ID.
+    """
+    query = db.query(
+        models.Expense.id,
+        models.Expense.amount,
+        models.Expense.description,
+        models.Expense.split_method,
+        models.Expense.currency,
+        models.Expense.expense_date,
+        models.Expense.owner_id,
+    ).filter(models.Expense.deleted_at.is_(None))
+    if owner_id is not None:
+        query = query.filter(models.Expense.owner_id == owner_id)
+    return query.order_by(models.Expense.owner_id, models.Expense.id)
+
+def get_expense_rows(db: Session, owner_id: int | None = None) -> List[Any]:
+    """
+    Retrieve expenses as plain rows, skipping ORM object hydration.
+
+    Args:
+        db (Session): The database session.
+        owner_id (int | None): Only return expenses owned by this user, if given.
+
+    Returns:
+        List[Any]: Rows with ``id``, ``amount``, ``description``, ``split_method``,
+        ``currency``, ``expense_date`` and ``owner_id`` columns, ordered by owner
+        and expense ID.
+    """
+    return expense_rows_query(db, owner_id=owner_id).all()
+
+def user_expense_ids(
+    user_id: int, involved: bool = False, after: int = 0, limit: int | None = None
+) -> Any:
+    """
+    Build the subquery selecting the IDs of a user's live expenses, in ID order.
+
+    The owned side is read from the ``owner_id`` index and the participating
+    side from the covering ``(user_id, expense_id, deleted_at)`` index on
+    splits. Each side starts after the cursor and stops at ``limit`` before
+    the union, so a page reads at most ``2 * limit`` index entries however
+    long the user's history is.
+
+    Args:
         user_id (int): The user's ID.
+        involved (bool): Also select the expenses the user has a live split in.
+        after (int): Only select IDs above this cursor.
+        limit (int | None): The maximum number of IDs, all of them if None.
 
     Returns:
-        List[Expense]: A list of expenses for the user.
+        Any: A subquery with a single ``id`` column.
     """
-    return db.query(models.Expense).filter(models.Expense.owner_id == user_id).all()
+    owned = (
+        select(models.Expense.id.label("id"))
+        .where(
+            models.Expense.owner_id == user_id,
+            models.Expense.deleted_at.is_(None),
+            models.Expense.id > after,
+        )
+        .order_by(models.Expense.id)
+        .limit(limit)
+    )
+    if not involved:
+        return owned.subquery()
+    shared = (
+        select(models.ExpenseSplit.expense_id.label("id"))
+        .where(
+            models.ExpenseSplit.user_id == user_id,
+            models.ExpenseSplit.deleted_at.is_(None),
+            models.ExpenseSplit.expense_id > after,
+        )
+        .distinct()
+        .order_by(models.ExpenseSplit.expense_id)
+        .limit(limit)
+    )
+    ids = union(select(owned.subquery().c.id), select(shared.subquery().c.id)).subquery()
+    return select(ids.c.id).order_by(ids.c.id).limit(limit).subquery()
 
-def get_all_expenses(db: Session) -> List[Expense]:
+def get_split_rows(db: Session, expense_ids: Any) -> List[Any]:
     """
-    Retrieve all expenses.
+    Retrieve the live splits of a set of expenses as plain rows.
 
     Args:
         db (Session): The database session.
+        expense_ids (Any): A subquery selecting the expense IDs, as built by ``user_expense_ids``.
 
     Returns:
-        List[Expense]: A list of all expenses.
+        List[Any]: Rows with ``id``, ``expense_id``, ``user_id``, ``amount`` and ``percentage`` columns.
     """
-    return db.query(models.Expense).all()
+    return (
+        db.query(
+            models.ExpenseSplit.id,
+            models.ExpenseSplit.expense_id,
+            models.ExpenseSplit.user_id,
+            models.ExpenseSplit.amount,
+            models.ExpenseSplit.percentage,
+        )
+        .filter(
+            models.ExpenseSplit.expense_id.in_(select(expense_ids.c.id)),
+            models.ExpenseSplit.deleted_at.is_(None),
+        )
+        .order_by(models.ExpenseSplit.id)
+        .all()
+    )
 
-def get_expenses_by_user(db: Session, user_id: int) -> List[Expense]:
+def get_user_expenses(
+    db: Session, user_id: int, involved: bool = False, after: int = 0, limit: int | None = None
+) -> Tuple[List[Any], List[Any]]:
     """
-    Retrieve all expenses for a specific user.
+    Retrieve a user's live expenses and their splits as plain rows, in expense ID order.
+
+    Pages are keyed on the expense ID: pass the last ID of a page as
+    ``after`` to read the next one.
 
     Args:
         db (Session): The database session.
         user_id (int): The user's ID.
+        involved (bool): Also return the expenses the user has a live split in,
+            not only the ones they own.
+        after (int): Only return expenses with an ID above this cursor.
+        limit (int | None): The maximum number of expenses, all of them if None.
 
     Returns:
-        List[Expense]: A list of expenses for the user.
+        Tuple[List[Any], List[Any]]: The expense rows, as returned by
+        ``get_expense_rows``, and the rows of their splits.
     """
-    return db.query(models.Expense).filter(models.Expense.owner_id == user_id).all()
+    expense_ids = user_expense_ids(user_id, involved=involved, after=after, limit=limit)
+    expense_rows : List[Any] = (
+        expense_rows_query(db)
+        .join(expense_ids, expense_ids.c.id == models.Expense.id)
+        .order_by(None)
+        .order_by(models.Expense.id)
+        .all()
+    )
+    return expense_rows, get_split_rows(db, expense_ids)
 
-def get_balance_sheet(db: Session, user_id: int) -> BalanceSheet:
+def search_expenses(db: Session, user_id: int, query: str, limit: int, offset: int = 0) -> Dict[str, Any]:
+    """
+    Search the descriptions of the expenses a user owns or participates in.
+
+    One row more than the page size is read to tell whether another page exists.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The searching user's ID.
+        query (str): The raw query.
+        limit (int): The page size.
+        offset (int): The number of results to skip.
+
+    Returns:
+        Dict[str, Any]: The ranked ``results`` and the ``next_offset`` to pass
+        back for the next page, or None on the last page.
+    """
+    rows : List[Dict[str, Any]] = search_expense_rows(db, user_id, query, limit + 1, offset)
+    return {
+        "results": rows[:limit],
+        "next_offset": offset + limit if len(rows) > limit else None,
+    }
+
+def get_user_balances(db: Session) -> Dict[int, Any]:
+    """
+    Retrieve the maintained balance of every user.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        Dict[int, Any]: Rows with ``total_amount`` and ``owed_amount`` keyed by user ID.
+    """
+    return {
+        row.user_id: row
+        for row in db.query(
+            models.UserBalance.user_id,
+            models.UserBalance.total_amount,
+            models.UserBalance.owed_amount,
+        )
+    }
+
+def report_converter(db: Session, currency: str | None) -> Tuple[str, Any]:
+    """
+    Build the conversion from the base currency into a report currency.
+
+    Reports use the rate in effect today.
+
+    Args:
+        db (Session): The database session.
+        currency (str | None): The report currency; the base currency if None.
+
+    Returns:
+        Tuple[str, Any]: The report currency and a function converting a base
+        currency amount into it.
+
+    Raises:
+        HTTPException: If no rate is known for the currency.
+    """
+    currency = currency or base_currency()
+    rate : float = exchange_rates.rate(db, currency, today())
+    if rate == 1.0:
+        return currency, lambda amount: amount
+    return currency, lambda amount: round(amount / rate, 2)
+
+def get_balance_sheet(db: Session, user_id: int, currency: str | None = None) -> BalanceSheet:
     """
     Generate the balance sheet for a specific user.
 
+    The totals are read from the maintained ``user_balances`` row instead of
+    being summed over the user's expenses. The details keep each expense's
+    own amount and currency.
+
     Args:
         db (Session): The database session.
         user_id (int): The user's ID.
+        currency (str | None): The currency of the totals; the base currency if None.
 
     Returns:
         BalanceSheet: The balance sheet for the user.
     """
-    expenses : List[Expense] = get_expenses_by_user(db, user_id)
-    total_amount : float = sum(expense.amount for expense in expenses)
+    currency, convert = report_converter(db, currency)
+    balance : models.UserBalance | None = db.get(models.UserBalance, user_id)
     return {
         "user_id": user_id,
-        "total_amount": total_amount,
-        "details": expenses
+        "total_amount": convert(balance.total_amount) if balance else 0.0,
+        "owed_amount": convert(balance.owed_amount) if balance else 0.0,
+        "currency": currency,
+        "details": get_expense_rows(db, owner_id=user_id),
     }
 
-def get_overall_balance_sheet(db: Session) -> List[BalanceSheet]:
+def get_overall_balance_sheet(db: Session, currency: str | None = None) -> List[BalanceSheet]:
     """
     Generate the overall balance sheet for all users.
 
+    Reads every expense in a single query and groups it by owner, instead of
+    running one query per user. The totals come from ``user_balances``.
+
     Args:
         db (Session): The database session.
+        currency (str | None): The currency of the totals; the base currency if None.
 
     Returns:
         List[BalanceSheet]: A list of balance sheets for all users.
     """
-    users : List[User] = db.query(models.User).all()
-    balance_sheets : List[BalanceSheet] = []
-    for user in users:
-        balance_sheet : BalanceSheet = get_balance_sheet(db, user.id)
-        balance_sheets.append(balance_sheet)
-    return balance_sheets
+    currency, convert = report_converter(db, currency)
+    user_ids : List[int] = [row.id for row in db.query(models.User.id).order_by(models.User.id)]
+    details : Dict[int, List[Any]] = {user_id: [] for user_id in user_ids}
+    for expense in get_expense_rows(db):
+        details.setdefault(expense.owner_id, []).append(expense)
+    balances : Dict[int, Any] = get_user_balances(db)
+    return [
+        {
+            "user_id": user_id,
+            "total_amount": convert(balances[user_id].total_amount) if user_id in balances else 0.0,
+            "owed_amount": convert(balances[user_id].owed_amount) if user_id in balances else 0.0,
+            "currency": currency,
+            "details": details[user_id],
+        }
+        for user_id in user_ids
+    ]
+
+def get_settlement(db: Session, currency: str | None = None) -> Settlement:
+    """
+    Compute the transfers that settle every balance.
+
+    Each user's net position is what they paid minus what they owe, both in
+    the base currency. The largest debtor repeatedly pays the largest
+    creditor, which settles everyone with at most one transfer fewer than
+    the number of users with a non-zero position.
+
+    Args:
+        db (Session): The database session.
+        currency (str | None): The currency of the transfers; the base currency if None.
+
+    Returns:
+        Settlement: The transfers, largest first.
+    """
+    currency, convert = report_converter(db, currency)
+    creditors : List[Tuple[float, int]] = []
+    debtors : List[Tuple[float, int]] = []
+    for user_id, balance in get_user_balances(db).items():
+        net : float = balance.total_amount - balance.owed_amount
+        if net > 0.005:
+            creditors.append((-net, user_id))
+        elif net < -0.005:
+            debtors.append((net, user_id))
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers : List[Dict[str, Any]] = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount : float = min(-credit, -debt)
+        transfers.append({"from_user_id": debtor, "to_user_id": creditor, "amount": convert(amount)})
+        if -credit - amount > 0.005:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt - amount > 0.005:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return {"currency": currency, "transfers": transfers}
+
+def get_owned_expense(db: Session, expense_id: int, owner_id: int) -> models.Expense:
+    """
+    Retrieve a live expense and check that the user owns it, locking its row.
+
+    The row stays locked (``SELECT ... FOR UPDATE``, on the primary) until the
+    caller commits, so concurrent updates and deletes of one expense run one
+    after the other and each sees the splits the previous one left. SQLite
+    has no row locks; there the writes also claim their rows with
+    ``deleted_at IS NULL`` conditions and check what they claimed.
+
+    Args:
+        db (Session): The database session.
+        expense_id (int): The expense's ID.
+        owner_id (int): The ID of the user making the change.
+
+    Returns:
+        models.Expense: The expense.
+
+    Raises:
+        HTTPException: If the expense does not exist or was deleted (404), or
+            belongs to another user (403).
+    """
+    db_expense : models.Expense | None = (
+        db.query(models.Expense)
+        .filter(models.Expense.id == expense_id, models.Expense.deleted_at.is_(None))
+        .with_for_update()
+        .first()
+    )
+    if db_expense is None:
+        db.rollback()
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Expense not found")
+    if db_expense.owner_id != owner_id:
+        db.rollback()
+        raise HTTPException(status_code=sac.HTTP_FORBIDDEN, detail="Not the owner of this expense")
+    return db_expense
+
+def concurrent_change() -> HTTPException:
+    """
+    Build the error raised when a write finds its rows already changed by another request.
+
+    Returns:
+        HTTPException: A 409 asking the client to retry.
+    """
+    return HTTPException(
+        status_code=sac.HTTP_CONFLICT,
+        detail="The expense was changed concurrently, retry the request.",
+    )
+
+def live_split_rows(db_expense: models.Expense) -> List[Dict[str, Any]]:
+    """
+    Read the live splits of an expense as split rows.
+
+    Args:
+        db_expense (models.Expense): The expense.
+
+    Returns:
+        List[Dict[str, Any]]: One ``{"user_id", "amount", "percentage"}`` row per split.
+    """
+    return [
+        {"user_id": split.user_id, "amount": split.amount, "percentage": split.percentage}
+        for split in db_expense.splits
+    ]
+
+def update_expense(
+    db: Session, expense_id: int, update: ExpenseUpdate, owner_id: int
+) -> Expense:
+    """
+    Update an expense, re-splitting it when its amount, method or splits change.
+
+    Replaced splits are tombstoned rather than deleted, and only the
+    difference between the old and the new splits is applied to the balances.
+    Changing the currency or date re-rates the expense at the rate in effect
+    on its (new) date. The change and its ``expense.updated`` event are
+    committed together.
+
+    Args:
+        db (Session): The database session.
+        expense_id (int): The expense's ID.
+        update (ExpenseUpdate): The fields to change; omitted fields are kept.
+        owner_id (int): The ID of the user making the change.
+
+    Returns:
+        Expense: The updated expense.
+
+    Raises:
+        HTTPException: If the expense is missing (404) or not owned by the user
+            (403), the new splits do not add up, name an unknown user or use a
+            currency without a known rate (400), or the splits changed while
+            they were being replaced (409).
+    """
+    db_expense : models.Expense = get_owned_expense(db, expense_id, owner_id)
+    changes : Dict[str, Any] = {
+        key: value for key, value in update.model_dump(exclude_unset=True).items() if value is not None
+    }
+    old_rows : List[Dict[str, Any]] = live_split_rows(db_expense)
+    merged : ExpenseCreate = ExpenseCreate(
+        amount=changes.get("amount", db_expense.amount),
+        description=changes.get("description", db_expense.description),
+        split_method=changes.get("split_method", db_expense.split_method),
+        currency=changes.get("currency", db_expense.currency or base_currency()),
+        expense_date=changes.get("expense_date", db_expense.expense_date or today()),
+        splits=update.splits if update.splits is not None else [
+            ExpenseSplit(**row) for row in old_rows
+        ],
+    )
+    old_rate : float = db_expense.exchange_rate or 1.0
+    new_rate : float = old_rate
+    if {"currency", "expense_date"} & changes.keys():
+        new_rate = exchange_rates.rate(db, merged.currency, merged.expense_date)
+    resplit : bool = bool({"amount", "split_method", "splits"} & changes.keys())
+    new_rows : List[Dict[str, Any]] = old_rows
+    if resplit:
+        new_rows = build_split_rows(merged)
+        validate_participants(db, (row["user_id"] for row in new_rows))
+        replaced : int = db.query(models.ExpenseSplit).filter(
+            models.ExpenseSplit.expense_id == expense_id,
+            models.ExpenseSplit.deleted_at.is_(None),
+        ).update({"deleted_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        if replaced != len(old_rows):
+            db.rollback()
+            raise concurrent_change()
+        if new_rows:
+            db.execute(
+                insert(models.ExpenseSplit),
+                [{**row, "expense_id": expense_id} for row in new_rows],
+            )
+    if resplit or new_rate != old_rate:
+        paid : Dict[int, float] = {}
+        owed : Dict[int, float] = {}
+        add_balance_deltas(paid, owed, owner_id, db_expense.amount, old_rows, sign=-1, rate=old_rate)
+        add_balance_deltas(paid, owed, owner_id, merged.amount, new_rows, rate=new_rate)
+        apply_balance_deltas(db, paid, owed)
+    db_expense.amount = merged.amount
+    db_expense.description = merged.description
+    db_expense.split_method = merged.split_method
+    db_expense.currency = merged.currency
+    db_expense.expense_date = merged.expense_date
+    db_expense.exchange_rate = new_rate
+    db.execute(
+        insert(models.ExpenseEvent),
+        [expense_event_row("expense.updated", expense_id, owner_id, merged, new_rows)],
+    )
+    bump_data_version(db)
+    db.commit()
+    db.refresh(db_expense)
+    return db_expense
+
+def delete_expense(db: Session, expense_id: int, owner_id: int) -> None:
+    """
+    Soft delete an expense and its splits.
+
+    The rows are tombstoned with ``deleted_at`` and purged later by
+    ``purge_tombstones``; the balances are adjusted by the removed amounts.
+
+    Args:
+        db (Session): The database session.
+        expense_id (int): The expense's ID.
+        owner_id (int): The ID of the user making the change.
+
+    Raises:
+        HTTPException: If the expense is missing (404) or not owned by the user
+            (403), or its splits changed while it was being deleted (409).
+    """
+    db_expense : models.Expense = get_owned_expense(db, expense_id, owner_id)
+    old_rows : List[Dict[str, Any]] = live_split_rows(db_expense)
+    now : datetime = datetime.now(timezone.utc)
+    # Only the request that tombstones the expense adjusts the balances.
+    claimed : int = db.query(models.Expense).filter(
+        models.Expense.id == expense_id,
+        models.Expense.deleted_at.is_(None),
+    ).update({"deleted_at": now}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Expense not found")
+    removed : int = db.query(models.ExpenseSplit).filter(
+        models.ExpenseSplit.expense_id == expense_id,
+        models.ExpenseSplit.deleted_at.is_(None),
+    ).update({"deleted_at": now}, synchronize_session=False)
+    if removed != len(old_rows):
+        db.rollback()
+        raise concurrent_change()
+    paid : Dict[int, float] = {}
+    owed : Dict[int, float] = {}
+    add_balance_deltas(
+        paid, owed, owner_id, db_expense.amount, old_rows, sign=-1, rate=db_expense.exchange_rate or 1.0
+    )
+    apply_balance_deltas(db, paid, owed)
+    db.execute(
+        insert(models.ExpenseEvent),
+        [expense_event_row("expense.deleted", expense_id, owner_id, db_expense, old_rows)],
+    )
+    bump_data_version(db)
+    db.commit()
+
+def delete_expense_split(db: Session, expense_id: int, split_id: int, owner_id: int) -> Expense:
+    """
+    Soft delete one split of an expense, moving its share to the owner.
+
+    The expense keeps its amount, so the removed share falls on the owner who
+    paid it: a split of the same amount is added for the owner, and the share
+    is moved from the removed user's ``owed_amount`` to the owner's. What all
+    users paid still equals what they owe, and ``rebuild_user_balances``
+    reaches the same balances from the split rows.
+
+    Args:
+        db (Session): The database session.
+        expense_id (int): The expense's ID.
+        split_id (int): The split's ID.
+        owner_id (int): The ID of the user making the change.
+
+    Returns:
+        Expense: The expense with its remaining splits.
+
+    Raises:
+        HTTPException: If the expense or split is missing (404), or the expense
+            is not owned by the user (403).
+    """
+    db_expense : models.Expense = get_owned_expense(db, expense_id, owner_id)
+    split : models.ExpenseSplit | None = (
+        db.query(models.ExpenseSplit)
+        .filter(
+            models.ExpenseSplit.id == split_id,
+            models.ExpenseSplit.expense_id == expense_id,
+            models.ExpenseSplit.deleted_at.is_(None),
+        )
+        .first()
+    )
+    claimed : int = 0
+    if split is not None:
+        claimed = db.query(models.ExpenseSplit).filter(
+            models.ExpenseSplit.id == split_id,
+            models.ExpenseSplit.deleted_at.is_(None),
+        ).update({"deleted_at": datetime.now(timezone.utc)}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Split not found")
+    db.execute(
+        insert(models.ExpenseSplit),
+        [{"expense_id": expense_id, "user_id": owner_id, "amount": split.amount, "percentage": split.percentage}],
+    )
+    share : float = split.amount * (db_expense.exchange_rate or 1.0)
+    owed : Dict[int, float] = {split.user_id: -share}
+    owed[owner_id] = owed.get(owner_id, 0.0) + share
+    apply_balance_deltas(db, {}, owed)
+    db.flush()
+    db.expire(db_expense, ["splits"])
+    db.execute(
+        insert(models.ExpenseEvent),
+        [expense_event_row("expense.updated", expense_id, owner_id, db_expense, live_split_rows(db_expense))],
+    )
+    bump_data_version(db)
+    db.commit()
+    db.refresh(db_expense)
+    return db_expense
+
+def purge_tombstones(db: Session, older_than: timedelta) -> int:
+    """
+    Permanently delete expenses and splits soft deleted before the retention window.
+
+    Both deletes are driven by the indexes on ``deleted_at``. A deleted
+    expense's splits are tombstoned with it, so they are always purged first.
+
+    Args:
+        db (Session): The database session.
+        older_than (timedelta): How long tombstones are kept.
+
+    Returns:
+        int: The number of purged rows.
+    """
+    cutoff : datetime = datetime.now(timezone.utc) - older_than
+    purged : int = (
+        db.query(models.ExpenseSplit)
+        .filter(models.ExpenseSplit.deleted_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    purged += (
+        db.query(models.Expense)
+        .filter(models.Expense.deleted_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return purged
+
+def occurrence_at(start_at: datetime, frequency: str, interval: int, n: int) -> datetime:
+    """
+    Compute the ``n``-th occurrence of a recurrence rule.
+
+    Occurrences are always computed from the start, so monthly rules keep
+    their day of month: a rule starting on the 31st falls on the last day of
+    shorter months and returns to the 31st afterwards.
+
+    Args:
+        start_at (datetime): The first occurrence.
+        frequency (str): ``"daily"``, ``"weekly"`` or ``"monthly"``.
+        interval (int): The number of periods between occurrences.
+        n (int): The occurrence index, 0 for the first one.
+
+    Returns:
+        datetime: The time of the occurrence.
+    """
+    if frequency == "daily":
+        return start_at + timedelta(days=interval * n)
+    if frequency == "weekly":
+        return start_at + timedelta(weeks=interval * n)
+    months : int = start_at.month - 1 + interval * n
+    year : int = start_at.year + months // 12
+    month : int = months % 12 + 1
+    return start_at.replace(
+        year=year, month=month, day=min(start_at.day, calendar.monthrange(year, month)[1])
+    )
+
+def recurring_expense_row(template: models.RecurringExpense) -> Dict[str, Any]:
+    """
+    Convert a recurring expense template to its API representation.
+
+    Args:
+        template (models.RecurringExpense): The template.
+
+    Returns:
+        Dict[str, Any]: The template with its splits decoded.
+    """
+    return {
+        "id": template.id,
+        "owner_id": template.owner_id,
+        "amount": template.amount,
+        "description": template.description,
+        "split_method": template.split_method,
+        "currency": template.currency,
+        "splits": json.loads(template.splits),
+        "frequency": template.frequency,
+        "interval": template.interval,
+        "start_at": template.start_at,
+        "run_count": template.run_count,
+        "next_run_at": template.next_run_at,
+        "last_error": template.last_error,
+    }
+
+def template_expense(template: models.RecurringExpense, run_at: datetime) -> ExpenseCreate:
+    """
+    Build the expense a recurring template produces for one occurrence.
+
+    Args:
+        template (models.RecurringExpense): The template.
+        run_at (datetime): The occurrence, which becomes the expense date.
+
+    Returns:
+        ExpenseCreate: The expense to create.
+    """
+    return ExpenseCreate(
+        amount=template.amount,
+        description=template.description,
+        split_method=template.split_method,
+        currency=template.currency,
+        expense_date=run_at.date(),
+        splits=json.loads(template.splits),
+    )
+
+def create_recurring_expense(
+    db: Session, template: RecurringExpenseCreate, owner_id: int
+) -> RecurringExpense:
+    """
+    Create a recurring expense template.
+
+    The splits, participants and currency are checked now, so a template
+    that could never produce an expense is rejected up front. The first
+    occurrence is ``start_at`` (default: now); occurrences in the past are
+    caught up by the scheduler.
+
+    Args:
+        db (Session): The database session.
+        template (RecurringExpenseCreate): The template.
+        owner_id (int): The ID of the user creating the template.
+
+    Returns:
+        RecurringExpense: The created template.
+
+    Raises:
+        HTTPException: If the splits do not add up, name an unknown user, or
+            use a currency without a known rate.
+    """
+    start_at : datetime = template.start_at or datetime.now(timezone.utc)
+    if start_at.tzinfo is not None:
+        start_at = start_at.astimezone(timezone.utc).replace(tzinfo=None)
+    expense : ExpenseCreate = ExpenseCreate(
+        amount=template.amount,
+        description=template.description,
+        split_method=template.split_method,
+        currency=template.currency,
+        splits=template.splits,
+    )
+    split_rows : List[Dict[str, Any]] = build_split_rows(expense)
+    validate_participants(db, (row["user_id"] for row in split_rows))
+    exchange_rates.rate(db, template.currency or base_currency(), start_at.date())
+    db_template : models.RecurringExpense = models.RecurringExpense(
+        owner_id=owner_id,
+        amount=template.amount,
+        description=template.description,
+        split_method=template.split_method,
+        currency=template.currency,
+        splits=json.dumps([split.model_dump(exclude_none=True) for split in template.splits]),
+        frequency=template.frequency,
+        interval=template.interval,
+        start_at=start_at,
+        run_count=0,
+        next_run_at=start_at,
+    )
+    db.add(db_template)
+    db.commit()
+    db.refresh(db_template)
+    return recurring_expense_row(db_template)
+
+def get_recurring_expenses(db: Session, owner_id: int) -> List[RecurringExpense]:
+    """
+    Retrieve a user's recurring expense templates, including deactivated ones.
+
+    Args:
+        db (Session): The database session.
+        owner_id (int): The user's ID.
+
+    Returns:
+        List[RecurringExpense]: The templates, ordered by ID.
+    """
+    return [
+        recurring_expense_row(template)
+        for template in db.query(models.RecurringExpense)
+        .filter(models.RecurringExpense.owner_id == owner_id)
+        .order_by(models.RecurringExpense.id)
+    ]
+
+def deactivate_recurring_expense(db: Session, template_id: int, owner_id: int) -> None:
+    """
+    Stop a recurring expense template from producing further expenses.
+
+    Expenses it already produced are kept.
+
+    Args:
+        db (Session): The database session.
+        template_id (int): The template's ID.
+        owner_id (int): The ID of the user making the change.
+
+    Raises:
+        HTTPException: If the template does not exist (404) or belongs to another user (403).
+    """
+    template : models.RecurringExpense | None = db.get(
+        models.RecurringExpense, template_id, with_for_update=True
+    )
+    if template is None:
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Recurring expense not found")
+    if template.owner_id != owner_id:
+        raise HTTPException(status_code=sac.HTTP_FORBIDDEN, detail="Not the owner of this recurring expense")
+    template.next_run_at = None
+    db.commit()
+
+def get_due_recurring_expense_ids(db: Session, now: datetime, limit: int) -> List[int]:
+    """
+    Find templates with an occurrence due, using the index on ``next_run_at``.
+
+    Args:
+        db (Session): The database session.
+        now (datetime): The current time, as naive UTC.
+        limit (int): The maximum number of IDs to return.
+
+    Returns:
+        List[int]: The IDs of due templates, most overdue first.
+    """
+    return list(
+        db.scalars(
+            select(models.RecurringExpense.id)
+            .where(models.RecurringExpense.next_run_at <= now)
+            .order_by(models.RecurringExpense.next_run_at)
+            .limit(limit)
+        )
+    )
+
+def materialize_recurring_expense(
+    db: Session, template_id: int, now: datetime, max_occurrences: int
+) -> int:
+    """
+    Create the expenses of a template's due occurrences, oldest first.
+
+    Each occurrence is claimed by advancing ``next_run_at`` with an update
+    conditioned on its current value, in the same transaction as the expense
+    created through ``create_new_expense``. A concurrent scheduler (another
+    worker process) therefore either sees the claim and skips, or loses the
+    race and creates nothing, so every occurrence produces exactly one
+    expense. A template whose expense can no longer be created, for example
+    because a participant is gone, is deactivated with ``last_error`` set.
+
+    Args:
+        db (Session): The database session.
+        template_id (int): The template's ID.
+        now (datetime): The current time, as naive UTC.
+        max_occurrences (int): The maximum number of occurrences to create in this call.
+
+    Returns:
+        int: The number of expenses created.
+    """
+    created : int = 0
+    while created < max_occurrences:
+        template : models.RecurringExpense | None = db.get(
+            models.RecurringExpense, template_id, populate_existing=True
+        )
+        if template is None or template.next_run_at is None or template.next_run_at > now:
+            break
+        run_at : datetime = template.next_run_at
+        claimed : int = (
+            db.query(models.RecurringExpense)
+            .filter(
+                models.RecurringExpense.id == template_id,
+                models.RecurringExpense.next_run_at == run_at,
+            )
+            .update(
+                {
+                    "run_count": template.run_count + 1,
+                    "next_run_at": occurrence_at(
+                        template.start_at, template.frequency, template.interval, template.run_count + 1
+                    ),
+                },
+                synchronize_session=False,
+            )
+        )
+        if not claimed:
+            db.rollback()
+            break
+        try:
+            create_new_expense(db, template_expense(template, run_at), owner_id=template.owner_id)
+        except HTTPException as exc:
+            db.rollback()
+            db.query(models.RecurringExpense).filter(
+                models.RecurringExpense.id == template_id
+            ).update({"next_run_at": None, "last_error": str(exc.detail)}, synchronize_session=False)
+            db.commit()
+            break
+        created += 1
+    return created
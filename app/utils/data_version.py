@@ -0,0 +1,129 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from fastapi import Request
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from app.models import models
+from app.database.dialects import upsert
+from typing import Dict, Tuple
+import hashlib
+import os
+import random
+
+
+def bump_data_version(db: Session) -> None:
+    """
+    Increment the data version inside the caller's transaction.
+
+    Every write that can change a report (expenses, splits, users, exchange
+    rates) calls this before committing, so the version moves exactly when
+    the data does and cached reports can be revalidated by comparing one
+    integer. The version is a counter split over ``DATA_VERSION_SLOTS`` rows
+    and each session bumps one slot picked at random, so concurrent writers
+    on PostgreSQL rarely wait on the same row lock. Being part of the
+    transaction, a bump becomes visible together with the data it
+    describes, which a sequence could not guarantee.
+
+    Args:
+        db (Session): The database session.
+    """
+    if "data_version_slot" not in db.info:
+        db.info["data_version_slot"] = random.randint(1, int(os.environ.get("DATA_VERSION_SLOTS", 16)))
+    table = models.DataVersion.__table__
+    statement = upsert(db, table).values(
+        id=db.info["data_version_slot"], version=1, updated_at=datetime.now(timezone.utc)
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={"version": table.c.version + 1, "updated_at": statement.excluded.updated_at},
+        )
+    )
+
+
+def get_data_version(db: Session) -> Tuple[int, datetime | None]:
+    """
+    Read the current data version.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        Tuple[int, datetime | None]: The version and the UTC time of the last
+        write, or ``(0, None)`` before the first write.
+    """
+    row = db.execute(
+        select(func.sum(models.DataVersion.version), func.max(models.DataVersion.updated_at))
+    ).first()
+    if row is None or row[0] is None:
+        return 0, None
+    updated_at: datetime = row[1]
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return int(row[0]), updated_at
+
+
+def cache_validators(db: Session, request: Request, user_id: int | None = None) -> Dict[str, str]:
+    """
+    Build the caching headers of a report without computing the report.
+
+    The ETag combines the data version with what else the body depends on:
+    the query string, the user for per-user reports, and today's date, which
+    picks the exchange rates of converted totals. It is weak because the
+    compression middleware may re-encode the body. Shared reports may be
+    stored by proxies, per-user ones only by the client; both must be
+    revalidated on every use, which costs a sum over the version slots.
+
+    Args:
+        db (Session): The database session.
+        request (Request): The incoming request.
+        user_id (int | None): The user a per-user report belongs to.
+
+    Returns:
+        Dict[str, str]: The ``ETag``, ``Last-Modified`` and ``Cache-Control`` headers.
+    """
+    version, updated_at = get_data_version(db)
+    today: str = datetime.now(timezone.utc).date().isoformat()
+    variant: str = f"{user_id}|{request.url.query}|{today}"
+    digest: str = hashlib.blake2b(variant.encode(), digest_size=8).hexdigest()
+    headers: Dict[str, str] = {
+        "ETag": f'W/"{version}-{digest}"',
+        "Cache-Control": "private, no-cache" if user_id is not None else "public, no-cache",
+    }
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    return headers
+
+
+def not_modified(request: Request, validators: Dict[str, str]) -> bool:
+    """
+    Evaluate ``If-None-Match`` and ``If-Modified-Since`` against a report's validators.
+
+    ``If-Modified-Since`` is only used when ``If-None-Match`` is absent. Its
+    one second resolution can miss a write made in the same second as the
+    cached response, so clients should prefer the ETag.
+
+    Args:
+        request (Request): The incoming request.
+        validators (Dict[str, str]): The headers built by ``cache_validators``.
+
+    Returns:
+        bool: True if the client's copy is current and a 304 can be sent.
+    """
+    if_none_match: str | None = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag: str = validators["ETag"].removeprefix("W/")
+        return any(
+            tag.strip() == "*" or tag.strip().removeprefix("W/") == etag
+            for tag in if_none_match.split(",")
+        )
+    if_modified_since: str | None = request.headers.get("if-modified-since")
+    if if_modified_since is None or "Last-Modified" not in validators:
+        return False
+    try:
+        since: datetime = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(validators["Last-Modified"]) <= since
@@ -1,12 +1,15 @@
-from app.database.database import SessionLocal
-from fastapi import Request, HTTPException, Depends
+from app.database.database import SessionLocal, track_session_user
+from fastapi import Request, HTTPException, Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.utils.security import decode_jwt
+from app.utils.revocation import token_denylist
 from app.database.schemas.user_schema import User
 from sqlalchemy.orm import Session
 from app.models import models
-from typing import Any
+from typing import Any, Optional
 from app.utils.status import status_codes as sac
+import hmac
+import os
 
 
 def get_db() -> Any:
@@ -68,14 +71,19 @@ class JWTBearer(HTTPBearer):
         """
         Verify the JWT token.
 
+        Revoked tokens are rejected through the in-memory denylist, so the check
+        never hits the database; each worker syncs it from ``revoked_tokens``.
+
         Args:
             jwtoken (str): The JWT token to verify.
 
         Returns:
-            dict | None: The decoded token payload if the token is valid, otherwise None.
+            dict | None: The decoded token payload if the token is valid and not revoked, otherwise None.
         """
         try:
             payload: dict = decode_jwt(jwtoken)
+            if payload and token_denylist.is_revoked(payload.get("jti")):
+                return None
             return payload or None
         except:
             return None
@@ -103,7 +111,31 @@ def get_current_user(
             status_code=sac.HTTP_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
-    user: User | None = db.query(models.User).filter(models.User.email == email).first()
+    # Read from the primary so a token is never refused for a user a replica has not seen yet.
+    user: User | None = (
+        db.query(models.User)
+        .filter(models.User.email == email)
+        .execution_options(use_primary=True)
+        .first()
+    )
     if user is None:
         raise HTTPException(status_code=sac.HTTP_UNAUTHORIZED, detail="User not found")
+    track_session_user(db, user.id)
     return user
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Only let requests carrying the operator token in ``ADMIN_API_TOKEN`` through.
+
+    Args:
+        x_admin_token (Optional[str]): The ``X-Admin-Token`` header.
+
+    Raises:
+        HTTPException: 404 if no operator token is configured, 403 if the token does not match.
+    """
+    admin_token: str | None = os.environ.get("ADMIN_API_TOKEN") or None
+    if not admin_token:
+        raise HTTPException(status_code=sac.HTTP_NOT_FOUND, detail="Operator endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=sac.HTTP_FORBIDDEN, detail="Invalid operator token")
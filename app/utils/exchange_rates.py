@@ -0,0 +1,192 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from datetime import date, datetime, timezone
+from bisect import bisect_right
+from app.models import models
+from app.database.dialects import upsert
+from app.utils.data_version import bump_data_version
+from app.utils.status import status_codes as sac
+from typing import Dict, Iterable, List, Tuple
+import csv
+import os
+import threading
+import time
+
+
+def base_currency() -> str:
+    """
+    Return the currency balances are kept in.
+
+    Returns:
+        str: ``BASE_CURRENCY`` (default ``USD``).
+    """
+    return os.environ.get("BASE_CURRENCY", "USD").upper()
+
+
+def today() -> date:
+    """
+    Return the current UTC date.
+
+    Returns:
+        date: Today's date in UTC.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+class ExchangeRateCache:
+    """
+    In-memory copy of the ``exchange_rates`` table.
+
+    Rates are kept per currency as a pair of date-sorted parallel lists, so the rate in
+    effect on any day is found by bisection: the latest rate dated on or
+    before that day. Resolved ``(currency, date)`` pairs are memoized, so
+    converting a batch costs one dictionary hit per distinct pair. The copy is
+    reloaded from the database every ``ttl`` seconds, or when ``invalidate``
+    is called after new rates were loaded.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            ttl (float): How long, in seconds, a loaded copy is used.
+        """
+        self.ttl: float = ttl
+        self.loaded_at: float | None = None
+        self.series: Dict[str, Tuple[List[date], List[float]]] = {}
+        self.resolved: Dict[Tuple[str, date], float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """
+        Force the next lookup to reload the rates.
+        """
+        self.loaded_at = None
+
+    def load(self, db: Session) -> None:
+        """
+        Reload the rates from the database if the copy is missing or stale.
+
+        Args:
+            db (Session): The database session.
+        """
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl:
+            return
+        series: Dict[str, Tuple[List[date], List[float]]] = {}
+        for currency, rate_date, rate in (
+            db.query(models.ExchangeRate.currency, models.ExchangeRate.rate_date, models.ExchangeRate.rate)
+            .order_by(models.ExchangeRate.currency, models.ExchangeRate.rate_date)
+        ):
+            dates, rates = series.setdefault(currency, ([], []))
+            dates.append(rate_date)
+            rates.append(rate)
+        with self._lock:
+            self.series, self.resolved = series, {}
+            self.loaded_at = time.monotonic()
+
+    def lookup(self, currency: str, on: date) -> float:
+        """
+        Find the rate of a currency in effect on a day, from the loaded copy.
+
+        Args:
+            currency (str): The ISO 4217 currency code.
+            on (date): The day.
+
+        Returns:
+            float: Base currency units per unit of ``currency``.
+
+        Raises:
+            HTTPException: If no rate for the currency is dated on or before the day.
+        """
+        if currency == base_currency():
+            return 1.0
+        key: Tuple[str, date] = (currency, on)
+        rate: float | None = self.resolved.get(key)
+        if rate is not None:
+            return rate
+        dates, rates = self.series.get(currency, ([], []))
+        index: int = bisect_right(dates, on)
+        if index == 0:
+            raise HTTPException(
+                status_code=sac.HTTP_BAD_REQUEST,
+                detail=f"No exchange rate for {currency} on or before {on.isoformat()}",
+            )
+        rate = rates[index - 1]
+        self.resolved[key] = rate
+        return rate
+
+    def rate(self, db: Session, currency: str, on: date) -> float:
+        """
+        Find the rate of a currency in effect on a day.
+
+        Args:
+            db (Session): The database session, used if the rates must be reloaded.
+            currency (str): The ISO 4217 currency code.
+            on (date): The day.
+
+        Returns:
+            float: Base currency units per unit of ``currency``.
+        """
+        self.load(db)
+        return self.lookup(currency, on)
+
+    def rates_for(self, db: Session, keys: Iterable[Tuple[str, date]]) -> List[float]:
+        """
+        Find the rates for a batch of ``(currency, date)`` pairs.
+
+        Args:
+            db (Session): The database session, used if the rates must be reloaded.
+            keys (Iterable[Tuple[str, date]]): The pairs to resolve.
+
+        Returns:
+            List[float]: The rates, in input order.
+        """
+        self.load(db)
+        lookup = self.lookup
+        return [lookup(currency, on) for currency, on in keys]
+
+
+def load_exchange_rates(db: Session, path: str) -> int:
+    """
+    Load exchange rates from a CSV file into the ``exchange_rates`` table.
+
+    The file has a ``currency,date,rate`` header, with dates as ``YYYY-MM-DD``
+    and rates in base currency units per unit of the currency. Rows already
+    present for the same currency and date are overwritten.
+
+    Args:
+        db (Session): The database session.
+        path (str): The path of the CSV file.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    with open(path, newline="") as file:
+        rows: List[Dict[str, object]] = [
+            {
+                "currency": row["currency"].strip().upper(),
+                "rate_date": date.fromisoformat(row["date"].strip()),
+                "rate": float(row["rate"]),
+            }
+            for row in csv.DictReader(file)
+        ]
+    if rows:
+        table = models.ExchangeRate.__table__
+        statement = upsert(db, table)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.currency, table.c.rate_date],
+                set_={"rate": statement.excluded.rate},
+            ),
+            rows,
+        )
+        bump_data_version(db)
+        db.commit()
+    exchange_rates.invalidate()
+    return len(rows)
+
+
+exchange_rates: ExchangeRateCache = ExchangeRateCache(
+    ttl=float(os.environ.get("EXCHANGE_RATE_CACHE_TTL_SECONDS", 300))
+)
@@ -0,0 +1,183 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.database.database import engine
+from app.utils.rate_limit import ConcurrencyLimiter, concurrency_limiter
+from app.utils.security import InFlightCounter, password_hashes_in_flight
+from typing import Any, Dict
+import asyncio
+import os
+import threading
+import time
+
+
+class ReadinessProbe:
+    """
+    Decide whether this process should be sent more traffic.
+
+    Each check compares a load gauge with a limit set below the point where
+    requests start failing, so a load balancer drains the worker while it
+    still answers: the connection pool before checkouts start timing out,
+    the in-flight requests before the concurrency limiter sheds them, and
+    the bcrypt operations before logins queue for seconds. The database is
+    pinged on a thread of its own, so a saturated request thread pool does
+    not hide a healthy database, and at most one ping is outstanding: probes
+    arriving while a ping hangs fail at once instead of piling up threads.
+    The thread is a daemon, so a hung ping never holds up shutdown.
+    """
+
+    def __init__(
+        self,
+        db_engine: Engine,
+        limiter: ConcurrencyLimiter,
+        password_hashes: InFlightCounter,
+        db_timeout: float = 1.0,
+        pool_ratio: float = 0.9,
+        requests_ratio: float = 0.8,
+        max_password_hashes: int = 4,
+    ) -> None:
+        """
+        Initialize the probe.
+
+        Args:
+            db_engine (Engine): The primary database engine.
+            limiter (ConcurrencyLimiter): The in-flight request counter.
+            password_hashes (InFlightCounter): The in-flight bcrypt operations.
+            db_timeout (float): The seconds a ping may take before the database counts as down.
+            pool_ratio (float): The fraction of the pool's connections checked out
+                at which the process stops being ready.
+            requests_ratio (float): The fraction of ``MAX_CONCURRENT_REQUESTS``
+                in flight at which the process stops being ready.
+            max_password_hashes (int): The number of bcrypt operations in flight
+                at which the process stops being ready.
+        """
+        self.engine: Engine = db_engine
+        self.limiter: ConcurrencyLimiter = limiter
+        self.password_hashes: InFlightCounter = password_hashes
+        self.db_timeout: float = db_timeout
+        self.pool_ratio: float = pool_ratio
+        self.requests_ratio: float = requests_ratio
+        self.max_password_hashes: int = max_password_hashes
+        self._pinging: bool = False
+
+    def ping(self) -> float:
+        """
+        Run ``SELECT 1`` on a pooled connection.
+
+        Returns:
+            float: The round trip, in milliseconds, checkout included.
+        """
+        start: float = time.perf_counter()
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return (time.perf_counter() - start) * 1000
+
+    async def check_database(self) -> Dict[str, Any]:
+        """
+        Ping the database with a timeout.
+
+        Returns:
+            Dict[str, Any]: The check, with the ping's latency in milliseconds.
+        """
+        limit: float = self.db_timeout * 1000
+        if self._pinging:
+            return {"ok": False, "limit": limit, "detail": "Previous ping has not returned"}
+        self._pinging = True
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+
+        def settle(latency: float | None, error: Exception | None) -> None:
+            self._pinging = False
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(latency)
+
+        def run() -> None:
+            latency: float | None = None
+            error: Exception | None = None
+            try:
+                latency = self.ping()
+            except Exception as exc:
+                error = exc
+            try:
+                loop.call_soon_threadsafe(settle, latency, error)
+            except RuntimeError:  # the loop was closed while the ping hung
+                self._pinging = False
+
+        threading.Thread(target=run, name="readiness-ping", daemon=True).start()
+        try:
+            # Shielded: a timeout must not settle the ping while its thread still waits.
+            latency: float = await asyncio.wait_for(asyncio.shield(future), self.db_timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "limit": limit, "detail": "Ping timed out"}
+        except Exception as exc:
+            return {"ok": False, "limit": limit, "detail": type(exc).__name__}
+        return {"ok": True, "current": round(latency, 3), "limit": limit}
+
+    def check_pool(self) -> Dict[str, Any]:
+        """
+        Compare the checked out connections with the pool's capacity.
+
+        Returns:
+            Dict[str, Any]: The check; always ok for pools without a fixed size.
+        """
+        pool: Any = self.engine.pool
+        if not hasattr(pool, "checkedout"):
+            return {"ok": True, "detail": f"{type(pool).__name__} has no size limit"}
+        # A negative max_overflow means the pool may grow without bound.
+        max_overflow: int = getattr(pool, "_max_overflow", 0)
+        if max_overflow < 0:
+            return {"ok": True, "current": pool.checkedout()}
+        limit: float = self.pool_ratio * (pool.size() + max_overflow)
+        return {"ok": pool.checkedout() < limit, "current": pool.checkedout(), "limit": limit}
+
+    def check_requests(self) -> Dict[str, Any]:
+        """
+        Compare the in-flight requests with the concurrency limit.
+
+        Returns:
+            Dict[str, Any]: The check.
+        """
+        limit: float = self.requests_ratio * self.limiter.max_concurrent
+        return {"ok": self.limiter.in_flight < limit, "current": self.limiter.in_flight, "limit": limit}
+
+    def check_password_hashes(self) -> Dict[str, Any]:
+        """
+        Compare the in-flight bcrypt operations with their limit.
+
+        Returns:
+            Dict[str, Any]: The check.
+        """
+        current: int = self.password_hashes.count
+        return {"ok": current < self.max_password_hashes, "current": current, "limit": self.max_password_hashes}
+
+    async def check(self) -> Dict[str, Any]:
+        """
+        Run every check.
+
+        Returns:
+            Dict[str, Any]: ``status`` (``"ready"`` or ``"not_ready"``) and the result of each check.
+        """
+        checks: Dict[str, Dict[str, Any]] = {
+            "database": await self.check_database(),
+            "pool": self.check_pool(),
+            "requests": self.check_requests(),
+            "password_hashing": self.check_password_hashes(),
+        }
+        ready: bool = all(check["ok"] for check in checks.values())
+        return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+
+readiness: ReadinessProbe = ReadinessProbe(
+    engine,
+    concurrency_limiter,
+    password_hashes_in_flight,
+    db_timeout=float(os.environ.get("READINESS_DB_TIMEOUT_MS", 1000)) / 1000,
+    pool_ratio=float(os.environ.get("READINESS_POOL_RATIO", 0.9)),
+    requests_ratio=float(os.environ.get("READINESS_REQUESTS_RATIO", 0.8)),
+    max_password_hashes=int(
+        os.environ.get("READINESS_MAX_PASSWORD_HASHES", 2 * (os.cpu_count() or 1))
+    ),
+)
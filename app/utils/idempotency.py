@@ -0,0 +1,227 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel
+from fastapi import HTTPException
+from fastapi.responses import Response
+from datetime import datetime, timedelta, timezone
+from app.models import models
+from app.utils.status import status_codes as sac
+from typing import Tuple
+import hashlib
+import os
+
+
+def hash_request(payload: BaseModel) -> str:
+    """
+    Compute a stable fingerprint of a request body.
+
+    Args:
+        payload (BaseModel): The validated request body.
+
+    Returns:
+        str: The hex encoded SHA-256 digest of the body's canonical JSON.
+    """
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+def idempotency_key_ttl() -> timedelta:
+    """
+    Read how long an idempotency key is honoured.
+
+    Returns:
+        timedelta: ``IDEMPOTENCY_KEY_TTL_SECONDS`` (default 24 hours).
+    """
+    return timedelta(seconds=float(os.environ.get("IDEMPOTENCY_KEY_TTL_SECONDS", 86400)))
+
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    """
+    Delete idempotency keys older than the configured TTL.
+
+    Run by the maintenance loop, off the request path. The delete is driven by
+    the index on ``created_at`` so it stays cheap.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The number of evicted keys.
+    """
+    cutoff: datetime = datetime.now(timezone.utc) - idempotency_key_ttl()
+    deleted: int = (
+        db.query(models.IdempotencyKey)
+        .filter(models.IdempotencyKey.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def claim_idempotency_key(
+    db: Session, key: str, owner_id: int, request_hash: str
+) -> Tuple[datetime | None, models.IdempotencyKey | None]:
+    """
+    Claim an idempotency key for the given user.
+
+    The claim is an insert guarded by the unique ``(owner_id, key)`` constraint,
+    so when two duplicates race only one of them wins and no lock is held.
+
+    The response is stored in the same transaction as the expense, so a claim
+    that is still without a response after ``IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS``
+    (default 120, above the worker timeout) belongs to a request whose worker
+    died before writing anything. A retry with the same body takes such a
+    claim over instead of getting 409 until the key expires. A key past its
+    TTL that the maintenance loop has not purged yet is taken over by any
+    request. Both take-overs are conditional updates, so only one retry wins,
+    and they move the claim time, so a request that was only slow cannot
+    store its response over the new claim (see ``complete_idempotency_key``).
+
+    Args:
+        db (Session): The database session.
+        key (str): The client supplied ``Idempotency-Key`` header.
+        owner_id (int): The ID of the user issuing the request.
+        request_hash (str): The fingerprint of the request body.
+
+    Returns:
+        Tuple[datetime | None, models.IdempotencyKey | None]: The claim time if
+        this request claimed the key, and otherwise the record stored by the
+        earlier request.
+    """
+    now: datetime = datetime.now(timezone.utc)
+    db.add(
+        models.IdempotencyKey(key=key, owner_id=owner_id, request_hash=request_hash, created_at=now)
+    )
+    try:
+        db.commit()
+        return now, None
+    except IntegrityError:
+        db.rollback()
+    stale_before: datetime = now - timedelta(
+        seconds=float(os.environ.get("IDEMPOTENCY_IN_FLIGHT_TIMEOUT_SECONDS", 120))
+    )
+    reclaimed: int = (
+        db.query(models.IdempotencyKey)
+        .filter(
+            models.IdempotencyKey.owner_id == owner_id,
+            models.IdempotencyKey.key == key,
+            or_(
+                models.IdempotencyKey.created_at < now - idempotency_key_ttl(),
+                (models.IdempotencyKey.request_hash == request_hash)
+                & models.IdempotencyKey.status_code.is_(None)
+                & (models.IdempotencyKey.created_at < stale_before),
+            ),
+        )
+        .update(
+            {"request_hash": request_hash, "status_code": None, "response_body": None, "created_at": now},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    if reclaimed:
+        return now, None
+    return None, (
+        db.query(models.IdempotencyKey)
+        .filter(
+            models.IdempotencyKey.owner_id == owner_id,
+            models.IdempotencyKey.key == key,
+        )
+        .first()
+    )
+
+
+def complete_idempotency_key(
+    db: Session,
+    key: str,
+    owner_id: int,
+    claimed_at: datetime,
+    status_code: int,
+    response_body: str,
+) -> None:
+    """
+    Store the response of the request that claimed the key, inside the caller's transaction.
+
+    Call it in the transaction that makes the change, so the change and its
+    stored response commit together.
+
+    Args:
+        db (Session): The database session.
+        key (str): The idempotency key.
+        owner_id (int): The ID of the user issuing the request.
+        claimed_at (datetime): The claim time returned by ``claim_idempotency_key``.
+        status_code (int): The HTTP status code of the response.
+        response_body (str): The serialized JSON response body.
+
+    Raises:
+        HTTPException: If a retry has taken the claim over (409); the caller
+            must roll back so the change is not made twice.
+    """
+    completed: int = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.owner_id == owner_id,
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.created_at == claimed_at,
+        models.IdempotencyKey.status_code.is_(None),
+    ).update(
+        {"status_code": status_code, "response_body": response_body},
+        synchronize_session=False,
+    )
+    if not completed:
+        raise HTTPException(
+            status_code=sac.HTTP_CONFLICT,
+            detail="Idempotency key was taken over by a retry of this request.",
+        )
+
+
+def release_idempotency_key(db: Session, key: str, owner_id: int) -> None:
+    """
+    Drop a claimed key after the request failed so the client may retry it.
+
+    Args:
+        db (Session): The database session.
+        key (str): The idempotency key.
+        owner_id (int): The ID of the user issuing the request.
+    """
+    db.rollback()
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.owner_id == owner_id,
+        models.IdempotencyKey.key == key,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def replay_response(record: models.IdempotencyKey | None, request_hash: str) -> Response:
+    """
+    Build the response for a duplicate request.
+
+    Args:
+        record (models.IdempotencyKey | None): The record stored by the original request.
+        request_hash (str): The fingerprint of the duplicate request body.
+
+    Returns:
+        Response: The stored response of the original request.
+
+    Raises:
+        HTTPException: If the key was reused with a different body (422), or the
+            original request has not completed yet (409).
+    """
+    if record is None:
+        raise HTTPException(
+            status_code=sac.HTTP_CONFLICT,
+            detail="Idempotency key was released, retry the request.",
+        )
+    if record.request_hash != request_hash:
+        raise HTTPException(
+            status_code=sac.HTTP_UNPROCESSABLE_ENTITY,
+            detail="Idempotency key was already used with a different request body.",
+        )
+    if record.status_code is None:
+        raise HTTPException(
+            status_code=sac.HTTP_CONFLICT,
+            detail="A request with this idempotency key is still being processed.",
+        )
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
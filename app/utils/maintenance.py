@@ -0,0 +1,49 @@
+from fastapi.concurrency import run_in_threadpool
+from datetime import timedelta
+from app.database.database import SessionLocal
+from app.utils.curd import purge_tombstones
+from app.utils.idempotency import purge_expired_idempotency_keys
+from app.utils.revocation import purge_revoked_tokens, token_denylist
+import asyncio
+import logging
+import os
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def run_maintenance() -> int:
+    """
+    Run one compaction pass.
+
+    Purges expenses and splits soft deleted more than ``TOMBSTONE_RETENTION_DAYS``
+    ago (default 30), expired idempotency keys, and expired revoked tokens,
+    stored and in the token denylist.
+
+    Returns:
+        int: The number of purged tombstones.
+    """
+    retention: timedelta = timedelta(
+        days=float(os.environ.get("TOMBSTONE_RETENTION_DAYS", 30))
+    )
+    with SessionLocal() as db:
+        purged: int = purge_tombstones(db, older_than=retention)
+        purge_expired_idempotency_keys(db)
+        purge_revoked_tokens(db)
+    token_denylist.prune()
+    return purged
+
+
+async def maintenance_loop() -> None:
+    """
+    Run ``run_maintenance`` every ``MAINTENANCE_INTERVAL_SECONDS`` (default 1 hour).
+
+    The pass runs in the thread pool so the event loop keeps serving requests,
+    and a failed pass is logged and retried on the next tick.
+    """
+    interval: float = float(os.environ.get("MAINTENANCE_INTERVAL_SECONDS", 3600))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(run_maintenance)
+        except Exception:
+            logger.exception("Maintenance pass failed")
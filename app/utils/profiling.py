@@ -0,0 +1,434 @@
+from collections import Counter
+from contextvars import Context, ContextVar
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from types import FrameType
+from typing import Any, Callable, Dict, List, Tuple
+from app.utils.rate_limit import InMemoryRateLimitBackend, parse_rate
+import asyncio
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# Modules a thread waits in when it has nothing to do; stacks ending there are not samples.
+IDLE_MODULES: Tuple[str, ...] = ("threading", "selectors", "queue")
+MAX_STACK_DEPTH: int = 128
+PROFILE_ID_PATTERN: re.Pattern = re.compile(r"[0-9a-f]{32}")
+
+# The sampler of the request being profiled, copied into every thread pool call it makes.
+profiled_request: ContextVar["StackSampler | None"] = ContextVar("profiled_request", default=None)
+
+
+def running_context(frame: FrameType | None) -> Context | None:
+    """
+    Find the context a thread pool worker is running its current call in.
+
+    Thread pool workers (anyio's, which FastAPI runs sync endpoints and
+    dependencies on) call ``context.run(func)`` with a copy of the caller's
+    context, so the context is a local of a frame near the bottom of the stack.
+
+    Args:
+        frame (FrameType | None): The innermost frame of the thread.
+
+    Returns:
+        Context | None: The context, or None if the thread is not running a pool call.
+    """
+    while frame is not None:
+        if "context" in frame.f_code.co_varnames:
+            context: Any = frame.f_locals.get("context")
+            if isinstance(context, Context):
+                return context
+        frame = frame.f_back
+    return None
+
+
+class StackSampler:
+    """
+    Sampling profiler of one request.
+
+    A background thread reads every other thread's stack with
+    ``sys._current_frames`` at a fixed interval and counts identical stacks.
+    The profiled code runs untouched, so the overhead is one stack walk per
+    busy thread per interval, whatever the code does. Stacks of idle threads
+    are skipped.
+
+    Only the request's own threads are counted in ``stacks``: the event loop
+    thread while it runs the request's task, and the thread pool workers
+    while they run a call made from the request's context. Everything else
+    busy at the time, such as other requests served concurrently, is counted
+    separately in ``other_stacks``.
+    """
+
+    def __init__(self, interval: float) -> None:
+        """
+        Initialize the sampler.
+
+        Args:
+            interval (float): The number of seconds between samples.
+        """
+        self.interval: float = interval
+        self.stacks: Counter = Counter()
+        self.other_stacks: Counter = Counter()
+        self.samples: int = 0
+        self.task: asyncio.Task | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.loop_thread: int | None = None
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        """
+        Start sampling the request running in the calling task.
+        """
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self._thread.start()
+
+    @property
+    def stopped(self) -> bool:
+        """
+        Whether sampling was stopped.
+
+        Returns:
+            bool: True once ``stop`` was called.
+        """
+        return self._stop.is_set()
+
+    def stop(self) -> Counter:
+        """
+        Stop sampling. Calling it again only returns the stacks.
+
+        Returns:
+            Counter: The number of samples of each collapsed stack.
+        """
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def serves_request(self, ident: int, frame: FrameType) -> bool:
+        """
+        Check whether a thread is working for the profiled request.
+
+        Args:
+            ident (int): The thread's identifier.
+            frame (FrameType): The thread's innermost frame.
+
+        Returns:
+            bool: True if the thread runs the request's task or a pool call made by it.
+        """
+        if ident == self.loop_thread:
+            return self.loop is not None and asyncio.current_task(self.loop) is self.task
+        context: Context | None = running_context(frame)
+        return context is not None and context.get(profiled_request) is self
+
+    def sample(self) -> None:
+        """
+        Record the current stack of every busy thread but this one.
+        """
+        names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        own: int = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or frame.f_globals.get("__name__") in IDLE_MODULES:
+                continue
+            stacks: Counter = self.stacks if self.serves_request(ident, frame) else self.other_stacks
+            stack: List[str] = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+
+class Profiler:
+    """
+    Settings and shared store of the request profiler.
+
+    A request is profiled when it carries the admin token in the
+    ``X-Profile-Token`` header, or at random with probability
+    ``sample_rate``. Either way it must draw from a token bucket, so
+    profiling can stay enabled in production without piling up sampler
+    threads. Profiles are written as JSON files to ``directory``, which all
+    the workers share, so any of them can serve any profile. The last
+    ``max_profiles`` are kept.
+    """
+
+    HEADER: bytes = b"x-profile-token"
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        admin_token: str | None = None,
+        rate: Tuple[float, float] = (10.0, 10.0 / 60),
+        interval: float = 0.005,
+        max_profiles: int = 50,
+        exempt_prefix: str = "/api/v1/profiles",
+        directory: str = os.path.join(tempfile.gettempdir(), "expense-sharing-profiles"),
+    ) -> None:
+        """
+        Initialize the profiler.
+
+        Args:
+            sample_rate (float): The fraction of requests profiled without the admin header.
+            admin_token (str | None): The token that requests a profile and
+                grants access to the stored ones. None disables both.
+            rate (Tuple[float, float]): The bucket capacity and refill per
+                second bounding how many requests are profiled.
+            interval (float): The number of seconds between stack samples.
+            max_profiles (int): The number of profiles kept.
+            exempt_prefix (str): Paths never profiled, such as the profile downloads.
+            directory (str): The directory the profiles are stored in.
+        """
+        self.sample_rate: float = sample_rate
+        self.admin_token: str | None = admin_token
+        self.rate: Tuple[float, float] = rate
+        self.interval: float = interval
+        self.max_profiles: int = max_profiles
+        self.exempt_prefix: str = exempt_prefix
+        self.directory: str = directory
+        self._bucket: InMemoryRateLimitBackend = InMemoryRateLimitBackend(max_keys=1)
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether any request can be profiled.
+
+        Returns:
+            bool: True if random sampling or the admin header is configured.
+        """
+        return self.sample_rate > 0 or bool(self.admin_token)
+
+    def is_admin(self, token: str | None) -> bool:
+        """
+        Check a token against the admin token.
+
+        Args:
+            token (str | None): The token presented by the client.
+
+        Returns:
+            bool: True if profiling has an admin token and it matches.
+        """
+        return bool(self.admin_token and token) and hmac.compare_digest(token, self.admin_token)
+
+    async def should_profile(self, scope: Dict[str, Any]) -> bool:
+        """
+        Decide whether to profile a request.
+
+        Args:
+            scope (Dict[str, Any]): The ASGI connection scope.
+
+        Returns:
+            bool: True if the request was picked and the bucket had a token left.
+        """
+        if scope["path"].startswith(self.exempt_prefix):
+            return False
+        token: str | None = next(
+            (value.decode("latin-1") for name, value in scope["headers"] if name == self.HEADER), None
+        )
+        if not self.is_admin(token) and not (self.sample_rate and random.random() < self.sample_rate):
+            return False
+        return await self._bucket.consume("profile", *self.rate) == 0
+
+    def next_id(self) -> str:
+        """
+        Allocate a profile ID, unique across workers and restarts.
+
+        Returns:
+            str: The new ID.
+        """
+        return uuid.uuid4().hex
+
+    def path(self, profile_id: str) -> str:
+        """
+        Build the path of a profile's file.
+
+        Args:
+            profile_id (str): The profile ID.
+
+        Returns:
+            str: The path in ``directory``.
+        """
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, profile: Dict[str, Any]) -> None:
+        """
+        Store a profile, evicting the oldest once ``max_profiles`` are kept.
+
+        The file is written under a temporary name and renamed into place, so
+        readers in other workers never see it half written.
+
+        Args:
+            profile (Dict[str, Any]): The profile, with an ``id`` key.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path: str = self.path(profile["id"])
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({**profile, "created_at": profile["created_at"].isoformat()}, file)
+        os.replace(f"{path}.tmp", path)
+        for stale in self.stored()[self.max_profiles:]:
+            try:
+                os.remove(self.path(stale))
+            except FileNotFoundError:
+                pass  # Another worker evicted it first.
+
+    def stored(self) -> List[str]:
+        """
+        List the IDs of the stored profiles, newest first.
+
+        Returns:
+            List[str]: The profile IDs.
+        """
+        try:
+            names: List[str] = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        mtimes: Dict[str, float] = {}
+        for name in names:
+            profile_id, extension = os.path.splitext(name)
+            if extension != ".json" or not PROFILE_ID_PATTERN.fullmatch(profile_id):
+                continue
+            try:
+                mtimes[profile_id] = os.stat(os.path.join(self.directory, name)).st_mtime
+            except FileNotFoundError:
+                continue
+        return sorted(mtimes, key=mtimes.__getitem__, reverse=True)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """
+        List the stored profiles without their stacks, newest first.
+
+        Returns:
+            List[Dict[str, Any]]: The profiles' metadata.
+        """
+        profiles: List[Dict[str, Any] | None] = [self.get(profile_id) for profile_id in self.stored()]
+        return [
+            {key: value for key, value in profile.items() if key not in ("stacks", "other_stacks")}
+            for profile in profiles
+            if profile is not None
+        ]
+
+    def get(self, profile_id: str) -> Dict[str, Any] | None:
+        """
+        Read a stored profile.
+
+        Args:
+            profile_id (str): The profile ID.
+
+        Returns:
+            Dict[str, Any] | None: The profile, or None if it was never taken or was evicted.
+        """
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        try:
+            with open(self.path(profile_id), encoding="utf-8") as file:
+                profile: Dict[str, Any] = json.load(file)
+        except FileNotFoundError:
+            return None
+        profile["stacks"] = Counter(profile["stacks"])
+        profile["other_stacks"] = Counter(profile["other_stacks"])
+        return profile
+
+
+def collapsed_stacks(stacks: Counter) -> str:
+    """
+    Render stack counts in the collapsed format read by flamegraph.pl and speedscope.
+
+    Args:
+        stacks (Counter): The number of samples of each ``;`` separated stack.
+
+    Returns:
+        str: One ``<stack> <count>`` line per stack, most sampled first.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """
+    Sample the stacks of selected requests and store them for download.
+
+    Profiled responses carry an ``X-Profile-Id`` header naming the stored
+    profile. Streamed responses, sent without a ``Content-Length`` such as the
+    event stream and the CSV exports, are not profiled: the sampler stops as
+    soon as their headers go out, and nothing is stored. The middleware is
+    only installed when profiling is enabled, so a disabled profiler adds
+    nothing to the request path.
+    """
+
+    def __init__(self, app: Any, profiler: Profiler) -> None:
+        """
+        Initialize the middleware.
+
+        Args:
+            app (Any): The wrapped ASGI application.
+            profiler (Profiler): The settings and profile store.
+        """
+        self.app: Any = app
+        self.profiler: Profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not await self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id: str = self.profiler.next_id()
+        status_code: List[int] = []
+        sampler: StackSampler = StackSampler(self.profiler.interval)
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status_code.append(message["status"])
+                headers: List[Tuple[bytes, bytes]] = message.get("headers", [])
+                if any(name.lower() == b"content-length" for name, _ in headers):
+                    message = {**message, "headers": [*headers, (b"x-profile-id", profile_id.encode())]}
+                else:
+                    sampler.stop()
+            await send(message)
+
+        started_at: datetime = datetime.now(timezone.utc)
+        start: float = time.perf_counter()
+        token = profiled_request.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            streamed: bool = sampler.stopped
+            stacks: Counter = sampler.stop()
+            profiled_request.reset(token)
+            if not streamed:
+                await run_in_threadpool(
+                    self.profiler.save,
+                    {
+                        "id": profile_id,
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status_code": status_code[0] if status_code else None,
+                        "duration_ms": (time.perf_counter() - start) * 1000,
+                        "samples": sampler.samples,
+                        "created_at": started_at,
+                        "stacks": stacks,
+                        "other_stacks": sampler.other_stacks,
+                    },
+                )
+
+
+profiler: Profiler = Profiler(
+    sample_rate=float(os.environ.get("PROFILING_SAMPLE_RATE", 0)),
+    admin_token=os.environ.get("PROFILING_ADMIN_TOKEN") or None,
+    rate=parse_rate(os.environ.get("PROFILING_RATE", "10/60")),
+    interval=float(os.environ.get("PROFILING_INTERVAL_MS", 5)) / 1000,
+    max_profiles=int(os.environ.get("PROFILING_MAX_PROFILES", 50)),
+    directory=os.environ.get("PROFILING_DIR") or os.path.join(tempfile.gettempdir(), "expense-sharing-profiles"),
+)
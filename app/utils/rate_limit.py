@@ -0,0 +1,404 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs
+from app.utils.status import status_codes as sac
+import json
+import math
+import os
+import threading
+import time
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for token buckets.
+
+    Subclasses keep one bucket per key and implement ``consume``. The in-memory
+    backend is per process; a shared backend lets every worker draw from the
+    same buckets.
+    """
+
+    @abstractmethod
+    async def consume(
+        self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0
+    ) -> float:
+        """
+        Take ``cost`` tokens from the bucket stored under ``key``.
+
+        Args:
+            key (str): The bucket key.
+            capacity (float): The maximum number of tokens the bucket holds.
+            refill_per_second (float): The number of tokens added per second.
+            cost (float): The number of tokens the request needs.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of seconds
+            until enough tokens are available.
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Process local token buckets kept in a bounded LRU map.
+
+    Once ``max_keys`` buckets exist the least recently used one is evicted, so
+    a flood of distinct IPs or emails cannot grow memory without bound.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        """
+        Initialize the backend.
+
+        Args:
+            max_keys (int): The maximum number of buckets kept in memory.
+        """
+        self.max_keys: int = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    async def consume(
+        self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0
+    ) -> float:
+        now: float = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            retry_after: float = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                retry_after = (cost - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self) -> None:
+        """
+        Drop every bucket.
+        """
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets shared by all workers through Redis.
+
+    The refill and take happen in a single Lua script so concurrent workers
+    never race on the same bucket. Keys expire once the bucket would be full
+    again, which bounds storage the same way the LRU does in memory.
+    """
+
+    SCRIPT: str = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+    def __init__(self, client: Any, prefix: str = "ratelimit:") -> None:
+        """
+        Initialize the backend.
+
+        Args:
+            client (Any): An asyncio Redis client (``redis.asyncio.Redis``).
+            prefix (str): The prefix added to every bucket key.
+        """
+        self.client: Any = client
+        self.prefix: str = prefix
+
+    async def consume(
+        self, key: str, capacity: float, refill_per_second: float, cost: float = 1.0
+    ) -> float:
+        retry_after: Any = await self.client.eval(
+            self.SCRIPT,
+            1,
+            self.prefix + key,
+            capacity,
+            refill_per_second,
+            cost,
+            time.time(),
+        )
+        return float(retry_after)
+
+
+def build_rate_limit_backend() -> RateLimitBackend:
+    """
+    Build the backend selected by the environment.
+
+    ``RATE_LIMIT_REDIS_URL`` selects the shared Redis backend (requires the
+    ``redis`` package); otherwise buckets are kept in memory, bounded by
+    ``RATE_LIMIT_MAX_KEYS``.
+
+    Returns:
+        RateLimitBackend: The configured backend.
+    """
+    redis_url: str | None = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        from redis import asyncio as redis_asyncio
+
+        return RedisRateLimitBackend(redis_asyncio.from_url(redis_url))
+    return InMemoryRateLimitBackend(
+        max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100_000))
+    )
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """
+    Parse a ``"<requests>/<seconds>"`` rate into a bucket size and refill rate.
+
+    Args:
+        value (str): The rate, for example ``"20/60"``.
+
+    Returns:
+        Tuple[float, float]: The bucket capacity and the tokens added per second.
+    """
+    requests, seconds = value.split("/")
+    return float(requests), float(requests) / float(seconds)
+
+
+async def send_json(send: Callable, status_code: int, detail: str, retry_after: float) -> None:
+    """
+    Send a small JSON error response straight through the ASGI ``send`` channel.
+
+    Args:
+        send (Callable): The ASGI send callable.
+        status_code (int): The HTTP status code.
+        detail (str): The error message.
+        retry_after (float): The value of the ``Retry-After`` header, in seconds.
+    """
+    body: bytes = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """
+    Token bucket rate limiting for the login and write endpoints.
+
+    Login requests draw from a per-IP and a per-email bucket, so a credential
+    stuffing burst is throttled before it reaches bcrypt. Every other write
+    (POST, PUT, PATCH, DELETE) draws from a per-IP bucket.
+    """
+
+    AUTH_PATHS: Tuple[str, ...] = ("/api/v1/auth/token",)
+    WRITE_METHODS: Tuple[str, ...] = ("POST", "PUT", "PATCH", "DELETE")
+
+    def __init__(self, app: Any, backend: RateLimitBackend) -> None:
+        """
+        Initialize the middleware.
+
+        Args:
+            app (Any): The wrapped ASGI application.
+            backend (RateLimitBackend): The bucket storage.
+        """
+        self.app: Any = app
+        self.backend: RateLimitBackend = backend
+        self.auth_per_ip: Tuple[float, float] = parse_rate(
+            os.environ.get("RATE_LIMIT_AUTH_PER_IP", "20/60")
+        )
+        self.auth_per_email: Tuple[float, float] = parse_rate(
+            os.environ.get("RATE_LIMIT_AUTH_PER_EMAIL", "5/60")
+        )
+        self.writes_per_ip: Tuple[float, float] = parse_rate(
+            os.environ.get("RATE_LIMIT_WRITES_PER_IP", "120/60")
+        )
+        self.trust_forwarded: bool = (
+            os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+        )
+
+    def client_ip(self, scope: Dict[str, Any]) -> str:
+        """
+        Resolve the client address of a request.
+
+        Args:
+            scope (Dict[str, Any]): The ASGI connection scope.
+
+        Returns:
+            str: The client IP, taken from ``X-Forwarded-For`` only when
+            ``RATE_LIMIT_TRUST_FORWARDED`` is enabled.
+        """
+        if self.trust_forwarded:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode().split(",")[0].strip()
+        client: Tuple[str, int] | None = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def buckets(self, scope: Dict[str, Any]) -> List[Tuple[str, Tuple[float, float]]]:
+        """
+        List the buckets a request has to draw from.
+
+        Args:
+            scope (Dict[str, Any]): The ASGI connection scope.
+
+        Returns:
+            List[Tuple[str, Tuple[float, float]]]: The bucket keys with their rates.
+        """
+        path: str = scope["path"]
+        if path in self.AUTH_PATHS:
+            buckets = [("auth:ip:" + self.client_ip(scope), self.auth_per_ip)]
+            query: Dict[str, List[str]] = parse_qs(scope.get("query_string", b"").decode())
+            for email in query.get("email", [])[:1]:
+                buckets.append(("auth:email:" + email.strip().lower(), self.auth_per_email))
+            return buckets
+        if scope["method"] in self.WRITE_METHODS:
+            return [("write:ip:" + self.client_ip(scope), self.writes_per_ip)]
+        return []
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] == "http":
+            for key, (capacity, refill_per_second) in self.buckets(scope):
+                retry_after: float = await self.backend.consume(key, capacity, refill_per_second)
+                if retry_after > 0:
+                    await send_json(send, sac.HTTP_TOO_MANY_REQUESTS, "Too many requests", retry_after)
+                    return
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimiter:
+    """
+    Counter of the HTTP requests currently being served by this process.
+    """
+
+    def __init__(self, max_concurrent: int, exempt_paths: Tuple[str, ...] = ()) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrent (int): The number of in-flight requests above which
+                new requests are shed.
+            exempt_paths (Tuple[str, ...]): Paths neither counted nor shed, such
+                as long-lived streams that hold no worker thread (those are capped
+                by the ``StreamLimiter`` instead), or the health probes, which must
+                keep answering under load.
+        """
+        self.max_concurrent: int = max_concurrent
+        self.exempt_paths: Tuple[str, ...] = exempt_paths
+        self.in_flight: int = 0
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Shed requests with 503 once the process is serving too many at once.
+
+    Sync endpoints run on a bounded thread pool, so queueing past its size only
+    adds latency until every caller times out. Rejecting early keeps the
+    requests already admitted fast. All state lives on the event loop thread,
+    so the counter needs no lock.
+    """
+
+    def __init__(self, app: Any, limiter: ConcurrencyLimiter) -> None:
+        """
+        Initialize the middleware.
+
+        Args:
+            app (Any): The wrapped ASGI application.
+            limiter (ConcurrencyLimiter): The shared in-flight counter.
+        """
+        self.app: Any = app
+        self.limiter: ConcurrencyLimiter = limiter
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["path"] in self.limiter.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        if self.limiter.in_flight >= self.limiter.max_concurrent:
+            await send_json(send, sac.HTTP_SERVICE_UNAVAILABLE, "Server is overloaded, retry later", 1)
+            return
+        self.limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.in_flight -= 1
+
+
+class StreamLimiter:
+    """
+    Cap on the long-lived event streams open in this process.
+
+    Streams are exempt from the ``ConcurrencyLimiter``, since they hold no
+    worker thread while idle, but each one still polls the database, so they
+    are capped in total and per user. Slots are taken and given back on the
+    event loop thread, so the counters need no lock.
+    """
+
+    def __init__(self, max_streams: int, max_per_user: int) -> None:
+        """
+        Initialize the limiter.
+
+        Args:
+            max_streams (int): The number of streams the process keeps open at once.
+            max_per_user (int): The number of streams one user keeps open at once.
+        """
+        self.max_streams: int = max_streams
+        self.max_per_user: int = max_per_user
+        self.open: int = 0
+        self.per_user: Dict[int, int] = {}
+
+    def acquire(self, user_id: int) -> bool:
+        """
+        Take a stream slot for a user.
+
+        Args:
+            user_id (int): The ID of the user opening the stream.
+
+        Returns:
+            bool: Whether a slot was free; if so it must be given back with ``release``.
+        """
+        held: int = self.per_user.get(user_id, 0)
+        if self.open >= self.max_streams or held >= self.max_per_user:
+            return False
+        self.open += 1
+        self.per_user[user_id] = held + 1
+        return True
+
+    def release(self, user_id: int) -> None:
+        """
+        Give back a stream slot taken with ``acquire``.
+
+        Args:
+            user_id (int): The ID of the user whose stream closed.
+        """
+        self.open -= 1
+        held: int = self.per_user[user_id] - 1
+        if held:
+            self.per_user[user_id] = held
+        else:
+            del self.per_user[user_id]
+
+
+rate_limit_backend: RateLimitBackend = build_rate_limit_backend()
+concurrency_limiter: ConcurrencyLimiter = ConcurrencyLimiter(
+    int(os.environ.get("MAX_CONCURRENT_REQUESTS", 40)),
+    exempt_paths=("/api/v1/expenses/events/stream", "/healthz", "/readyz"),
+)
+stream_limiter: StreamLimiter = StreamLimiter(
+    int(os.environ.get("MAX_EVENT_STREAMS", 100)),
+    int(os.environ.get("EVENT_STREAMS_PER_USER", 3)),
+)
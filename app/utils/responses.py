@@ -0,0 +1,64 @@
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Callable, Dict
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that skips the standard library encoder.
+
+    Content that is already serialized (``bytes``, for example the output of a
+    pydantic ``TypeAdapter.dump_json``) is sent as is. Anything else is encoded
+    with orjson when it is installed, and with a compact ``json.dumps`` otherwise.
+    """
+
+    def render(self, content: Any) -> bytes:
+        """
+        Encode the response body.
+
+        Args:
+            content (Any): The response content.
+
+        Returns:
+            bytes: The encoded JSON body.
+        """
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    Streaming response that runs a callback once it is finished with.
+
+    The callback runs however the response ends, including when the client
+    disconnects before the first chunk, when the body generator never gets
+    to run its own ``finally``.
+    """
+
+    def __init__(self, content: Any, on_close: Callable[[], None], **kwargs: Any) -> None:
+        """
+        Initialize the response.
+
+        Args:
+            content (Any): The body iterator.
+            on_close (Callable[[], None]): Called once the response is done.
+            **kwargs (Any): Passed on to ``StreamingResponse``.
+        """
+        super().__init__(content, **kwargs)
+        self.on_close: Callable[[], None] = on_close
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
@@ -0,0 +1,263 @@
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timedelta, timezone
+from app.models import models
+from app.database.database import SessionLocal
+from app.database.dialects import upsert
+from typing import Dict, Iterator
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+logger: logging.Logger = logging.getLogger(__name__)
+# Revocations older than the last sync by less than this are read again, so
+# clock skew between servers and commits landing late are not missed.
+SYNC_OVERLAP: timedelta = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over strings.
+
+    Membership tests never give false negatives, so a miss proves an item was
+    never added. Positions come from double hashing a single BLAKE2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """
+        Size the filter for the expected number of items.
+
+        Args:
+            capacity (int): The number of items the filter is sized for.
+            error_rate (float): The target false positive rate at ``capacity``.
+        """
+        self.size: int = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count: int = max(1, round(self.size / capacity * math.log(2)))
+        self.bits: bytearray = bytearray(math.ceil(self.size / 8))
+
+    def positions(self, item: str) -> Iterator[int]:
+        """
+        Yield the bit positions of an item.
+
+        Args:
+            item (str): The item to hash.
+
+        Yields:
+            int: The index of each bit representing the item.
+        """
+        digest: bytes = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first: int = int.from_bytes(digest[:8], "little")
+        second: int = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        """
+        Add an item to the filter.
+
+        Args:
+            item (str): The item to add.
+        """
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(item)
+        )
+
+
+class TokenDenylist:
+    """
+    In-memory denylist of revoked access token IDs (``jti`` claims).
+
+    Lookups are O(1) and never touch the database: the Bloom filter answers the
+    common "not revoked" case, and only its rare positives are confirmed
+    against the exact map. Entries are dropped once the token would have
+    expired anyway, and the filter is rebuilt from the survivors at that point,
+    so memory stays proportional to the tokens revoked within one access token
+    lifetime. Each process keeps its own copy, filled from the
+    ``revoked_tokens`` table by ``sync_token_denylist``.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001) -> None:
+        """
+        Initialize the denylist.
+
+        Args:
+            capacity (int): The number of revoked tokens after which expired
+                entries are pruned. It grows if most entries are still live.
+            error_rate (float): The Bloom filter false positive rate at capacity.
+        """
+        self.capacity: int = capacity
+        self.error_rate: float = error_rate
+        self.bloom: BloomFilter = BloomFilter(capacity, error_rate)
+        self.revoked: Dict[str, float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """
+        Revoke a token until it expires.
+
+        Args:
+            jti (str): The token ID.
+            expires_at (float): The token's ``exp`` claim as a UNIX timestamp.
+        """
+        with self._lock:
+            if len(self.revoked) >= self.capacity:
+                self._prune()
+            self.revoked[jti] = expires_at
+            self.bloom.add(jti)
+
+    def is_revoked(self, jti: str | None) -> bool:
+        """
+        Check whether a token has been revoked.
+
+        Args:
+            jti (str | None): The token ID, if the token carries one.
+
+        Returns:
+            bool: True if the token was revoked and has not yet expired.
+        """
+        if jti is None or jti not in self.bloom:
+            return False
+        expires_at: float | None = self.revoked.get(jti)
+        return expires_at is not None and expires_at >= time.time()
+
+    def prune(self) -> None:
+        """
+        Drop expired entries and rebuild the Bloom filter from the rest.
+        """
+        with self._lock:
+            self._prune()
+
+    def _prune(self) -> None:
+        now: float = time.time()
+        self.revoked = {jti: exp for jti, exp in self.revoked.items() if exp >= now}
+        # Grow when most entries are still live so pruning is not repeated on every revoke.
+        self.capacity = max(self.capacity, len(self.revoked) * 2)
+        bloom: BloomFilter = BloomFilter(self.capacity, self.error_rate)
+        for jti in self.revoked:
+            bloom.add(jti)
+        self.bloom = bloom
+
+
+def utc_timestamp(value: datetime) -> float:
+    """
+    Convert a stored UTC time, which may come back naive, to a UNIX timestamp.
+
+    Args:
+        value (datetime): The time read from the database.
+
+    Returns:
+        float: The UNIX timestamp.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def revoke_access_token(db: Session, denylist: "TokenDenylist", jti: str, expires_at: float) -> None:
+    """
+    Revoke an access token in every worker.
+
+    The revocation is stored in ``revoked_tokens``, which the other workers
+    read every ``TOKEN_DENYLIST_SYNC_SECONDS``, and applies to this worker's
+    denylist at once.
+
+    Args:
+        db (Session): The database session.
+        denylist (TokenDenylist): This worker's denylist.
+        jti (str): The token ID.
+        expires_at (float): The token's ``exp`` claim as a UNIX timestamp.
+    """
+    table = models.RevokedToken.__table__
+    db.execute(
+        upsert(db, table)
+        .values(
+            jti=jti,
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc),
+            revoked_at=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=[table.c.jti])
+    )
+    db.commit()
+    denylist.revoke(jti, expires_at)
+
+
+def sync_token_denylist(db: Session, denylist: "TokenDenylist", since: datetime | None) -> datetime:
+    """
+    Copy the revocations made by other workers into this worker's denylist.
+
+    Reads from the primary, so a lagging replica cannot delay a logout.
+
+    Args:
+        db (Session): The database session.
+        denylist (TokenDenylist): This worker's denylist.
+        since (datetime | None): The time returned by the previous sync, or
+            None to load every revocation that has not expired.
+
+    Returns:
+        datetime: The time to pass as ``since`` next time.
+    """
+    now: datetime = datetime.now(timezone.utc)
+    query = db.query(models.RevokedToken.jti, models.RevokedToken.expires_at).filter(
+        models.RevokedToken.expires_at >= now
+    )
+    if since is not None:
+        query = query.filter(models.RevokedToken.revoked_at >= since - SYNC_OVERLAP)
+    for jti, expires_at in query.execution_options(use_primary=True):
+        if jti not in denylist.revoked:
+            denylist.revoke(jti, utc_timestamp(expires_at))
+    return now
+
+
+def purge_revoked_tokens(db: Session) -> int:
+    """
+    Delete stored revocations of tokens that have expired anyway.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    deleted: int = (
+        db.query(models.RevokedToken)
+        .filter(models.RevokedToken.expires_at < datetime.now(timezone.utc))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+async def denylist_sync_loop() -> None:
+    """
+    Run ``sync_token_denylist`` every ``TOKEN_DENYLIST_SYNC_SECONDS`` (default 2).
+
+    The first pass loads every live revocation; later passes only read the
+    recent ones. A failed pass is logged and retried on the next tick.
+    """
+    interval: float = float(os.environ.get("TOKEN_DENYLIST_SYNC_SECONDS", 2))
+    since: datetime | None = None
+
+    def sync() -> datetime:
+        with SessionLocal() as db:
+            return sync_token_denylist(db, token_denylist, since)
+
+    while True:
+        try:
+            since = await run_in_threadpool(sync)
+        except Exception:
+            logger.exception("Token denylist sync failed")
+        await asyncio.sleep(interval)
+
+
+token_denylist: TokenDenylist = TokenDenylist(
+    capacity=int(os.environ.get("TOKEN_DENYLIST_CAPACITY", 100_000))
+)
@@ -0,0 +1,101 @@
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from app.database.database import SessionLocal
+from app.utils.curd import get_due_recurring_expense_ids, materialize_recurring_expense
+from typing import List
+import asyncio
+import logging
+import os
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def materialize_batch(template_ids: List[int], now: datetime) -> int:
+    """
+    Materialize the due occurrences of a batch of templates with one session.
+
+    Args:
+        template_ids (List[int]): The IDs of the templates.
+        now (datetime): The current time, as naive UTC.
+
+    Returns:
+        int: The number of expenses created.
+    """
+    max_occurrences: int = int(os.environ.get("SCHEDULER_MAX_CATCH_UP", 400))
+    created: int = 0
+    with SessionLocal() as db:
+        for template_id in template_ids:
+            try:
+                created += materialize_recurring_expense(db, template_id, now, max_occurrences)
+            except Exception:
+                db.rollback()
+                logger.exception("Materializing recurring expense %s failed", template_id)
+    return created
+
+
+def find_due(now: datetime, limit: int) -> List[int]:
+    """
+    Read the IDs of due templates with a short-lived session.
+
+    Args:
+        now (datetime): The current time, as naive UTC.
+        limit (int): The maximum number of IDs to return.
+
+    Returns:
+        List[int]: The IDs of due templates.
+    """
+    with SessionLocal() as db:
+        return get_due_recurring_expense_ids(db, now, limit)
+
+
+async def run_due_recurring_expenses() -> int:
+    """
+    Materialize every due recurring expense occurrence.
+
+    Due templates are read ``SCHEDULER_BATCH_SIZE`` (default 200) at a time
+    and processed in worker threads, at most ``SCHEDULER_CONCURRENCY``
+    (default 2) batches at once, so the scheduler never takes more than that
+    many threads away from request handling. Templates missing several
+    occurrences, for example after downtime, catch up on all of them.
+
+    Returns:
+        int: The number of expenses created.
+    """
+    batch_size: int = int(os.environ.get("SCHEDULER_BATCH_SIZE", 200))
+    concurrency: int = int(os.environ.get("SCHEDULER_CONCURRENCY", 2))
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+    now: datetime = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async def run_batch(template_ids: List[int]) -> int:
+        async with semaphore:
+            return await run_in_threadpool(materialize_batch, template_ids, now)
+
+    created: int = 0
+    while True:
+        # Over-fetch so every concurrent slot gets a batch; claims make overlap harmless.
+        due: List[int] = await run_in_threadpool(find_due, now, batch_size * concurrency)
+        if not due:
+            return created
+        batches: List[List[int]] = [due[i:i + batch_size] for i in range(0, len(due), batch_size)]
+        results: List[int] = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        created += sum(results)
+        if sum(results) == 0:
+            # Everything left is claimed by another worker or failing; retry next tick.
+            return created
+
+
+async def scheduler_loop() -> None:
+    """
+    Run ``run_due_recurring_expenses`` at startup and then every
+    ``SCHEDULER_INTERVAL_SECONDS`` (default 60).
+
+    The first pass catches up on occurrences missed while the server was
+    down. A failed pass is logged and retried on the next tick.
+    """
+    interval: float = float(os.environ.get("SCHEDULER_INTERVAL_SECONDS", 60))
+    while True:
+        try:
+            await run_due_recurring_expenses()
+        except Exception:
+            logger.exception("Recurring expense pass failed")
+        await asyncio.sleep(interval)
@@ -4,11 +4,57 @@ from datetime import datetime, timedelta
 from app.config.config import settings
 import time
 from datetime import timezone
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import multiprocessing
 import os
+import secrets
+import threading
+import uuid
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Created on first use, so each forked server worker gets its own pool.
+password_hash_pool: ProcessPoolExecutor | None = None
+password_hash_pool_lock: threading.Lock = threading.Lock()
+
+class InFlightCounter:
+    """
+    Number of operations currently running, updated from any thread.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the counter at zero.
+        """
+        self.count: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @contextmanager
+    def track(self, n: int = 1) -> Iterator[None]:
+        """
+        Count ``n`` operations as running for the duration of the block.
+
+        Args:
+            n (int): The number of operations started.
+
+        Yields:
+            None: Control while the operations run.
+        """
+        with self._lock:
+            self.count += n
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.count -= n
+
+# bcrypt hashes and verifications running in this process, including those
+# handed to the process pool; read by the readiness check.
+password_hashes_in_flight: InFlightCounter = InFlightCounter()
+
 def hash_password(password: str) -> str:
     """
     Hash a password using bcrypt.
@@ -19,7 +65,68 @@ def hash_password(password: str) -> str:
     Returns:
         str: The hashed password.
     """
-    return pwd_context.hash(password)
+    with password_hashes_in_flight.track():
+        return pwd_context.hash(password)
+
+def password_hash_workers() -> int:
+    """
+    Return the size of the password hashing pool.
+
+    Returns:
+        int: ``PASSWORD_HASH_WORKERS``, or the number of CPUs if unset.
+    """
+    return int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
+def get_password_hash_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool used to hash passwords in parallel, creating it if needed.
+
+    The pool uses the ``spawn`` start method so its workers never inherit the
+    server's sockets, threads or database connections.
+
+    Returns:
+        ProcessPoolExecutor: The shared pool.
+    """
+    global password_hash_pool
+    with password_hash_pool_lock:
+        if password_hash_pool is None:
+            password_hash_pool = ProcessPoolExecutor(
+                max_workers=password_hash_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return password_hash_pool
+
+def shutdown_password_hash_pool() -> None:
+    """
+    Stop the password hashing pool, if it was started.
+    """
+    global password_hash_pool
+    with password_hash_pool_lock:
+        if password_hash_pool is not None:
+            password_hash_pool.shutdown(cancel_futures=True)
+            password_hash_pool = None
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords with bcrypt, in parallel when the batch is large enough.
+
+    Batches of at least ``PASSWORD_HASH_PARALLEL_MIN`` (default 8) passwords
+    are spread across the process pool, so a bulk import uses every CPU without
+    occupying the server's request threads. Smaller batches are hashed inline,
+    where the inter-process overhead would outweigh the gain.
+
+    Args:
+        passwords (List[str]): The plaintext passwords.
+
+    Returns:
+        List[str]: The hashed passwords, in input order.
+    """
+    if len(passwords) < int(os.environ.get("PASSWORD_HASH_PARALLEL_MIN", 8)):
+        return [hash_password(password) for password in passwords]
+    pool: ProcessPoolExecutor = get_password_hash_pool()
+    chunksize: int = max(1, len(passwords) // (password_hash_workers() * 4))
+    with password_hashes_in_flight.track(len(passwords)):
+        return list(pool.map(hash_password, passwords, chunksize=chunksize))
     
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -32,12 +139,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True if the password matches, False otherwise.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    with password_hashes_in_flight.track():
+        return pwd_context.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """
     Create a JWT access token.
 
+    Every token carries a unique ``jti`` claim so it can be revoked on its own.
+
     Args:
         data (dict): The data to encode in the token.
         expires_delta (timedelta, optional): The time delta after which the token expires. Defaults to 15 minutes.
@@ -50,9 +160,34 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     else:
         expire: datetime = datetime.now(timezone.utc) + timedelta(minutes=15)
     data["exp"] = expire
+    data.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt: str = jwt.encode(data, os.environ.get("SECRET_KEY"), algorithm=os.environ.get("HASH_ALGORITHM"))
     return encoded_jwt
 
+def generate_refresh_token() -> str:
+    """
+    Generate an opaque refresh token.
+
+    Returns:
+        str: A URL safe random token with 256 bits of entropy.
+    """
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    """
+    Hash a refresh token for storage and lookup.
+
+    Refresh tokens are random rather than user chosen, so a single SHA-256 is
+    enough and keeps the refresh path an indexed lookup instead of a bcrypt check.
+
+    Args:
+        token (str): The plaintext refresh token.
+
+    Returns:
+        str: The hex encoded SHA-256 digest of the token.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def decode_jwt(token: str) -> dict:
     """
     Decode a JWT token.
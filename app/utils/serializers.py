@@ -0,0 +1,159 @@
+from pydantic import TypeAdapter
+from typing import Any, Dict, List, Sequence
+from app.database.schemas.user_schema import User, UserBulkCreateResult
+from app.database.schemas.expense_schema import Expense, ExpensePage, ExpenseSplit
+from app.database.schemas.balance_sheet_schema import BalanceSheet, BalanceSheetDetail
+
+# Built once: creating a TypeAdapter compiles its serializer.
+user_list_adapter: TypeAdapter = TypeAdapter(List[User])
+expense_list_adapter: TypeAdapter = TypeAdapter(List[Expense])
+expense_page_adapter: TypeAdapter = TypeAdapter(ExpensePage)
+balance_sheet_list_adapter: TypeAdapter = TypeAdapter(List[BalanceSheet])
+bulk_create_result_adapter: TypeAdapter = TypeAdapter(UserBulkCreateResult)
+
+
+def users_to_json(rows: Sequence[Any]) -> bytes:
+    """
+    Serialize user rows to a JSON array.
+
+    The rows come straight from the database, so they are wrapped with
+    ``model_construct`` instead of being validated again.
+
+    Args:
+        rows (Sequence[Any]): Rows with ``id``, ``email``, ``name`` and ``mobile`` columns.
+
+    Returns:
+        bytes: The JSON encoded list of users.
+    """
+    return user_list_adapter.dump_json(
+        [
+            User.model_construct(id=row.id, email=row.email, name=row.name, mobile=row.mobile)
+            for row in rows
+        ]
+    )
+
+
+def bulk_create_result_to_json(rows: Sequence[Any], skipped: Sequence[str]) -> bytes:
+    """
+    Serialize the outcome of a bulk user creation.
+
+    Args:
+        rows (Sequence[Any]): Rows of the created users.
+        skipped (Sequence[str]): The emails that were not created.
+
+    Returns:
+        bytes: The JSON encoded ``{"created", "skipped"}`` object.
+    """
+    return bulk_create_result_adapter.dump_json(
+        UserBulkCreateResult.model_construct(
+            created=[
+                User.model_construct(id=row.id, email=row.email, name=row.name, mobile=row.mobile)
+                for row in rows
+            ],
+            skipped=list(skipped),
+        )
+    )
+
+
+def expense_models(expense_rows: Sequence[Any], split_rows: Sequence[Any]) -> List[Expense]:
+    """
+    Wrap expense rows and their split rows in unvalidated ``Expense`` models.
+
+    Args:
+        expense_rows (Sequence[Any]): Rows with ``id``, ``amount``, ``description``,
+            ``split_method``, ``currency``, ``expense_date`` and ``owner_id`` columns.
+        split_rows (Sequence[Any]): Rows with ``id``, ``expense_id``, ``user_id``,
+            ``amount`` and ``percentage`` columns.
+
+    Returns:
+        List[Expense]: The expenses, in the order of ``expense_rows``.
+    """
+    splits: Dict[int, List[ExpenseSplit]] = {row.id: [] for row in expense_rows}
+    for row in split_rows:
+        splits[row.expense_id].append(
+            ExpenseSplit.model_construct(
+                id=row.id, user_id=row.user_id, amount=row.amount, percentage=row.percentage
+            )
+        )
+    return [
+        Expense.model_construct(
+            id=row.id,
+            amount=row.amount,
+            description=row.description,
+            split_method=row.split_method,
+            currency=row.currency,
+            expense_date=row.expense_date,
+            owner_id=row.owner_id,
+            splits=splits[row.id],
+        )
+        for row in expense_rows
+    ]
+
+
+def expenses_to_json(expense_rows: Sequence[Any], split_rows: Sequence[Any]) -> bytes:
+    """
+    Serialize expense rows and their split rows to a JSON array of expenses.
+
+    Args:
+        expense_rows (Sequence[Any]): Expense rows, see ``expense_models``.
+        split_rows (Sequence[Any]): Split rows, see ``expense_models``.
+
+    Returns:
+        bytes: The JSON encoded list of expenses.
+    """
+    return expense_list_adapter.dump_json(expense_models(expense_rows, split_rows))
+
+
+def expense_page_to_json(
+    expense_rows: Sequence[Any], split_rows: Sequence[Any], next_cursor: int | None
+) -> bytes:
+    """
+    Serialize one page of expenses with the cursor of the next page.
+
+    Args:
+        expense_rows (Sequence[Any]): Expense rows, see ``expense_models``.
+        split_rows (Sequence[Any]): Split rows, see ``expense_models``.
+        next_cursor (int | None): The ``after`` value of the next page, None on the last page.
+
+    Returns:
+        bytes: The JSON encoded ``{"expenses", "next_cursor"}`` object.
+    """
+    return expense_page_adapter.dump_json(
+        ExpensePage.model_construct(
+            expenses=expense_models(expense_rows, split_rows), next_cursor=next_cursor
+        )
+    )
+
+
+def balance_sheets_to_json(balance_sheets: Sequence[Dict[str, Any]]) -> bytes:
+    """
+    Serialize balance sheets built from expense and balance rows to a JSON array.
+
+    Args:
+        balance_sheets (Sequence[Dict[str, Any]]): Balance sheets as returned by
+            ``curd.get_overall_balance_sheet``.
+
+    Returns:
+        bytes: The JSON encoded list of balance sheets.
+    """
+    return balance_sheet_list_adapter.dump_json(
+        [
+            BalanceSheet.model_construct(
+                user_id=balance_sheet["user_id"],
+                total_amount=balance_sheet["total_amount"],
+                owed_amount=balance_sheet["owed_amount"],
+                currency=balance_sheet["currency"],
+                details=[
+                    BalanceSheetDetail.model_construct(
+                        id=row.id,
+                        description=row.description,
+                        amount=row.amount,
+                        split_method=row.split_method,
+                        currency=row.currency,
+                    )
+                    for row in balance_sheet["details"]
+                ],
+            )
+            for balance_sheet in balance_sheets
+        ]
+    )
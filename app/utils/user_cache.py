@@ -0,0 +1,67 @@
+from typing import Dict, Iterable, Set
+import os
+import threading
+import time
+
+
+class KnownUserIds:
+    """
+    Short-lived, process local set of user IDs known to exist.
+
+    Only positive lookups are cached, so a user created a moment ago is never
+    reported missing. Entries expire after ``ttl`` seconds, which bounds how
+    long a removed user could still be accepted.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_ids: int = 100_000) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            ttl (float): How long, in seconds, an ID stays known.
+            max_ids (int): The number of IDs kept before the cache is emptied.
+        """
+        self.ttl: float = ttl
+        self.max_ids: int = max_ids
+        self.expires: Dict[int, float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def unknown(self, user_ids: Iterable[int]) -> Set[int]:
+        """
+        Filter out the IDs that are known to exist.
+
+        Args:
+            user_ids (Iterable[int]): The IDs to check.
+
+        Returns:
+            Set[int]: The IDs that have to be looked up in the database.
+        """
+        now: float = time.monotonic()
+        expires: Dict[int, float] = self.expires
+        return {user_id for user_id in user_ids if expires.get(user_id, 0.0) < now}
+
+    def add(self, user_ids: Iterable[int]) -> None:
+        """
+        Remember IDs that were just found in the database.
+
+        Args:
+            user_ids (Iterable[int]): The existing IDs.
+        """
+        expires_at: float = time.monotonic() + self.ttl
+        with self._lock:
+            if len(self.expires) >= self.max_ids:
+                self.expires = {}
+            self.expires.update(dict.fromkeys(user_ids, expires_at))
+
+    def clear(self) -> None:
+        """
+        Forget every ID.
+        """
+        with self._lock:
+            self.expires = {}
+
+
+known_user_ids: KnownUserIds = KnownUserIds(
+    ttl=float(os.environ.get("KNOWN_USER_CACHE_TTL_SECONDS", 60)),
+    max_ids=int(os.environ.get("KNOWN_USER_CACHE_MAX_IDS", 100_000)),
+)
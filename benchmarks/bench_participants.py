@@ -0,0 +1,80 @@
+"""
+Cost of creating one expense with many split participants.
+
+Compares checking every participant with its own query (what a per-split
+`get_user` would cost) against `curd.validate_participants` with a cold and a
+warm known-user cache, and times the full `curd.create_new_expense`.
+
+Usage:
+    python -m benchmarks.bench_participants --participants 1000 5000
+"""
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from typing import Callable, List
+from app.database.database import Base
+from app.database.schemas.expense_schema import ExpenseCreate, ExpenseSplit
+from app.models import models
+from app.utils import curd
+from app.utils.user_cache import known_user_ids
+import argparse
+import time
+
+
+def seed(db, users: int) -> None:
+    db.execute(
+        insert(models.User),
+        [
+            {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "mobile": "9999999999", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ],
+    )
+    db.commit()
+
+
+def per_row_lookup(db, user_ids: List[int]) -> None:
+    for user_id in user_ids:
+        assert curd.get_user(db, user_id) is not None
+
+
+def best_of(func: Callable[[], None], repeat: int, before: Callable[[], None] = lambda: None) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        before()
+        start: float = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--participants", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        seed(db, max(args.participants))
+
+    print(f"{'participants':>12} {'per-row':>10} {'IN cold':>10} {'IN warm':>10} {'create':>10}  (ms, best of {args.repeat})")
+    for count in args.participants:
+        user_ids: List[int] = list(range(1, count + 1))
+        expense = ExpenseCreate(
+            amount=float(count),
+            description="Bench",
+            split_method="equal",
+            splits=[ExpenseSplit(user_id=user_id) for user_id in user_ids],
+        )
+        with Session() as db:
+            per_row: float = best_of(lambda: per_row_lookup(db, user_ids), args.repeat)
+            cold: float = best_of(lambda: curd.validate_participants(db, user_ids), args.repeat, known_user_ids.clear)
+            warm: float = best_of(lambda: curd.validate_participants(db, user_ids), args.repeat)
+            create: float = best_of(lambda: curd.create_new_expense(db, expense, owner_id=1), args.repeat)
+        print(f"{count:>12} {per_row * 1000:>10.2f} {cold * 1000:>10.2f} {warm * 1000:>10.2f} {create * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of the recurring expense scheduler, and how much it delays the
+event loop while it runs.
+
+Seeds a throwaway SQLite database with templates that are all due, runs one
+scheduler pass and meanwhile measures how late a 10 ms timer fires on the
+event loop, which is what request handling would feel.
+
+Usage:
+    python -m benchmarks.bench_scheduler --templates 5000 --concurrency 1 2 4
+"""
+from typing import List
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def loop_lag(stop: asyncio.Event, lags: List[float]) -> None:
+    while not stop.is_set():
+        start: float = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+
+async def measure(templates: int) -> None:
+    from app.utils.scheduler import run_due_recurring_expenses
+
+    stop: asyncio.Event = asyncio.Event()
+    lags: List[float] = []
+    probe: asyncio.Task = asyncio.create_task(loop_lag(stop, lags))
+    start: float = time.perf_counter()
+    created: int = await run_due_recurring_expenses()
+    elapsed: float = time.perf_counter() - start
+    stop.set()
+    await probe
+    lags.sort()
+    print(
+        f"{os.environ['SCHEDULER_CONCURRENCY']:>11} {created:>8} {elapsed:>8.2f} s {created / elapsed:>9.0f}/s"
+        f" {lags[len(lags) // 2] * 1000:>9.2f} ms {lags[-1] * 1000:>9.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--templates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    print(f"{'concurrency':>11} {'created':>8} {'elapsed':>10} {'rate':>10} {'lag p50':>12} {'lag max':>12}")
+    for concurrency in args.concurrency:
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+            os.environ["SCHEDULER_CONCURRENCY"] = str(concurrency)
+            # A fresh interpreter per run, so the app's engine binds to this run's database.
+            subprocess.run(
+                [sys.executable, "-c", f"from benchmarks.bench_scheduler import run; run({args.templates})"],
+                env=os.environ,
+                check=True,
+            )
+
+
+def run(templates: int) -> None:
+    from sqlalchemy import insert
+    from datetime import datetime, timedelta, timezone
+    from app.database.database import Base, engine, SessionLocal
+    from app.models import models
+
+    Base.metadata.create_all(bind=engine)
+    due: datetime = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=1)
+    with SessionLocal() as db:
+        db.execute(insert(models.User), [
+            {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "mobile": "1", "hashed_password": "x"}
+            for i in range(1, 11)
+        ])
+        db.execute(insert(models.RecurringExpense), [
+            {
+                "owner_id": 1 + i % 10, "amount": 30.0, "description": f"Template {i}", "split_method": "equal",
+                "splits": '[{"user_id": %d}, {"user_id": %d}]' % (1 + i % 10, 1 + (i + 1) % 10),
+                "frequency": "monthly", "interval": 1, "start_at": due, "run_count": 0, "next_run_at": due,
+            }
+            for i in range(templates)
+        ])
+        db.commit()
+    asyncio.run(measure(templates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Latency of `/expenses/search` over a large expense table.
+
+Seeds a throwaway SQLite file with millions of expenses (each split between
+its owner and one other user, descriptions drawn from a skewed vocabulary),
+then times `curd.search_expenses` for one user against the FTS5 index and a
+`LIKE '%word%'` scan doing the same filtering.
+
+With ``--snapshot PATH`` the seeded database is saved there on the first
+run and restored on later runs, which skips the minutes of seeding.
+
+Usage:
+    python -m benchmarks.bench_search --expenses 2000000 --snapshot search-2m.db
+"""
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+from typing import Callable, Dict, List
+from app.database.database import Base
+from app.database.snapshot import save_snapshot, restore_snapshot
+from app.models import models
+from app.utils import curd
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS: List[str] = [
+    "groceries", "rent", "dinner", "taxi", "coffee", "electricity", "internet", "cinema",
+    "flight", "hotel", "museum", "pharmacy", "gym", "ferry", "concert", "laundry",
+] + [f"item{i}" for i in range(5000)]
+
+
+# Zipf distributed, so a few words are very common and most are rare.
+WEIGHTS: List[float] = [1 / rank for rank in range(1, len(WORDS) + 1)]
+
+
+def description(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, WEIGHTS, k=rng.randint(2, 5)))
+
+
+def seed(Session, expenses: int, users: int, batch: int = 50_000) -> None:
+    rng: random.Random = random.Random(42)
+    with Session() as db:
+        db.execute(
+            insert(models.User),
+            [
+                {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "mobile": "9", "hashed_password": "x"}
+                for i in range(1, users + 1)
+            ],
+        )
+        for start in range(1, expenses + 1, batch):
+            ids: range = range(start, min(start + batch, expenses + 1))
+            owners: Dict[int, int] = {i: rng.randint(1, users) for i in ids}
+            db.execute(
+                insert(models.Expense),
+                [
+                    {"id": i, "amount": 10.0, "description": description(rng), "split_method": "equal", "owner_id": owners[i]}
+                    for i in ids
+                ],
+            )
+            db.execute(
+                insert(models.ExpenseSplit),
+                [{"expense_id": i, "user_id": owners[i], "amount": 5.0} for i in ids]
+                + [{"expense_id": i, "user_id": rng.randint(1, users), "amount": 5.0} for i in ids],
+            )
+            db.commit()
+
+
+def like_search(db, user_id: int, word: str, limit: int) -> List:
+    return db.execute(
+        text(
+            "SELECT e.id FROM expenses e WHERE e.description LIKE :pattern AND e.deleted_at IS NULL "
+            "AND (e.owner_id = :user_id OR EXISTS (SELECT 1 FROM expense_splits s WHERE s.expense_id = e.id "
+            "AND s.user_id = :user_id AND s.deleted_at IS NULL)) ORDER BY e.id LIMIT :limit"
+        ),
+        {"pattern": f"%{word}%", "user_id": user_id, "limit": limit},
+    ).all()
+
+
+def percentiles(func: Callable[[], None], repeat: int) -> List[float]:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return [statistics.median(timings), timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--expenses", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--snapshot", help="save the seeded database here, or restore it if the file exists")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'search.db')}")
+        Session = sessionmaker(bind=engine)
+        start: float = time.perf_counter()
+        if args.snapshot and os.path.exists(args.snapshot):
+            restore_snapshot(engine, args.snapshot)
+            print(f"restored {args.snapshot} in {time.perf_counter() - start:.1f} s")
+        else:
+            Base.metadata.create_all(bind=engine)
+            seed(Session, args.expenses, args.users)
+            print(f"seeded {args.expenses} expenses in {time.perf_counter() - start:.0f} s")
+            if args.snapshot:
+                start = time.perf_counter()
+                save_snapshot(engine, args.snapshot)
+                print(f"saved {args.snapshot} in {time.perf_counter() - start:.1f} s")
+
+        queries: Dict[str, str] = {"common": "groceries", "rare": "item4321", "prefix": "electr", "two words": "rent dinner"}
+        print(f"{'query':>10} {'FTS p50':>10} {'FTS p95':>10} {'LIKE p50':>10} {'LIKE p95':>10}  (ms, user 1, limit {args.limit})")
+        with Session() as db:
+            for name, query in queries.items():
+                fts: List[float] = percentiles(
+                    lambda: curd.search_expenses(db, 1, query, limit=args.limit), args.repeat
+                )
+                like: List[float] = percentiles(
+                    lambda: like_search(db, 1, query.split()[0], args.limit), max(3, args.repeat // 10)
+                )
+                print(f"{name:>10} {fts[0]:>10.2f} {fts[1]:>10.2f} {like[0]:>10.2f} {like[1]:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
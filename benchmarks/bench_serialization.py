@@ -0,0 +1,118 @@
+"""
+Per-row cost of the list endpoints: ORM + response_model validation + json
+versus plain column rows + model_construct + TypeAdapter.dump_json.
+
+Usage:
+    python -m benchmarks.bench_serialization --rows 5000
+"""
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from pydantic import TypeAdapter
+from typing import Callable, List
+from app.database.database import Base
+from app.database.schemas.user_schema import User
+from app.database.schemas.expense_schema import Expense
+from app.database.schemas.balance_sheet_schema import BalanceSheet
+from app.models import models
+from app.utils import curd, serializers
+import argparse
+import json
+import time
+
+
+def seed(db, rows: int) -> None:
+    db.execute(
+        insert(models.User),
+        [
+            {"id": i, "email": f"user{i}@example.com", "name": f"User {i}", "mobile": "9999999999", "hashed_password": "x"}
+            for i in range(1, rows + 1)
+        ],
+    )
+    db.execute(
+        insert(models.Expense),
+        [
+            {"id": i, "amount": 100.0, "description": f"Expense {i}", "split_method": "equal", "owner_id": 1 + i % 10}
+            for i in range(1, rows + 1)
+        ],
+    )
+    db.execute(
+        insert(models.ExpenseSplit),
+        [
+            {"expense_id": i, "user_id": 1 + (i + j) % rows, "amount": 50.0}
+            for i in range(1, rows + 1)
+            for j in range(2)
+        ],
+    )
+    curd.rebuild_user_balances(db)
+
+
+def stdlib_dump(adapter: TypeAdapter, content) -> bytes:
+    # What FastAPI does for a response_model: validate, serialize to python, json.dumps.
+    validated = adapter.validate_python(content, from_attributes=True)
+    return json.dumps(
+        adapter.dump_python(validated, mode="json"), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def legacy_overall_balance_sheet(db) -> List[dict]:
+    sheets = []
+    for user in db.query(models.User).all():
+        expenses = db.query(models.Expense).filter(models.Expense.owner_id == user.id).all()
+        sheets.append({"user_id": user.id, "total_amount": sum(e.amount for e in expenses), "details": expenses})
+    return sheets
+
+
+def timed(label: str, rows: int, func: Callable[[], bytes], repeat: int) -> None:
+    best: float = min(_once(func) for _ in range(repeat))
+    print(f"{label:<48} {best * 1000:9.2f} ms  {best / rows * 1e6:7.2f} us/row")
+
+
+def _once(func: Callable[[], bytes]) -> float:
+    start: float = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        seed(db, args.rows)
+    users = TypeAdapter(List[User])
+    expenses = TypeAdapter(List[Expense])
+    sheets = TypeAdapter(List[BalanceSheet])
+
+    def fresh(func):
+        def run():
+            with Session() as db:
+                return func(db)
+        return run
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    timed("/users/all  orm + validate + json", args.rows,
+          fresh(lambda db: stdlib_dump(users, db.query(models.User).all())), args.repeat)
+    timed("/users/all  rows + construct + dump_json", args.rows,
+          fresh(lambda db: serializers.users_to_json(curd.get_user_rows(db))), args.repeat)
+    timed("/expenses   orm + validate + json", args.rows,
+          fresh(lambda db: stdlib_dump(expenses, db.query(models.Expense).all())), args.repeat)
+    timed("/expenses   rows + construct + dump_json", args.rows,
+          fresh(lambda db: serializers.expenses_to_json(
+              curd.get_expense_rows(db), db.query(
+                  models.ExpenseSplit.id, models.ExpenseSplit.expense_id, models.ExpenseSplit.user_id,
+                  models.ExpenseSplit.amount, models.ExpenseSplit.percentage,
+              ).all())), args.repeat)
+    timed("/overall    orm + validate + json", args.rows,
+          fresh(lambda db: stdlib_dump(sheets, legacy_overall_balance_sheet(db))), args.repeat)
+    timed("/overall    rows + construct + dump_json", args.rows,
+          fresh(lambda db: serializers.balance_sheets_to_json(curd.get_overall_balance_sheet(db))), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
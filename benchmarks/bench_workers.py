@@ -0,0 +1,120 @@
+"""
+Throughput of the gunicorn profile against the number of workers.
+
+Starts `gunicorn -c gunicorn.conf.py app.main:app` once per worker count on a
+throwaway SQLite database, drives it with concurrent keep-alive clients for a
+fixed duration and reports requests per second. Run it on the machine you
+deploy to: the load generator shares the CPUs with the server.
+
+Usage:
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --duration 10
+"""
+from typing import Dict, List, Tuple
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+EMAIL: str = "bench@example.com"
+PASSWORD: str = "benchpassword"
+
+
+def start_server(workers: int, port: int, database_url: str) -> subprocess.Popen:
+    env: Dict[str, str] = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "SQLALCHEMY_DATABASE_URL": database_url,
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "bench-secret"),
+        "HASH_ALGORITHM": os.environ.get("HASH_ALGORITHM", "HS256"),
+        "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+        # The benchmark is a single client hammering the API on purpose.
+        "RATE_LIMIT_AUTH_PER_IP": "1000000/1",
+        "RATE_LIMIT_AUTH_PER_EMAIL": "1000000/1",
+        "RATE_LIMIT_WRITES_PER_IP": "1000000/1",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def drive(base_url: str, path: str, method: str, headers: Dict[str, str],
+                params: Dict[str, str], concurrency: int, duration: float) -> Tuple[int, int]:
+    ok: int = 0
+    failed: int = 0
+    deadline: float = time.monotonic() + duration
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal ok, failed
+        while time.monotonic() < deadline:
+            response = await client.request(method, path, headers=headers, params=params)
+            if response.status_code == 200:
+                ok += 1
+            else:
+                failed += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    return ok, failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url: str = f"http://127.0.0.1:{args.port}"
+    results: List[Tuple[int, str, float, int]] = []
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as directory:
+            server = start_server(workers, args.port, f"sqlite:///{directory}/bench.db")
+            try:
+                wait_until_up(base_url)
+                httpx.post(base_url + "/api/v1/users/", json={
+                    "email": EMAIL, "name": "Bench", "mobile": "0000000000", "password": PASSWORD,
+                })
+                login = {"email": EMAIL, "password": PASSWORD}
+                token: str = httpx.post(base_url + "/api/v1/auth/token", params=login).json()["access_token"]
+                scenarios = [
+                    ("GET /users/current_user", "/api/v1/users/current_user", "GET",
+                     {"Authorization": f"Bearer {token}"}, {}),
+                    ("POST /auth/token (bcrypt)", "/api/v1/auth/token", "POST", {}, login),
+                ]
+                for label, path, method, headers, params in scenarios:
+                    ok, failed = asyncio.run(drive(base_url, path, method, headers, params,
+                                                   args.concurrency, args.duration))
+                    results.append((workers, label, ok / args.duration, failed))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} concurrent clients, {args.duration:g}s per run")
+    print(f"{'workers':>7}  {'scenario':<28} {'req/s':>9}  {'non-200':>7}")
+    for workers, label, rate, failed in results:
+        print(f"{workers:>7}  {label:<28} {rate:9.1f}  {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Multi-process server profile: gunicorn manages uvicorn workers.
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported once in the master (preload_app) so tables are created
+# a single time; each forked worker then drops the inherited connection pool
+# (see app.database.database.dispose_engine_after_fork) and opens its own.
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = os.environ.get("WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+preload_app = True
+
+# Graceful shutdown: stop accepting connections, let in-flight requests finish
+# for up to graceful_timeout seconds, then run the app's shutdown hook which
+# drains the connection pool.
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+
+# Recycle workers periodically so slow leaks cannot accumulate.
+max_requests = int(os.environ.get("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", 1000))
@@ -0,0 +1,324 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import itertools
+import sqlite3
+import subprocess
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.database.database import Base, RoutingSession, create_db_engine, track_session_user
+from app.database.dialects import supports_copy
+from app.database.migrations import upgrade_schema
+from app.database.snapshot import save_snapshot, restore_snapshot
+from app.models import models
+from app.utils import curd
+from app.utils.user_cache import known_user_ids
+from app.utils.revocation import TokenDenylist, purge_revoked_tokens, revoke_access_token, sync_token_denylist
+from app.utils.data_version import bump_data_version, get_data_version
+from app.database.schemas.expense_schema import ExpenseCreate
+from datetime import date, datetime, timedelta, timezone
+
+
+# Fixture for an empty schema, created once and copied into every test's databases
+@pytest.fixture(scope="session")
+def schema_template(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("template") / "schema.db")
+    template = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=template)
+    template.dispose()
+    return path
+
+
+# Fixture for a session factory over a primary and a replica that never catches up
+@pytest.fixture
+def routed_sessions(tmp_path, schema_template):
+    primary = create_db_engine(f"sqlite:///{tmp_path}/primary.db")
+    replica = create_db_engine(f"sqlite:///{tmp_path}/replica.db")
+    restore_snapshot(primary, schema_template)
+    restore_snapshot(replica, schema_template)
+    yield sessionmaker(
+        class_=RoutingSession, bind=primary, replicas=itertools.cycle([replica])
+    )
+    primary.dispose()
+    replica.dispose()
+
+
+def add_user(db, email):
+    user = models.User(email=email, name="Routed", mobile="0", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+# Test for reads going to the replica and writes to the primary
+def test_reads_go_to_replica(routed_sessions):
+    with routed_sessions() as db:
+        user = add_user(db, "writer@example.com")
+        # The writing session stays on the primary and sees its own write.
+        assert db.query(models.User).filter(models.User.id == user.id).count() == 1
+    with routed_sessions() as db:
+        assert db.query(models.User).count() == 0
+
+
+# Test for textual SQL being routed by its leading keyword
+def test_text_reads_go_to_replica(routed_sessions):
+    with routed_sessions() as db:
+        add_user(db, "text@example.com")
+    count = text("SELECT count(*) FROM users")
+    with routed_sessions() as db:
+        assert db.scalar(count) == 0
+        assert not db.info.get("use_primary")
+        db.execute(text("UPDATE users SET name = 'Texted'"))
+        assert db.info["use_primary"] and db.scalar(count) == 1
+        db.commit()
+
+
+# Test for a user's reads sticking to the primary after their own write
+def test_reads_stick_to_primary_after_write(routed_sessions):
+    with routed_sessions() as db:
+        track_session_user(db, 4242)
+        add_user(db, "sticky@example.com")
+    with routed_sessions() as db:
+        track_session_user(db, 4242)
+        assert db.query(models.User).count() == 1
+    with routed_sessions() as db:
+        track_session_user(db, 4343)
+        assert db.query(models.User).count() == 0
+
+
+# Test for auth and validation reads going to the primary while the replica lags
+def test_must_be_current_reads_use_primary(routed_sessions):
+    with routed_sessions() as db:
+        user = add_user(db, "fresh@example.com")
+        user_id = user.id
+    known_user_ids.clear()
+    with routed_sessions() as db:
+        assert curd.get_user_by_email(db, "fresh@example.com").id == user_id
+        curd.validate_participants(db, [user_id])
+        # Those reads did not pin the session; ordinary reads still use the replica.
+        assert db.query(models.User).count() == 0
+
+
+# Test for a refresh right after login, and its reuse, being read from the primary
+def test_refresh_token_reads_primary(routed_sessions):
+    with routed_sessions() as db:
+        user = add_user(db, "refresher@example.com")
+        token = curd.create_refresh_token(db, user.id)
+        user_id = user.id
+    with routed_sessions() as db:
+        assert curd.consume_refresh_token(db, token).id == user_id
+    with routed_sessions() as db:
+        assert curd.consume_refresh_token(db, token) is None
+        assert db.query(models.RefreshToken).filter(models.RefreshToken.revoked_at.is_(None)).count() == 0
+
+
+# Test for a logout in one worker reaching the denylist of another
+def test_revocation_reaches_other_workers(routed_sessions):
+    serving, other = TokenDenylist(), TokenDenylist()
+    with routed_sessions() as db:
+        since = sync_token_denylist(db, other, None)
+        revoke_access_token(db, serving, "logged-out", time.time() + 60)
+        revoke_access_token(db, serving, "logged-out", time.time() + 60)
+        revoke_access_token(db, serving, "expired", time.time() - 1)
+    assert serving.is_revoked("logged-out") and not other.is_revoked("logged-out")
+    with routed_sessions() as db:
+        sync_token_denylist(db, other, since)
+        assert purge_revoked_tokens(db) == 1
+    assert other.is_revoked("logged-out")
+    # A worker started later loads every live revocation.
+    late = TokenDenylist()
+    with routed_sessions() as db:
+        sync_token_denylist(db, late, None)
+    assert late.is_revoked("logged-out") and list(late.revoked) == ["logged-out"]
+
+
+# Test for owner-checked writes locking the expense on the primary, and a repeated delete being refused
+def test_owner_checked_delete_reads_primary(routed_sessions):
+    with routed_sessions() as db:
+        owner = add_user(db, "locker@example.com")
+        expense = curd.create_new_expense(
+            db,
+            ExpenseCreate(
+                amount=20.0, description="Locked lunch", split_method="equal",
+                expense_date=date(2024, 3, 1), splits=[{"user_id": owner.id}],
+            ),
+            owner_id=owner.id,
+        )
+        owner_id, expense_id = owner.id, expense.id
+    with routed_sessions() as db:
+        # The replica never saw the expense; the locking read must not go there.
+        curd.delete_expense(db, expense_id, owner_id)
+        assert db.get(models.UserBalance, owner_id).total_amount == 0.0
+    with routed_sessions() as db:
+        db.info["use_primary"] = True
+        with pytest.raises(HTTPException) as error:
+            curd.delete_expense(db, expense_id, owner_id)
+        assert error.value.status_code == 404
+        assert db.get(models.UserBalance, owner_id).total_amount == 0.0
+
+
+# Test for the change feed never moving its cursor past an event that may not have committed yet
+def test_change_feed_waits_for_visibility_lag(tmp_path, schema_template):
+    feed = create_db_engine(f"sqlite:///{tmp_path}/feed.db")
+    restore_snapshot(feed, schema_template)
+    old = datetime.now(timezone.utc) - timedelta(seconds=60)
+    with sessionmaker(bind=feed)() as db:
+        for event_id, created_at in ((1, old), (2, datetime.now(timezone.utc)), (3, old)):
+            db.add(models.ExpenseEvent(
+                id=event_id, event_type="expense.created", expense_id=event_id,
+                owner_id=1, payload="{}", created_at=created_at,
+            ))
+        db.commit()
+        # Event 2 is inside the lag window, so event 3 waits behind it.
+        page = curd.get_expense_events(db, 1, lag=5)
+        assert [event["id"] for event in page["events"]] == [1]
+        assert page["next_cursor"] == 1
+        assert curd.get_expense_events(db, 1, after=1, lag=5) == {"events": [], "next_cursor": 1}
+        db.get(models.ExpenseEvent, 2).created_at = old
+        db.commit()
+        assert [event["id"] for event in curd.get_expense_events(db, 1, after=1, lag=5)["events"]] == [2, 3]
+        # SQLite commits events in ID order, so it needs no lag by default.
+        assert [event["id"] for event in curd.get_expense_events(db, 1)["events"]] == [1, 2, 3]
+    feed.dispose()
+
+
+# Test for the data version counting every committed bump across its slots
+def test_data_version_sums_slots(tmp_path, schema_template):
+    versions = create_db_engine(f"sqlite:///{tmp_path}/versions.db")
+    restore_snapshot(versions, schema_template)
+    Session = sessionmaker(bind=versions)
+    with Session() as db:
+        assert get_data_version(db) == (0, None)
+    for slot in (1, 2, 2):
+        with Session() as db:
+            db.info["data_version_slot"] = slot
+            bump_data_version(db)
+            db.commit()
+    with Session() as db:
+        db.info["data_version_slot"] = 3
+        bump_data_version(db)
+        db.rollback()
+        version, updated_at = get_data_version(db)
+        assert version == 3
+        assert updated_at.tzinfo is not None
+        assert db.query(models.DataVersion).count() == 2
+    versions.dispose()
+
+
+# Schema of the tables as they were before soft deletes, currencies and the search index
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR UNIQUE, name VARCHAR, "
+    "mobile VARCHAR, hashed_password VARCHAR)",
+    "CREATE TABLE expenses (id INTEGER PRIMARY KEY, amount FLOAT, description VARCHAR, "
+    "split_method VARCHAR, owner_id INTEGER REFERENCES users (id))",
+    "CREATE TABLE expense_splits (id INTEGER PRIMARY KEY, amount FLOAT, percentage FLOAT, "
+    "expense_id INTEGER REFERENCES expenses (id), user_id INTEGER REFERENCES users (id))",
+    "INSERT INTO users VALUES (1, 'legacy@example.com', 'Legacy', '0', 'x')",
+    "INSERT INTO expenses VALUES (1, 40.0, 'Legacy dinner', 'equal', 1)",
+    "INSERT INTO expense_splits VALUES (1, 40.0, NULL, 1, 1)",
+]
+
+
+# Test for the app booting against a database created before this release's schema changes
+def test_boot_upgrades_legacy_schema(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(statement)
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.main"],
+        cwd=root,
+        env={**os.environ, "SQLALCHEMY_DATABASE_URL": f"sqlite:///{path}", "EXCHANGE_RATES_FILE": ""},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    legacy = create_db_engine(f"sqlite:///{path}")
+    assert upgrade_schema(legacy) == []
+    with sessionmaker(bind=legacy)() as db:
+        expense = db.get(models.Expense, 1)
+        assert expense.deleted_at is None and [split.amount for split in expense.splits] == [40.0]
+        assert db.get(models.UserBalance, 1).total_amount == 40.0
+        assert [row["description"] for row in curd.search_expenses(db, 1, "dinner", 10)["results"]] == [
+            "Legacy dinner"
+        ]
+    legacy.dispose()
+
+
+# Test for restoring a seeded database from both snapshot formats
+def test_snapshot_round_trip(tmp_path, schema_template):
+    seeded = create_db_engine(f"sqlite:///{tmp_path}/seeded.db")
+    restore_snapshot(seeded, schema_template)
+    with sessionmaker(bind=seeded)() as db:
+        owner = add_user(db, "owner@example.com")
+        friend = add_user(db, "friend@example.com")
+        curd.create_new_expense(
+            db,
+            ExpenseCreate(
+                amount=30.0, description="Snapshot dinner", split_method="equal",
+                expense_date=date(2024, 2, 29), splits=[{"user_id": owner.id}, {"user_id": friend.id}],
+            ),
+            owner_id=owner.id,
+        )
+        owner_id = owner.id
+    save_snapshot(seeded, f"{tmp_path}/seeded.snapshot")
+    save_snapshot(seeded, f"{tmp_path}/seeded.jsonl.gz", portable=True)
+
+    for path in ("seeded.snapshot", "seeded.jsonl.gz"):
+        restored = create_db_engine(f"sqlite:///{tmp_path}/restored-{path}.db")
+        restore_snapshot(restored, f"{tmp_path}/{path}")
+        with sessionmaker(bind=restored)() as db:
+            expense = db.query(models.Expense).one()
+            assert expense.expense_date == date(2024, 2, 29)
+            assert len(expense.splits) == 2
+            assert db.get(models.UserBalance, owner_id).total_amount == 30.0
+            assert [row["description"] for row in curd.search_expenses(db, owner_id, "dinn", 10)["results"]] == [
+                "Snapshot dinner"
+            ]
+            assert add_user(db, "new@example.com").id == 3
+        restored.dispose()
+    seeded.dispose()
+
+
+# Test for the COPY import and restore paths, run only against a PostgreSQL server in POSTGRES_TEST_URL
+@pytest.mark.skipif(not os.environ.get("POSTGRES_TEST_URL"), reason="POSTGRES_TEST_URL is not set")
+def test_postgres_copy_paths(tmp_path):
+    postgres = create_db_engine(os.environ["POSTGRES_TEST_URL"])
+    Base.metadata.drop_all(bind=postgres)
+    Base.metadata.create_all(bind=postgres)
+    try:
+        with sessionmaker(bind=postgres)() as db:
+            assert supports_copy(db)
+            owner = add_user(db, "copy-owner@example.com")
+            friend = add_user(db, "copy-friend@example.com")
+            owner_id, friend_id = owner.id, friend.id
+            expenses = [
+                ExpenseCreate(
+                    amount=30.0, description=f"Copied {i}", split_method="equal",
+                    expense_date=date(2024, 2, 29), splits=[{"user_id": owner_id}, {"user_id": friend_id}],
+                )
+                for i in range(3)
+            ]
+            expense_ids = curd.bulk_import_expenses(db, expenses, owner_id)
+            assert expense_ids == sorted(expense_ids) and len(set(expense_ids)) == 3
+            assert db.query(models.ExpenseSplit).filter(models.ExpenseSplit.expense_id.in_(expense_ids)).count() == 6
+            assert db.get(models.UserBalance, owner_id).total_amount == 90.0
+            assert db.get(models.UserBalance, friend_id).owed_amount == 45.0
+        save_snapshot(postgres, f"{tmp_path}/postgres.jsonl.gz")
+        restore_snapshot(postgres, f"{tmp_path}/postgres.jsonl.gz")
+        with sessionmaker(bind=postgres)() as db:
+            assert sorted(row.id for row in db.query(models.Expense.id)) == expense_ids
+            assert db.query(models.ExpenseSplit).count() == 6
+            # The sequences continue past the restored rows.
+            assert curd.bulk_import_expenses(db, expenses[:1], owner_id)[0] > max(expense_ids)
+            assert add_user(db, "copy-new@example.com").id > friend_id
+    finally:
+        Base.metadata.drop_all(bind=postgres)
+        postgres.dispose()
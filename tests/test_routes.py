@@ -5,14 +5,23 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../"
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.database.database import Base
+from app.database.database import Base, create_db_engine
+from app.database.snapshot import save_snapshot, restore_snapshot
 from app.models import models
 from app.utils.security import hash_password
 from app.config.config import settings
 from app.utils.dependencies import get_db
+from app.utils.rate_limit import rate_limit_backend, concurrency_limiter, stream_limiter
+from app.utils.curd import create_new_expense, purge_tombstones
+from app.utils.idempotency import claim_idempotency_key, hash_request
+from fastapi import HTTPException
+from app.database.schemas.expense_schema import ExpenseCreate
+from app.utils.exchange_rates import load_exchange_rates
+from app.utils.scheduler import run_due_recurring_expenses
+from datetime import datetime, timedelta, timezone
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,16 +29,34 @@ load_dotenv()
 # Set the correct path for the app
 
 # Create the test database engine
-engine = create_engine(
-    os.environ.get('SQLALCHEMY_DATABASE_URL'), connect_args={"check_same_thread": False}
-)
+engine = create_db_engine(os.environ.get('SQLALCHEMY_DATABASE_URL'))
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# Template with the schema and the test user, built once and restored for each module
+@pytest.fixture(scope="session")
+def template(tmp_path_factory):
+    Base.metadata.create_all(bind=engine)
+    with TestingSessionLocal() as db:
+        db.add(
+            models.User(
+                email="test@example.com",
+                name="Test User",
+                mobile="1234567890",
+                hashed_password=hash_password("testpassword"),
+            )
+        )
+        db.commit()
+    path = str(tmp_path_factory.mktemp("template") / "template.snapshot")
+    save_snapshot(engine, path)
+    Base.metadata.drop_all(bind=engine)
+    return path
+
+
 # Fixture for the database
 @pytest.fixture(scope="module")
-def db():
-    Base.metadata.create_all(bind=engine)
+def db(template):
+    restore_snapshot(engine, template)
     db = TestingSessionLocal()
     yield db
     db.close()
@@ -50,19 +77,16 @@ def client(db):
         yield client
 
 
-# Fixture for a test user
+# Start every test with full rate limit buckets
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    rate_limit_backend.clear()
+
+
+# Fixture for the test user of the template
 @pytest.fixture(scope="module")
 def test_user(db):
-    user = models.User(
-        email="test@example.com",
-        name="Test User",
-        mobile="1234567890",
-        hashed_password=hash_password("testpassword"),
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    return db.query(models.User).filter(models.User.email == "test@example.com").one()
 
 
 # Test for creating a user
@@ -147,3 +171,699 @@ def test_get_current_user_expenses(client, test_user):
     response = client.get("/api/v1/expenses/current_user_expenses/", headers=headers)
     assert response.status_code == 200
     assert len(response.json()) >= 1
+
+
+# Test for replaying an expense created with an idempotency key
+def test_create_expense_idempotency_key(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "retry-1"}
+    expense_data = {
+        "amount": 60.0,
+        "description": "Idempotent Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}],
+    }
+    first = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    retry = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert (
+        db.query(models.Expense)
+        .filter(models.Expense.description == "Idempotent Expense")
+        .count()
+        == 1
+    )
+
+    expense_data["amount"] = 70.0
+    response = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert response.status_code == 422
+
+
+# Test for a retry taking over a claim whose worker died before completing it
+def test_stale_idempotency_claim_reclaimed(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    expense_data = {
+        "amount": 25.0,
+        "description": "Orphaned Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}],
+    }
+    request_hash = hash_request(ExpenseCreate(**expense_data))
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        models.IdempotencyKey(key="orphan", owner_id=test_user.id, request_hash=request_hash,
+                              created_at=now - timedelta(minutes=10)),
+        models.IdempotencyKey(key="in-flight", owner_id=test_user.id, request_hash=request_hash,
+                              created_at=now),
+    ])
+    db.commit()
+
+    in_flight = client.post(
+        "/api/v1/expenses/create_expense",
+        headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "in-flight"},
+        json=expense_data,
+    )
+    assert in_flight.status_code == 409
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "orphan"}
+    first = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    retry = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert db.query(models.Expense).filter(models.Expense.description == "Orphaned Expense").count() == 1
+
+
+# Test for a slow request losing its claim to a retry without creating the expense
+def test_idempotent_response_commits_with_expense(db, test_user):
+    expense = ExpenseCreate(
+        amount=30.0, description="Overtaken Expense", split_method="equal", splits=[{"user_id": test_user.id}]
+    )
+    claimed_at, _ = claim_idempotency_key(db, "overtaken", test_user.id, hash_request(expense))
+    retried_at, _ = claim_idempotency_key(db, "overtaken", test_user.id, hash_request(expense))
+    assert retried_at is None
+    # A retry takes the claim over while the original request is still running.
+    db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "overtaken").update(
+        {"created_at": claimed_at + timedelta(minutes=5)}
+    )
+    db.commit()
+    with pytest.raises(HTTPException) as error:
+        create_new_expense(db, expense, test_user.id, idempotency_key=("overtaken", claimed_at))
+    assert error.value.status_code == 409
+    assert db.query(models.Expense).filter(models.Expense.description == "Overtaken Expense").count() == 0
+
+    # A key past its TTL is claimed afresh, even with another body.
+    db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "overtaken").update(
+        {"created_at": claimed_at - timedelta(days=2), "status_code": 200, "response_body": "{}"}
+    )
+    db.commit()
+    expense = expense.model_copy(update={"amount": 31.0})
+    claimed_at, _ = claim_idempotency_key(db, "overtaken", test_user.id, hash_request(expense))
+    assert claimed_at is not None
+    created = create_new_expense(db, expense, test_user.id, idempotency_key=("overtaken", claimed_at))
+    record = db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == "overtaken").one()
+    assert record.status_code == 200 and f'"id":{created.id}' in record.response_body
+
+
+# Test for throttling repeated login attempts for one email
+def test_login_rate_limited(client):
+    statuses = [
+        client.post(
+            "/api/v1/auth/token", params={"email": "stuffing@example.com", "password": "guess"}
+        ).status_code
+        for _ in range(6)
+    ]
+    assert statuses[:5] == [401] * 5
+    assert statuses[5] == 429
+
+
+# Test for rotating a refresh token
+def test_refresh_token_rotation(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    refresh_token = login_response.json()["refresh_token"]
+    response = client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != refresh_token
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/v1/users/current_user", headers=headers).status_code == 200
+
+    reused = client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert reused.status_code == 401
+
+
+# Test for revoking an access token on logout
+def test_logout_revokes_access_token(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    refresh_token = login_response.json()["refresh_token"]
+    response = client.post(
+        "/api/v1/auth/logout", headers=headers, json={"refresh_token": refresh_token}
+    )
+    assert response.status_code == 200
+    assert client.get("/api/v1/users/current_user", headers=headers).status_code == 403
+    assert (
+        client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token}).status_code
+        == 401
+    )
+
+
+# Test for the list endpoints served from plain rows
+def test_list_endpoints_shapes(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    users = client.get("/api/v1/users/all", headers=headers).json()
+    assert {"id": test_user.id, "email": "test@example.com", "name": "Test User", "mobile": "1234567890"} in users
+
+    expenses = client.get("/api/v1/expenses/current_user_expenses/", headers=headers).json()
+    assert expenses[0]["owner_id"] == test_user.id
+    assert expenses[0]["splits"][0]["user_id"] == test_user.id
+
+    overall = client.get("/api/v1/expenses/balance_sheet/overall", headers=headers).json()
+    sheet = next(sheet for sheet in overall if sheet["user_id"] == test_user.id)
+    assert sheet["total_amount"] == sum(detail["amount"] for detail in sheet["details"])
+    assert set(sheet["details"][0]) == {"id", "description", "amount", "split_method", "currency"}
+
+    current = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert current == sheet
+
+    csv_response = client.get("/api/v1/expenses/download/balance_sheet/overall/", headers=headers)
+    assert csv_response.status_code == 200
+    assert csv_response.text.startswith("User ID,Total Amount")
+
+
+# Test for importing expenses in bulk
+def test_import_expenses(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    expenses = [
+        {
+            "amount": 30.0,
+            "description": f"Imported {i}",
+            "split_method": "exact",
+            "splits": [{"user_id": test_user.id, "amount": 30.0}],
+        }
+        for i in range(3)
+    ]
+    response = client.post("/api/v1/expenses/import", headers=headers, json=expenses)
+    assert response.status_code == 200
+    expense_ids = response.json()["expense_ids"]
+    assert len(expense_ids) == 3
+    imported = db.query(models.Expense).filter(models.Expense.id.in_(expense_ids)).all()
+    assert [expense.description for expense in sorted(imported, key=lambda e: e.id)] == [
+        "Imported 0", "Imported 1", "Imported 2"
+    ]
+    assert all(len(expense.splits) == 1 for expense in imported)
+
+    expenses[1]["splits"][0]["amount"] = 10.0
+    response = client.post("/api/v1/expenses/import", headers=headers, json=expenses)
+    assert response.status_code == 400
+    assert db.query(models.Expense).filter(models.Expense.description == "Imported 0").count() == 1
+
+
+# Test for reading new expenses from the change feed
+def test_expense_change_feed(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    cursor = client.get("/api/v1/expenses/events", headers=headers, params={"limit": 1000}).json()["next_cursor"]
+    expense_data = {
+        "amount": 42.0,
+        "description": "Feed Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}],
+    }
+    created = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data).json()
+
+    page = client.get("/api/v1/expenses/events", headers=headers, params={"after": cursor}).json()
+    assert [event["event_type"] for event in page["events"]] == ["expense.created"]
+    assert page["events"][0]["payload"]["id"] == created["id"]
+    assert page["events"][0]["payload"]["splits"] == [{"user_id": test_user.id, "amount": 42.0}]
+    assert page["next_cursor"] > cursor
+
+    empty = client.get("/api/v1/expenses/events", headers=headers, params={"after": page["next_cursor"]}).json()
+    assert empty == {"events": [], "next_cursor": page["next_cursor"]}
+
+
+# Test for the change feed only showing the expenses the caller takes part in
+def test_change_feed_scoped_to_caller(client, test_user):
+    client.post(
+        "/api/v1/users/",
+        json={"email": "outsider@example.com", "name": "Outsider", "mobile": "5550001111", "password": "outsiderpass"},
+    )
+    tokens = [
+        client.post("/api/v1/auth/token", params={"email": email, "password": password}).json()["access_token"]
+        for email, password in (("test@example.com", "testpassword"), ("outsider@example.com", "outsiderpass"))
+    ]
+    owner, outsider = ({"Authorization": f"Bearer {token}"} for token in tokens)
+    cursor = client.get("/api/v1/expenses/events", headers=outsider, params={"limit": 1000}).json()["next_cursor"]
+    client.post(
+        "/api/v1/expenses/create_expense",
+        headers=owner,
+        json={"amount": 9.0, "description": "Private", "split_method": "equal", "splits": [{"user_id": test_user.id}]},
+    )
+    page = client.get("/api/v1/expenses/events", headers=outsider, params={"after": cursor}).json()
+    assert page["events"] == []
+    # The cursor still moves past the events the caller may not see.
+    assert page["next_cursor"] > cursor
+
+    stream_limiter.per_user[test_user.id] = stream_limiter.max_per_user
+    try:
+        response = client.get("/api/v1/expenses/events/stream", headers=owner)
+    finally:
+        del stream_limiter.per_user[test_user.id]
+    assert response.status_code == 429
+
+
+# Test for updating an expense and its effect on the balances
+def test_update_expense_adjusts_balance(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    before = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    expense_data = {
+        "amount": 60.0,
+        "description": "Patch Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}],
+    }
+    created = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data).json()
+
+    response = client.patch(f"/api/v1/expenses/{created['id']}", headers=headers, json={"amount": 90.0})
+    assert response.status_code == 200
+    assert response.json()["amount"] == 90.0
+    assert response.json()["splits"][0]["amount"] == 90.0
+    assert response.json()["description"] == "Patch Expense"
+
+    after = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert after["total_amount"] == before["total_amount"] + 90.0
+    assert after["owed_amount"] == before["owed_amount"] + 90.0
+
+    response = client.patch(f"/api/v1/expenses/{created['id']}", headers=headers, json={"split_method": "exact"})
+    assert response.status_code == 200
+    response = client.patch(f"/api/v1/expenses/{created['id']}", headers=headers, json={"amount": 10.0})
+    assert response.status_code == 400
+
+
+# Test for deleting expenses and splits
+def test_delete_expense_and_split(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    friend = models.User(email="split-friend@example.com", name="Friend", mobile="5", hashed_password="x")
+    db.add(friend)
+    db.commit()
+    friend_id = friend.id
+    before = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    expense_data = {
+        "amount": 50.0,
+        "description": "Delete Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}, {"user_id": friend_id}],
+    }
+    created = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data).json()
+
+    split_id = created["splits"][1]["id"]
+    response = client.delete(f"/api/v1/expenses/{created['id']}/splits/{split_id}", headers=headers)
+    assert response.status_code == 200
+    assert [split["user_id"] for split in response.json()["splits"]] == [test_user.id, test_user.id]
+    middle = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert middle["total_amount"] == before["total_amount"] + 50.0
+    assert middle["owed_amount"] == before["owed_amount"] + 50.0
+    # The removed share moved to the owner: what everyone paid is still what everyone owes.
+    db.expire_all()
+    balances = db.query(models.UserBalance).all()
+    assert db.get(models.UserBalance, friend_id).owed_amount == pytest.approx(0.0)
+    assert sum(row.total_amount - row.owed_amount for row in balances) == pytest.approx(0.0, abs=1e-6)
+
+    response = client.delete(f"/api/v1/expenses/{created['id']}", headers=headers)
+    assert response.status_code == 204
+    assert client.delete(f"/api/v1/expenses/{created['id']}", headers=headers).status_code == 404
+
+    after = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert after["total_amount"] == before["total_amount"]
+    assert after["owed_amount"] == before["owed_amount"]
+    assert created["id"] not in [detail["id"] for detail in after["details"]]
+    expenses = client.get("/api/v1/expenses/current_user_expenses/", headers=headers).json()
+    assert created["id"] not in [expense["id"] for expense in expenses]
+
+    assert db.query(models.Expense).filter(models.Expense.id == created["id"]).one().deleted_at is not None
+    assert purge_tombstones(db, older_than=timedelta(0)) >= 3
+    assert db.query(models.Expense).filter(models.Expense.id == created["id"]).first() is None
+
+
+# Test for bulk user creation and batch lookup
+def test_bulk_create_and_batch_lookup(client, test_user, monkeypatch):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    users = [
+        {"email": f"bulk{i}@example.com", "name": f"Bulk {i}", "mobile": "5555555555", "password": f"bulkpassword{i}"}
+        for i in range(10)
+    ]
+    users.append(users[0])
+    users.append({"email": "test@example.com", "name": "Taken", "mobile": "1", "password": "x"})
+    # A user token is not enough: the endpoint needs the operator token.
+    assert client.post("/api/v1/users/bulk", headers=headers, json=users).status_code == 404
+    monkeypatch.setenv("ADMIN_API_TOKEN", "operator")
+    assert client.post("/api/v1/users/bulk", headers=headers, json=users).status_code == 403
+    response = client.post("/api/v1/users/bulk", headers={"X-Admin-Token": "operator"}, json=users)
+    assert response.status_code == 200
+    created = response.json()["created"]
+    assert [user["email"] for user in created] == [f"bulk{i}@example.com" for i in range(10)]
+    assert response.json()["skipped"] == ["bulk0@example.com", "test@example.com"]
+
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "bulk9@example.com", "password": "bulkpassword9"}
+    )
+    assert login_response.status_code == 200
+
+    ids = [created[2]["id"], created[0]["id"]]
+    response = client.get(f"/api/v1/users/?ids={ids[0]},{ids[1]}&ids={test_user.id}&ids=999999", headers=headers)
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()] == sorted(ids + [test_user.id])
+    assert client.get("/api/v1/users/?ids=1,x", headers=headers).status_code == 400
+
+
+# Test for rejecting splits with participants that do not exist
+def test_create_expense_unknown_participant(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    expense_data = {
+        "amount": 20.0,
+        "description": "Orphan Expense",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}, {"user_id": 987654}],
+    }
+    response = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert response.status_code == 400
+    assert "987654" in response.json()["detail"]
+    assert db.query(models.Expense).filter(models.Expense.description == "Orphan Expense").count() == 0
+
+    response = client.post("/api/v1/expenses/import", headers=headers, json=[expense_data])
+    assert response.status_code == 400
+    assert db.query(models.ExpenseSplit).filter(models.ExpenseSplit.user_id == 987654).count() == 0
+
+
+# Test for foreign currency expenses, reports and settlement
+def test_multi_currency_balances(client, db, test_user, tmp_path):
+    rates = tmp_path / "rates.csv"
+    rates.write_text("currency,date,rate\nEUR,2024-01-01,1.10\nEUR,2024-06-01,1.20\n")
+    assert load_exchange_rates(db, str(rates)) == 2
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    other = models.User(email="euro@example.com", name="Euro User", mobile="1", hashed_password="x")
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    before = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    expense_data = {
+        "amount": 100.0,
+        "description": "Euro Expense",
+        "split_method": "equal",
+        "currency": "EUR",
+        "expense_date": "2024-03-15",
+        "splits": [{"user_id": test_user.id}, {"user_id": other_id}],
+    }
+    created = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data).json()
+    assert created["currency"] == "EUR"
+
+    after = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert after["currency"] == "USD"
+    assert round(after["total_amount"] - before["total_amount"], 2) == 110.0
+    assert round(after["owed_amount"] - before["owed_amount"], 2) == 55.0
+
+    in_euros = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers, params={"currency": "EUR"}).json()
+    assert in_euros["currency"] == "EUR"
+    assert in_euros["total_amount"] == round(after["total_amount"] / 1.2, 2)
+
+    settlement = client.get("/api/v1/expenses/settlement", headers=headers).json()
+    assert {"from_user_id": other_id, "to_user_id": test_user.id, "amount": 55.0} in settlement["transfers"]
+
+    response = client.patch(f"/api/v1/expenses/{created['id']}", headers=headers, json={"expense_date": "2024-07-01"})
+    assert response.status_code == 200
+    rerated = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    assert round(rerated["total_amount"] - before["total_amount"], 2) == 120.0
+
+    expense_data["currency"] = "GBP"
+    response = client.post("/api/v1/expenses/create_expense", headers=headers, json=expense_data)
+    assert response.status_code == 400
+    client.delete(f"/api/v1/expenses/{created['id']}", headers=headers)
+
+
+# Test for recurring expenses catching up on missed occurrences
+def test_recurring_expense_catch_up(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    start_at = datetime.now(timezone.utc) - timedelta(days=3) + timedelta(hours=1)
+    template = {
+        "amount": 15.0,
+        "description": "Daily Coffee",
+        "split_method": "equal",
+        "splits": [{"user_id": test_user.id}],
+        "frequency": "daily",
+        "start_at": start_at.isoformat(),
+    }
+    response = client.post("/api/v1/recurring_expenses/", headers=headers, json=template)
+    assert response.status_code == 200
+    template_id = response.json()["id"]
+
+    asyncio.run(run_due_recurring_expenses())
+    asyncio.run(run_due_recurring_expenses())
+    assert db.query(models.Expense).filter(models.Expense.description == "Daily Coffee").count() == 3
+    listed = client.get("/api/v1/recurring_expenses/", headers=headers).json()
+    assert next(t for t in listed if t["id"] == template_id)["run_count"] == 3
+
+    assert client.delete(f"/api/v1/recurring_expenses/{template_id}", headers=headers).status_code == 204
+    listed = client.get("/api/v1/recurring_expenses/", headers=headers).json()
+    assert next(t for t in listed if t["id"] == template_id)["next_run_at"] is None
+
+
+# Test for empty split lists being refused instead of dividing by zero
+def test_empty_splits_rejected(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    template = {
+        "amount": 15.0, "description": "Nobody's Coffee", "split_method": "equal",
+        "splits": [], "frequency": "daily",
+    }
+    response = client.post("/api/v1/recurring_expenses/", headers=headers, json=template)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "An expense needs at least one split."
+
+    created = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=headers,
+        json={"amount": 15.0, "description": "Somebody's Coffee", "split_method": "equal",
+              "splits": [{"user_id": test_user.id}]},
+    ).json()
+    before = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json()
+    response = client.patch(f"/api/v1/expenses/{created['id']}", headers=headers, json={"splits": []})
+    assert response.status_code == 400
+    assert client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers).json() == before
+
+
+# Test for searching the expenses a user owns or participates in
+def test_search_expenses(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    token = login_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    other = models.User(
+        email="searcher@example.com", name="Searcher", mobile="3", hashed_password=hash_password("searchpassword")
+    )
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    owned = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=headers,
+        json={"amount": 30.0, "description": "Zanzibar ferry tickets", "split_method": "equal",
+              "splits": [{"user_id": test_user.id}]},
+    ).json()
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "searcher@example.com", "password": "searchpassword"}
+    )
+    other_headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    shared = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=other_headers,
+        json={"amount": 40.0, "description": "Zanzibar dinner", "split_method": "equal",
+              "splits": [{"user_id": other_id}, {"user_id": test_user.id}]},
+    ).json()
+    private = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=other_headers,
+        json={"amount": 50.0, "description": "Zanzibar hotel", "split_method": "equal",
+              "splits": [{"user_id": other_id}]},
+    ).json()
+
+    response = client.get("/api/v1/expenses/search", params={"q": "zanzib"}, headers=headers)
+    assert response.status_code == 200
+    assert sorted(result["id"] for result in response.json()["results"]) == [owned["id"], shared["id"]]
+    response = client.get("/api/v1/expenses/search", params={"q": "zanzibar", "limit": 1}, headers=headers)
+    assert len(response.json()["results"]) == 1 and response.json()["next_offset"] == 1
+    response = client.get("/api/v1/expenses/search", params={"q": "zanzibar", "offset": 1}, headers=headers)
+    assert len(response.json()["results"]) == 1 and response.json()["next_offset"] is None
+    response = client.get("/api/v1/expenses/search", params={"q": "hotel"}, headers=other_headers)
+    assert [result["id"] for result in response.json()["results"]] == [private["id"]]
+
+    client.patch(f"/api/v1/expenses/{owned['id']}", headers=headers, json={"description": "Ferry refund"})
+    client.delete(f"/api/v1/expenses/{shared['id']}", headers=other_headers)
+    response = client.get("/api/v1/expenses/search", params={"q": 'zanzibar" OR *'}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["results"] == []
+    response = client.get("/api/v1/expenses/search", params={"q": "refund ferry"}, headers=headers)
+    assert [result["id"] for result in response.json()["results"]] == [owned["id"]]
+
+
+# Test for paging through the expenses a user owns or takes part in
+def test_involved_expenses(client, db, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    other = models.User(
+        email="involved@example.com", name="Involved", mobile="4", hashed_password=hash_password("involvedpassword")
+    )
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "involved@example.com", "password": "involvedpassword"}
+    )
+    other_headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    expected = [
+        expense["id"] for expense in client.get("/api/v1/expenses/involved?limit=1000", headers=headers).json()["expenses"]
+    ]
+    shared = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=other_headers,
+        json={"amount": 40.0, "description": "Involved shared", "split_method": "equal",
+              "splits": [{"user_id": other_id}, {"user_id": test_user.id}, {"user_id": test_user.id}]},
+    ).json()
+    client.post(
+        "/api/v1/expenses/create_expense",
+        headers=other_headers,
+        json={"amount": 50.0, "description": "Involved private", "split_method": "equal",
+              "splits": [{"user_id": other_id}]},
+    )
+    owned = client.post(
+        "/api/v1/expenses/create_expense",
+        headers=headers,
+        json={"amount": 30.0, "description": "Involved owned", "split_method": "equal",
+              "splits": [{"user_id": other_id}]},
+    ).json()
+    expected += [shared["id"], owned["id"]]
+
+    seen, after = [], 0
+    while after is not None:
+        page = client.get(f"/api/v1/expenses/involved?after={after}&limit=2", headers=headers).json()
+        seen += [expense["id"] for expense in page["expenses"]]
+        after = page["next_cursor"]
+    assert seen == expected
+    page = client.get(f"/api/v1/expenses/involved?after={shared['id'] - 1}&limit=1", headers=headers).json()
+    assert [split["user_id"] for split in page["expenses"][0]["splits"]] == [other_id, test_user.id, test_user.id]
+    owned_only = client.get("/api/v1/expenses/current_user_expenses/", headers=headers).json()
+    assert shared["id"] not in [expense["id"] for expense in owned_only]
+    assert owned["id"] in [expense["id"] for expense in owned_only]
+
+
+# Test for revalidating reports with ETags and compressing responses
+def test_conditional_get_and_compression(client, test_user):
+    login_response = client.post(
+        "/api/v1/auth/token", params={"email": "test@example.com", "password": "testpassword"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    response = client.get("/api/v1/expenses/balance_sheet/overall", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    assert etag.startswith('W/"')
+    cached = client.get(
+        "/api/v1/expenses/balance_sheet/overall", headers={**headers, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    cached = client.get(
+        "/api/v1/expenses/balance_sheet/overall", headers={**headers, "If-Modified-Since": last_modified}
+    )
+    assert cached.status_code == 304
+    converted = client.get(
+        "/api/v1/expenses/balance_sheet/overall?currency=USD", headers={**headers, "If-None-Match": etag}
+    )
+    assert converted.status_code == 200
+
+    own = client.get("/api/v1/expenses/balance_sheet/current_user", headers=headers)
+    assert own.headers["cache-control"] == "private, no-cache"
+    assert client.get(
+        "/api/v1/expenses/balance_sheet/current_user", headers={**headers, "If-None-Match": own.headers["etag"]}
+    ).status_code == 304
+
+    client.post(
+        "/api/v1/expenses/create_expense",
+        headers=headers,
+        json={"amount": 12.0, "description": "Conditional", "split_method": "equal",
+              "splits": [{"user_id": test_user.id}]},
+    )
+    response = client.get(
+        "/api/v1/expenses/balance_sheet/overall", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    download = client.get(
+        "/api/v1/expenses/download/balance_sheet/overall/",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert download.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in download.headers["vary"].lower()
+    assert download.text.startswith("User ID,")
+    assert "Conditional" in download.text
+    assert client.get(
+        "/api/v1/expenses/download/balance_sheet/overall/",
+        headers={**headers, "If-None-Match": download.headers["etag"]},
+    ).status_code == 304
+    small = client.get("/api/v1/users/current_user", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+# Test for the liveness and readiness probes
+def test_health_and_readiness(client):
+    assert client.get("/healthz").json() == {"status": "ok"}
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert set(response.json()["checks"]) == {"database", "pool", "requests", "password_hashing"}
+
+    concurrency_limiter.in_flight = concurrency_limiter.max_concurrent
+    try:
+        # Probes are not shed while the limiter rejects everything else.
+        assert client.get("/api/v1/users/all").status_code == 503
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.json()["checks"]["requests"]["ok"] is False
+        assert client.get("/healthz").status_code == 200
+    finally:
+        concurrency_limiter.in_flight = 0
@@ -6,7 +6,21 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../'
 
 import pytest
 from app.utils.security import hash_password, verify_password, create_access_token, decode_jwt
-from datetime import timedelta
+from app.utils.rate_limit import InMemoryRateLimitBackend
+from app.utils.revocation import TokenDenylist
+from app.utils.curd import occurrence_at
+from app.utils.profiling import Profiler, ProfilingMiddleware, collapsed_stacks
+from app.utils.health import ReadinessProbe
+from app.utils.rate_limit import ConcurrencyLimiter, StreamLimiter
+from app.utils.security import InFlightCounter
+from sqlalchemy import create_engine
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from datetime import date, datetime, timedelta
+import asyncio
+import threading
+import time
 from app.config.config import settings
 
 def test_hash_password():
@@ -34,3 +48,127 @@ def test_decode_jwt():
     token = create_access_token(data, expires)
     decoded = decode_jwt(token)
     assert decoded["sub"] == data["sub"]
+
+def test_token_bucket_refuses_when_empty():
+    backend = InMemoryRateLimitBackend()
+    results = [asyncio.run(backend.consume("ip", 2, 1)) for _ in range(3)]
+    assert results[:2] == [0.0, 0.0]
+    assert 0 < results[2] <= 1
+
+def test_token_bucket_evicts_least_recently_used():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        asyncio.run(backend.consume(key, 1, 1))
+    assert list(backend._buckets) == ["b", "c"]
+
+def test_stream_limiter_caps_users_and_total():
+    limiter = StreamLimiter(max_streams=3, max_per_user=2)
+    assert limiter.acquire(1) and limiter.acquire(1)
+    assert not limiter.acquire(1)
+    assert limiter.acquire(2)
+    assert not limiter.acquire(3)
+    limiter.release(1)
+    assert limiter.acquire(3)
+    for user_id in (1, 2, 3):
+        limiter.release(user_id)
+    assert limiter.open == 0 and limiter.per_user == {}
+
+def test_token_denylist():
+    denylist = TokenDenylist(capacity=2)
+    denylist.revoke("revoked", time.time() + 60)
+    denylist.revoke("expired", time.time() - 1)
+    denylist.revoke("other", time.time() + 60)
+    assert denylist.is_revoked("revoked")
+    assert not denylist.is_revoked("expired")
+    assert not denylist.is_revoked("never-revoked")
+    assert "expired" not in denylist.revoked
+
+
+# Monthly recurrences keep their day of month
+def test_monthly_occurrences_clamp_to_month_end():
+    start = datetime(2024, 1, 31, 9, 0)
+    assert [occurrence_at(start, "monthly", 1, n).date() for n in range(4)] == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+    ]
+    assert occurrence_at(start, "weekly", 2, 1) == datetime(2024, 2, 14, 9, 0)
+
+
+def test_profiling_middleware_samples_admin_requests(tmp_path):
+    profiler = Profiler(admin_token="secret", rate=(2, 1e-6), interval=0.001, directory=str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow_endpoint():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {}
+
+    @app.get("/export")
+    def export_endpoint():
+        return StreamingResponse(iter(["a,b\n"]), media_type="text/csv")
+
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    client = TestClient(app)
+    assert "x-profile-id" not in client.get("/slow").headers
+    assert "x-profile-id" not in client.get("/slow", headers={"X-Profile-Token": "wrong"}).headers
+    # Streamed responses are never profiled.
+    assert "x-profile-id" not in client.get("/export", headers={"X-Profile-Token": "secret"}).headers
+    assert profiler.summaries() == []
+    # A plain flag: a thread sampled inside threading.Event would count as idle.
+    stop = []
+
+    def busy_bystander():
+        while not stop:
+            pass
+
+    bystander = threading.Thread(target=busy_bystander)
+    bystander.start()
+    try:
+        response = client.get("/slow", headers={"X-Profile-Token": "secret"})
+    finally:
+        stop.append(True)
+        bystander.join()
+    # Another worker reads the profile from the shared directory.
+    profile = Profiler(directory=str(tmp_path)).get(response.headers["x-profile-id"])
+    assert profile["path"] == "/slow" and profile["status_code"] == 200 and profile["samples"] > 0
+    assert "slow_endpoint" in collapsed_stacks(profile["stacks"])
+    # Work the request did not do is kept apart from its stacks.
+    assert "busy_bystander" not in collapsed_stacks(profile["stacks"])
+    assert "busy_bystander" in collapsed_stacks(profile["other_stacks"])
+    # The bucket is empty: the next admin request is served without profiling.
+    assert "x-profile-id" not in client.get("/slow", headers={"X-Profile-Token": "secret"}).headers
+    assert [summary["id"] for summary in profiler.summaries()] == [profile["id"]]
+
+
+def test_readiness_probe_fails_before_saturation():
+    class SlowProbe(ReadinessProbe):
+        def ping(self):
+            time.sleep(0.2)
+            return 200.0
+
+    limiter = ConcurrencyLimiter(10)
+    hashes = InFlightCounter()
+    probe = ReadinessProbe(create_engine("sqlite://"), limiter, hashes, max_password_hashes=2)
+    assert asyncio.run(probe.check())["status"] == "ready"
+    limiter.in_flight = 8
+    with hashes.track(2):
+        result = asyncio.run(probe.check())
+    assert result["status"] == "not_ready"
+    assert not result["checks"]["requests"]["ok"] and not result["checks"]["password_hashing"]["ok"]
+    assert result["checks"]["database"]["ok"] and hashes.count == 0
+
+    slow = SlowProbe(create_engine("sqlite://"), ConcurrencyLimiter(10), hashes, db_timeout=0.05)
+
+    async def probe_twice():
+        first = await slow.check_database()
+        second = await slow.check_database()
+        await asyncio.sleep(0.3)
+        third = await slow.check_database()
+        return first, second, third
+
+    first, second, third = asyncio.run(probe_twice())
+    assert first["detail"] == "Ping timed out"
+    # The hung ping is still outstanding: no second thread is started.
+    assert second["detail"] == "Previous ping has not returned"
+    assert third["detail"] == "Ping timed out"